@@ -1,8 +1,11 @@
 """LLM reasoning for issue triage and suggestions."""
 
+import asyncio
 import json
 import logging
-import subprocess
+import random
+from collections import Counter
+from minbot.responses import JSONStream, ReviewSuggestion, TriageRow, extract, validate
 
 log = logging.getLogger(__name__)
 
@@ -15,81 +18,382 @@ SYSTEM = """You are a software development triage assistant. You analyze GitHub
 
 Respond in JSON only. No markdown fences."""
 
+MODEL = "claude-sonnet-4-5-20250929"
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# 429 rate limited, 529 overloaded, and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+CLI_TIMEOUT = 1800
 
-def _call_cli(prompt: str, system: str | None = None) -> str:
+# Prompt caching: stable prefixes (system text, instructions, PR list) are
+# marked as cache breakpoints. Anthropic only caches prefixes of at least
+# ~1024 tokens, estimated here at 4 chars per token.
+CACHE_CONTROL = {"type": "ephemeral"}
+CACHE_MIN_TOKENS = 1024
+USAGE_FIELDS = ("input_tokens", "cache_creation_input_tokens", "cache_read_input_tokens", "output_tokens")
+_usage: Counter = Counter()
+
+# Triage chunking: issues are packed into prompts of about CHUNK_TOKENS
+# (estimated at 4 chars per token), at most CHUNK_MAX_ISSUES each so the
+# answer fits in TRIAGE_MAX_TOKENS. Bodies are cut to BODY_CHARS.
+CHUNK_TOKENS = 12000
+CHUNK_MAX_ISSUES = 40
+TRIAGE_MAX_TOKENS = 4096
+BODY_CHARS = 1200
+# Follow-up requests for issues missing from (or invalid in) an answer
+MAX_REREQUESTS = 2
+# suggest_next only sees this many of the best-ranked open issues
+SUGGEST_TOP = 30
+
+# One client (and connection pool) for the whole process, plus a limit on
+# concurrent LLM calls shared by the SDK and CLI paths. Agentic CLI reviews
+# can run for up to CLI_TIMEOUT, so they have their own, smaller limit and
+# never hold the slots interactive triage waits on.
+MAX_CONCURRENT_REVIEWS = 2
+max_concurrent = 4
+timeout = 120.0
+_client = None
+_client_key = None
+_client_timeout = None  # timeout the current client was built with
+_semaphore: asyncio.Semaphore | None = None
+_semaphore_limit = None  # max_concurrent the current semaphore was built with
+_review_semaphore: asyncio.Semaphore | None = None
+_loop = None
+
+_CONNECTION_ERRORS = (anthropic.APIConnectionError,) if anthropic else ()
+
+
+def configure(concurrency: int, timeout_seconds: float) -> None:
+    """Set the concurrency limit and the API request timeout.
+
+    Applied by _runtime on the next call, and only if they changed, so a
+    config reload that leaves them alone keeps the semaphore calls in
+    flight are holding.
+    """
+    global max_concurrent, timeout
+    max_concurrent = max(1, concurrency)
+    timeout = timeout_seconds
+
+
+def _runtime():
+    """Client and semaphore for the running event loop, created on first use."""
+    global _client, _semaphore, _review_semaphore, _loop, _semaphore_limit, _client_timeout
+    loop = asyncio.get_running_loop()
+    if loop is not _loop:
+        # All are bound to the loop they were first used on
+        _client = _semaphore = _review_semaphore = None
+        _loop = loop
+    if _semaphore is None or _semaphore_limit != max_concurrent:
+        _semaphore = asyncio.Semaphore(max_concurrent)
+        _semaphore_limit = max_concurrent
+    if _client is not None and _client_timeout != timeout:
+        # A copy with the new timeout; it shares the connection pool
+        _client = _client.with_options(timeout=timeout)
+        _client_timeout = timeout
+    if _review_semaphore is None:
+        _review_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REVIEWS)
+    return _semaphore
+
+
+def _get_client(api_key: str):
+    global _client, _client_key, _client_timeout
+    if _client is None or _client_key != api_key:
+        # Retries are ours (below) so they also release the concurrency slot
+        _client = anthropic.AsyncAnthropic(api_key=api_key, timeout=timeout, max_retries=0)
+        _client_key = api_key
+        _client_timeout = timeout
+    return _client
+
+
+async def close() -> None:
+    """Close the shared client's connections."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _retry_delay(error: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying, or None if the error isn't retryable."""
+    status = getattr(error, "status_code", None)
+    if status not in RETRY_STATUSES and not isinstance(error, _CONNECTION_ERRORS):
+        return None
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(retry_after), BACKOFF_MAX)
+    except (TypeError, ValueError):
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _record_usage(usage) -> None:
+    """Add one response's token usage to the running totals and log it."""
+    counts = {f: getattr(usage, f, None) for f in USAGE_FIELDS}
+    counts = {f: v for f, v in counts.items() if isinstance(v, int)}
+    _usage.update(counts)
+    _usage["calls"] += 1
+    log.info(
+        "LLM usage: %d in, %d cache write, %d cache read, %d out",
+        *(counts.get(f, 0) for f in USAGE_FIELDS),
+    )
+
+
+def usage_stats() -> dict:
+    """Token totals across SDK calls since startup, plus the cached share of input."""
+    stats = {f: _usage[f] for f in ("calls", *USAGE_FIELDS)}
+    total_in = sum(stats[f] for f in USAGE_FIELDS[:3])
+    stats["cache_read_ratio"] = stats["cache_read_input_tokens"] / total_in if total_in else 0.0
+    return stats
+
+
+def _request(prompt: str, system: str | None, prefix: str | None, max_tokens: int) -> dict:
+    """SDK request with cache breakpoints after the system text and the prefix."""
+    content = [{"type": "text", "text": prompt}]
+    if prefix:
+        content.insert(0, {"type": "text", "text": prefix, "cache_control": CACHE_CONTROL})
+    request = dict(model=MODEL, max_tokens=max_tokens, messages=[{"role": "user", "content": content}])
+    if system:
+        request["system"] = [{"type": "text", "text": system, "cache_control": CACHE_CONTROL}]
+    return request
+
+
+async def _call_sdk(
+    prompt: str, api_key: str, system: str | None, max_tokens: int = 2048, on_text=None,
+    prefix: str | None = None,
+) -> str:
+    semaphore = _runtime()
+    client = _get_client(api_key)
+    request = _request(prompt, system, prefix, max_tokens)
+    parts: list[str] = []
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                if on_text is None:
+                    msg = await client.messages.create(**request)
+                    _record_usage(msg.usage)
+                    return msg.content[0].text
+                # Streamed: on_text sees the answer as it's generated, so
+                # whatever arrived survives a dropped or truncated response
+                parts.clear()
+                async with client.messages.stream(**request) as stream:
+                    async for text in stream.text_stream:
+                        parts.append(text)
+                        on_text(text)
+                    _record_usage((await stream.get_final_message()).usage)
+                return "".join(parts)
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            # Once text has been streamed the caller holds partial results;
+            # a blind retry would replay them, so let the caller decide
+            if delay is None or attempt == MAX_RETRIES or parts:
+                raise
+            log.warning("LLM call failed (%s), retry %d in %.1fs", e, attempt + 1, delay)
+            await asyncio.sleep(delay)
+
+
+async def _run_cli(
+    prompt: str, cwd: str | None = None, timeout_seconds: float = CLI_TIMEOUT, agentic: bool = False,
+) -> tuple[int, str, str]:
+    """Run `claude --print` without blocking the loop. Returns (exit code, stdout, stderr).
+
+    `agentic` runs (reviews that explore a checkout) take a review slot
+    instead of one of the short-call slots.
+    """
+    semaphore = _runtime()
+    async with (_review_semaphore if agentic else semaphore):
+        proc = await asyncio.create_subprocess_exec(
+            "claude", "--print", "-p", prompt,
+            cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout_seconds)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            proc.kill()
+            await proc.wait()
+            raise
+    return proc.returncode, stdout.decode(errors="replace"), stderr.decode(errors="replace")
+
+
+async def _call_cli(prompt: str, system: str | None = None) -> str:
     """Call claude CLI as a subprocess."""
     full_prompt = f"{system}\n\n{prompt}" if system else prompt
-    result = subprocess.run(
-        ["claude", "--print", "-p", full_prompt],
-        capture_output=True, text=True,
-    )
-    if result.returncode != 0:
-        raise RuntimeError(f"claude CLI failed (exit {result.returncode}): {result.stderr.strip()}")
-    output = result.stdout.strip()
+    returncode, stdout, stderr = await _run_cli(full_prompt)
+    if returncode != 0:
+        raise RuntimeError(f"claude CLI failed (exit {returncode}): {stderr.strip()}")
+    output = stdout.strip()
     if not output:
-        raise RuntimeError(f"claude CLI returned empty output. stderr: {result.stderr.strip()}")
+        raise RuntimeError(f"claude CLI returned empty output. stderr: {stderr.strip()}")
     return output
 
 
-def _call(prompt: str, api_key: str | None = None, system: str | None = None) -> str:
+async def _call(
+    prompt: str, api_key: str | None = None, system: str | None = None, max_tokens: int = 2048,
+    on_text=None, prefix: str | None = None,
+) -> str:
+    """Ask the LLM. on_text, if given, is called with the answer text as it arrives.
+
+    `prefix` is stable text sent before `prompt` and marked for prompt caching.
+    """
     if api_key and anthropic:
-        client = anthropic.Anthropic(api_key=api_key)
-        msg = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=2048,
-            system=system or "",
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return msg.content[0].text
-    return _call_cli(prompt, system)
+        return await _call_sdk(prompt, api_key, system, max_tokens, on_text, prefix)
+    output = await _call_cli(f"{prefix}\n\n{prompt}" if prefix else prompt, system)
+    if on_text:
+        on_text(output)
+    return output
 
 
-def analyze_issues(issues: list[dict], api_key: str | None = None, prs: list[dict] | None = None) -> list[dict]:
+def _compact(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), default=str)
+
+
+def _trim(text: str, limit: int = BODY_CHARS) -> str:
+    """Collapse whitespace and keep the head and tail of long text."""
+    text = " ".join((text or "").split())
+    if len(text) <= limit:
+        return text
+    tail = limit // 5
+    return f"{text[:limit - tail]} [...] {text[-tail:]}"
+
+
+def _triage_item(issue: dict) -> dict:
+    item = {"number": issue["number"], "title": issue["title"], "body": _trim(issue.get("body", ""))}
+    if issue.get("labels"):
+        item["labels"] = issue["labels"]
+    if issue.get("createdAt"):
+        item["created"] = str(issue["createdAt"])[:10]
+    if issue.get("linked_prs"):
+        item["linked_prs"] = issue["linked_prs"]
+    return item
+
+
+def _chunks(items: list[dict]) -> list[list[dict]]:
+    """Greedily pack items into chunks under CHUNK_TOKENS and CHUNK_MAX_ISSUES."""
+    chunks, current, size = [], [], 0
+    for item in items:
+        tokens = len(_compact(item)) // 4 + 1
+        if current and (size + tokens > CHUNK_TOKENS or len(current) >= CHUNK_MAX_ISSUES):
+            chunks.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _triage_prefix(prs: list[dict] | None) -> str:
+    """Instructions and PR list: identical for every chunk, so cacheable."""
+    prefix = """Analyze GitHub issues. For each, estimate:
+- difficulty: easy / medium / hard
+- urgency: low / medium / high
+- summary: one-line summary of what needs to be done
+- has_pr: true if an open PR already addresses this issue, false otherwise
+
+Return a JSON array of objects with keys: number, title, difficulty, urgency, summary, has_pr."""
+    if prs:
+        pr_list = [{"number": p["number"], "title": p["title"]} for p in prs]
+        prefix += f"\n\nOpen pull requests (issues with PRs are already being worked on):\n{_compact(pr_list)}"
+    return prefix
+
+
+async def _analyze_chunk(
+    items: list[dict], prefix: str, api_key: str | None, attempt: int = 0,
+) -> list[dict]:
+    prompt = f"Issues (JSON, bodies may be truncated):\n{_compact(items)}"
+
+    wanted = {i["number"] for i in items}
+    rows: dict[int, dict] = {}
+    parser = JSONStream()
+
+    def on_text(text: str) -> None:
+        for obj in parser.feed(text):
+            row = validate(TriageRow, obj)
+            if row and row.number in wanted:
+                rows[row.number] = row.model_dump()
+
+    try:
+        await _call(prompt, api_key, SYSTEM, TRIAGE_MAX_TOKENS, on_text, prefix)
+    except Exception:
+        if not rows:
+            raise
+        log.warning("Triage response failed after %d of %d rows, keeping those", len(rows), len(items))
+
+    missing = [i for i in items if i["number"] not in rows]
+    if missing and attempt < MAX_REREQUESTS:
+        # Ask again for just the issues that didn't come back valid
+        log.info("Re-requesting triage for %d of %d issues", len(missing), len(items))
+        try:
+            for row in await _analyze_chunk(missing, prefix, api_key, attempt + 1):
+                rows[row["number"]] = row
+        except Exception:
+            if not rows:
+                raise
+            log.warning("Re-request failed, %d issues left untriaged", len(missing), exc_info=True)
+    if not rows:
+        raise ValueError(f"No valid triage rows for {len(items)} issues")
+    return [rows[i["number"]] for i in items if i["number"] in rows]
+
+
+async def analyze_issues(issues: list[dict], api_key: str | None = None, prs: list[dict] | None = None) -> list[dict]:
     """Estimate difficulty and urgency for each issue.
 
+    Large backlogs are split into token-budgeted chunks that are triaged
+    concurrently (within the shared concurrency limit) and reassembled in
+    issue order. A chunk that fails is left out and logged, so the rows
+    already paid for are kept; only if every chunk fails is the error raised.
+
     Returns list of {number, title, difficulty, urgency, summary, has_pr}.
     """
     if not issues:
         return []
-    pr_section = ""
-    if prs:
-        pr_section = f"\n\nOpen pull requests (issues with PRs are already being worked on):\n{json.dumps(prs, indent=2, default=str)}\n"
+    prefix = _triage_prefix(prs)
+    chunks = _chunks([_triage_item(i) for i in issues])
+    results = []
+    if len(chunks) > 1 and api_key and len(SYSTEM + prefix) // 4 >= CACHE_MIN_TOKENS:
+        # Let the first chunk write the cached prefix before the rest read it
+        results += await asyncio.gather(_analyze_chunk(chunks.pop(0), prefix, api_key), return_exceptions=True)
+    results += await asyncio.gather(*(_analyze_chunk(c, prefix, api_key) for c in chunks), return_exceptions=True)
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if len(failed) == len(results):
+        raise failed[0]
+    for e in failed:
+        log.warning("Triage chunk failed, keeping the other chunks' rows: %s", e)
+    rows = {r["number"]: r for chunk in results if not isinstance(chunk, BaseException) for r in chunk}
+    return [rows[i["number"]] for i in issues if i["number"] in rows]
 
-    prompt = f"""Analyze these GitHub issues. For each, estimate:
-- difficulty: easy / medium / hard
-- urgency: low / medium / high
-- summary: one-line summary of what needs to be done
-- has_pr: true if an open PR already addresses this issue, false otherwise
 
-Issues:
-{json.dumps(issues, indent=2, default=str)}{pr_section}
+_RANK = {"high": 0, "medium": 1, "low": 2, "easy": 0, "hard": 2}
 
-Return a JSON array of objects with keys: number, title, difficulty, urgency, summary, has_pr."""
 
-    raw = _call(prompt, api_key, SYSTEM)
-    log.info("analyze_issues raw response (first 500 chars): %s", raw[:500])
-    # Strip markdown fences if present
-    text = raw.strip()
-    if text.startswith("```"):
-        text = text.split("\n", 1)[1]  # remove ```json line
-    if text.endswith("```"):
-        text = text[:-3]
-    return json.loads(text)
+def _rank_key(row: dict) -> tuple:
+    return (_RANK.get(row.get("urgency"), 1), _RANK.get(row.get("difficulty"), 1))
 
 
-def suggest_next(issues: list[dict], api_key: str | None = None) -> str:
-    """Suggest which issue to work on next. Returns readable text."""
+async def suggest_next(issues: list[dict], api_key: str | None = None) -> str:
+    """Suggest which issue to work on next. Returns readable text.
+
+    Only compact triage rows are sent: issues that already have a PR are
+    dropped and the rest pre-ranked (urgent and easy first) down to
+    SUGGEST_TOP.
+    """
     if not issues:
         return "No open issues found."
-    prompt = f"""Given these GitHub issues with analysis, suggest which one to work on next and why. Skip issues that already have PRs (has_pr: true). Be concise (2-3 sentences).
+    keys = ("repo", "number", "title", "difficulty", "urgency", "summary")
+    candidates = sorted((i for i in issues if not i.get("has_pr")), key=_rank_key)[:SUGGEST_TOP]
+    if not candidates:
+        return "Every open issue already has a PR."
+    rows = [{k: i[k] for k in keys if k in i} for i in candidates]
+    prompt = f"""Given these triaged GitHub issues, suggest which one to work on next and why. Be concise (2-3 sentences).
 
-Issues:
-{json.dumps(issues, indent=2, default=str)}"""
+Issues (JSON):
+{_compact(rows)}"""
 
-    return _call(prompt, api_key)
+    return await _call(prompt, api_key)
 
 
-def review_codebase(repo_path: str, existing_issues: list[dict] | None = None, api_key: str | None = None) -> list[dict]:
+async def review_codebase(repo_path: str, existing_issues: list[dict] | None = None, api_key: str | None = None) -> list[dict]:
     """Run Claude on a repo to identify improvements and drawbacks.
 
     Uses --print mode (no edits). Returns list of {title, body} dicts
@@ -122,24 +426,30 @@ def review_codebase(repo_path: str, existing_issues: list[dict] | None = None, a
         "- title: concise issue title (imperative, e.g. 'Fix race condition in worker')\n"
         "- body: detailed description of the problem and suggested fix"
     )
-    result = subprocess.run(
-        ["claude", "--print", "-p", f"{system}\n\n{prompt}"],
-        cwd=repo_path, capture_output=True, text=True,
-    )
-    if result.returncode != 0:
-        raise RuntimeError(f"claude CLI failed: {result.stderr.strip()}")
-    raw = result.stdout.strip()
+    returncode, stdout, stderr = await _run_cli(f"{system}\n\n{prompt}", cwd=repo_path, agentic=True)
+    if returncode != 0:
+        raise RuntimeError(f"claude CLI failed: {stderr.strip()}")
+    raw = stdout.strip()
     if not raw:
         return []
-    text = raw.strip()
-    if text.startswith("```"):
-        text = text.split("\n", 1)[1]
-    if text.endswith("```"):
-        text = text[:-3]
-    return json.loads(text)
+    suggestions = extract(raw, ReviewSuggestion)
+    if not suggestions and not _empty_array(raw):
+        raise ValueError(f"No suggestions in review output: {raw[:200]}")
+    return [s.model_dump() for s in suggestions]
+
 
+def _empty_array(text: str) -> bool:
+    """Whether the outermost [...] in text parses as an empty JSON array (a clean review)."""
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        return False
+    try:
+        return json.loads(text[start:end + 1]) == []
+    except ValueError:
+        return False
 
-def review_pr(pr: dict, comments: list[dict], repo_path: str, api_key: str | None = None) -> str:
+
+async def review_pr(pr: dict, comments: list[dict], repo_path: str, api_key: str | None = None) -> str:
     """Review a PR by running Claude on the checked-out branch.
 
     Returns Claude's review text as a comment to post on the PR.
@@ -165,10 +475,7 @@ def review_pr(pr: dict, comments: list[dict], repo_path: str, api_key: str | Non
         "3. Any existing comments that still need to be addressed\n\n"
         "Be brief and actionable."
     )
-    result = subprocess.run(
-        ["claude", "--print", "-p", prompt],
-        cwd=repo_path, capture_output=True, text=True,
-    )
-    if result.returncode != 0:
-        raise RuntimeError(f"claude CLI failed: {result.stderr.strip()}")
-    return result.stdout.strip() or "No review output."
+    returncode, stdout, stderr = await _run_cli(prompt, cwd=repo_path, agentic=True)
+    if returncode != 0:
+        raise RuntimeError(f"claude CLI failed: {stderr.strip()}")
+    return stdout.strip() or "No review output."
@@ -0,0 +1,94 @@
+"""Async facade over minbot.github.
+
+PyGithub and the git CLI are blocking, so every call is offloaded to a
+bounded thread pool. Return values are the same dicts as minbot.github.
+
+Calls made while github.background is set (scheduled jobs) go to their own
+pool: they may sleep on the API token bucket, and interactive commands
+shouldn't queue behind them. Git work (clones, fetches, worktrees, pushes)
+goes through run_git to a third pool, so a cold clone never holds up API
+calls.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from minbot import github
+
+MAX_WORKERS = 8
+BACKGROUND_WORKERS = 4
+GIT_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="github")
+_background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="github-bg")
+_git_executor = ThreadPoolExecutor(max_workers=GIT_WORKERS, thread_name_prefix="git")
+
+
+async def _run_in(executor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, ctx.run, functools.partial(fn, *args, **kwargs))
+
+
+async def run(fn, *args, **kwargs):
+    """Run a blocking callable in the GitHub executor, in the caller's context."""
+    executor = _background_executor if github.background.get() else _executor
+    return await _run_in(executor, fn, *args, **kwargs)
+
+
+async def run_git(fn, *args, **kwargs):
+    """Run blocking git work in the git executor, in the caller's context."""
+    return await _run_in(_git_executor, fn, *args, **kwargs)
+
+
+async def list_issues(repo: str, include_prs: bool = False, limit: int | None = 30) -> list[dict]:
+    return await run(github.list_issues, repo, include_prs=include_prs, limit=limit)
+
+
+async def search_items(repo: str, is_pr: bool, **filters) -> tuple[list[dict], int]:
+    return await run(github.search_items, repo, is_pr, **filters)
+
+
+async def get_issue(repo: str, number: int) -> dict:
+    return await run(github.get_issue, repo, number)
+
+
+async def create_pr(repo: str, title: str, body: str, branch: str) -> str:
+    return await run(github.create_pr, repo, title, body, branch)
+
+
+async def list_prs(repo: str, limit: int | None = 20) -> list[dict]:
+    return await run(github.list_prs, repo, limit=limit)
+
+
+async def sync_issues(repo: str) -> list[dict]:
+    return await run(github.sync_issues, repo)
+
+
+async def get_pr(repo: str, number: int) -> dict:
+    return await run(github.get_pr, repo, number)
+
+
+async def get_pr_comments(repo: str, number: int) -> list[dict]:
+    return await run(github.get_pr_comments, repo, number)
+
+
+async def get_pr_context(repo: str, number: int) -> tuple[dict, list[dict]]:
+    return await run(github.get_pr_context, repo, number)
+
+
+async def prime_mirrors(repos: list[str]) -> dict[str, list[dict]]:
+    return await run(github.prime_mirrors, repos)
+
+
+async def create_issue(repo: str, title: str, body: str) -> str:
+    return await run(github.create_issue, repo, title, body)
+
+
+async def add_pr_comment(repo: str, number: int, body: str) -> None:
+    await run(github.add_pr_comment, repo, number, body)
+
+
+async def push_branch(repo_path: str, branch: str, set_upstream: bool = False) -> None:
+    await run_git(github.push_branch, repo_path, branch, set_upstream)
@@ -1,23 +1,37 @@
 """Telegram bot entry point."""
 
 import asyncio
+import functools
+import itertools
 import logging
-import os
-from telegram import Update
+from collections import OrderedDict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
-    Application, CommandHandler, ContextTypes,
+    Application, CallbackQueryHandler, CommandHandler, ContextTypes,
 )
-from minbot import github, agent, worker, scheduler
-from minbot.config import load_config, save_config
+from minbot import github, agithub, agent, worker, scheduler, triage, jobs, store, workspace, webhook, outbox, filters
+from minbot import config as config_service
+from minbot.config import Config, get_config, save_config
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
-_current_task: asyncio.Task | None = None
+# Issues or PRs per page of /issues and /prs (all open issues are triaged for /suggest)
+PAGE_SIZE = 10
+# Listings whose "Next page" button still works
+PAGED_LISTINGS_KEPT = 200
+# A job interrupted by this many restarts in a row is dropped instead of resumed
+MAX_RESUMES = 2
+# Notifications (scheduled checks, webhooks) wait this long so a burst goes out as one message
+NOTIFY_LINGER_SECONDS = 2.0
 
+# Paged listings by id, for the "Next page" buttons: (command, repo, filter args)
+_listings: OrderedDict[int, tuple[str, str, list[str]]] = OrderedDict()
+_listing_ids = itertools.count(1)
 
-def _get_config():
-    return load_config()
+
+def _get_config() -> Config:
+    return get_config()
 
 
 def _authorized(update: Update, config) -> bool:
@@ -25,6 +39,11 @@ def _authorized(update: Update, config) -> bool:
     return not config.telegram_chat_id or update.effective_chat.id == config.telegram_chat_id
 
 
+async def _reply(update: Update, text: str) -> None:
+    """Answer in the chat an update came from, through the outbox."""
+    await outbox.send(update.effective_chat.id, text)
+
+
 async def cmd_start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     config = _get_config()
     chat_id = update.effective_chat.id
@@ -34,18 +53,19 @@ async def cmd_start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         return
 
     if config.telegram_chat_id != chat_id:
-        config.telegram_chat_id = chat_id
-        save_config(config)
+        save_config(config.model_copy(update={"telegram_chat_id": chat_id}))
         log.info("Saved chat_id %s", chat_id)
 
-    await update.message.reply_text(
+    await _reply(
+        update,
         "minbot is running. Commands:\n"
-        "/issues - list issues with estimates\n"
-        "/prs - list open pull requests\n"
+        "/issues [repo] [filters] - list issues with estimates\n"
+        "/prs [repo] [filters] - list open pull requests\n"
         "/work <number> or /work <repo> <number> - work on an issue\n"
         "/pr <number> [comments] - address PR review comments\n"
         "/review [repo] - run a code review\n"
-        "/status - check current work status\n"
+        "/status - list running and queued jobs\n"
+        "/cancel <id> - cancel a queued or running job\n"
         "/suggest - get suggestion on what to work on\n"
         "/repos - list configured repos"
     )
@@ -55,8 +75,16 @@ async def cmd_repos(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     config = _get_config()
     if not _authorized(update, config):
         return
-    text = "Configured repos:\n" + "\n".join(f"- {r}" for r in config.github_repos)
-    await update.message.reply_text(text)
+    stats = github.clone_stats()
+    lines = []
+    for r in config.github_repos:
+        line = f"- {r}"
+        if r in stats:
+            st = stats[r]
+            line += f" (last {st['op']}: {st['seconds']:.1f}s, {st['bytes'] / 1e6:.1f} MB)"
+        lines.append(line)
+    text = "Configured repos:\n" + "\n".join(lines)
+    await _reply(update, text)
 
 
 def _resolve_repos(config, args) -> list[str]:
@@ -74,35 +102,153 @@ def _resolve_repos(config, args) -> list[str]:
     return config.github_repos
 
 
+def _page_count(total: int) -> int:
+    return max(1, -(-total // PAGE_SIZE))
+
+
+def _page_of(items: list, page: int) -> list:
+    return items[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+
+
+def _page_markup(command: str, repo: str, f: filters.Filters, pages: int, listing_id: int | None = None):
+    """Inline keyboard with a "Next page" button, or None on the last page."""
+    if f.page >= pages:
+        return None
+    if listing_id is None:
+        listing_id = next(_listing_ids)
+        _listings[listing_id] = (command, repo, f.args)
+        while len(_listings) > PAGED_LISTINGS_KEPT:
+            _listings.popitem(last=False)
+    button = InlineKeyboardButton(f"Next page ({f.page + 1}/{pages})", callback_data=f"page:{listing_id}:{f.page + 1}")
+    return InlineKeyboardMarkup([[button]])
+
+
+def _header(repo: str, f: filters.Filters, pages: int) -> str:
+    return f"[{repo}]" + (f" page {f.page}/{pages}" if pages > 1 else "")
+
+
+def _issues_section(header: str, rows: list[dict]) -> str:
+    """One page of a repo's /issues listing; rows without triage yet show as pending."""
+    text = f"{header}\n"
+    for a in rows:
+        text += f"#{a['number']} {a['title']}\n"
+        if "difficulty" in a:
+            text += f"  Difficulty: {a['difficulty']} | Urgency: {a['urgency']}\n  {a['summary']}\n\n"
+        else:
+            text += "  (triaging...)\n\n"
+    return text.rstrip() if rows else f"{header}\nNo more results."
+
+
+def _items_section(header: str, items: list[dict]) -> str:
+    """One page of untriaged issues or PRs: number, title, labels, state."""
+    lines = [header]
+    for i in items:
+        line = f"#{i['number']} {i['title']}"
+        if i["labels"]:
+            line += f" [{', '.join(i['labels'])}]"
+        if i["state"] != "open":
+            line += f" ({i['state']})"
+        lines.append(line)
+    return "\n".join(lines) if items else f"{header}\nNo more results."
+
+
+async def _issue_page(repo: str, f: filters.Filters, config: Config, on_listed=None) -> tuple[str | None, int]:
+    """Render one page of a repo's /issues listing. Returns (text, pages); text is None if nothing matches.
+
+    Open issues come from the mirror and only the requested page is
+    triaged, unless a difficulty/urgency/has_pr filter needs every match's
+    triage row. Closed issues are searched on GitHub and not triaged.
+    on_listed(text), if given, gets the page before triage finishes.
+    """
+    if f.state != "open":
+        items, total = await agithub.search_items(
+            repo, False, state=f.state, labels=f.labels, assignee=f.assignee, created=f.created(),
+            page=f.page, per_page=PAGE_SIZE,
+        )
+        pages = _page_count(total)
+        return (_items_section(_header(repo, f, pages), items) if total else None), pages
+
+    matched = 0
+
+    def select(issues):
+        nonlocal matched
+        issues = [i for i in issues if f.match(i)]
+        matched = len(issues)
+        return issues if f.on_rows() else _page_of(issues, f.page)
+
+    async def listed(rows):
+        await on_listed(_issues_section(_header(repo, f, _page_count(matched)), rows))
+
+    rows = await triage.analyze_repo(repo, config, listed if on_listed and not f.on_rows() else None, select)
+    if f.on_rows():
+        rows = [r for r in rows if f.match_row(r)]
+        matched = len(rows)
+        rows = _page_of(rows, f.page)
+    pages = _page_count(matched)
+    return (_issues_section(_header(repo, f, pages), rows) if matched else None), pages
+
+
+async def _pr_page(repo: str, f: filters.Filters) -> tuple[str | None, int]:
+    """Render one page of a repo's /prs listing. Returns (text, pages); text is None if nothing matches."""
+    if f.state != "open":
+        prs, total = await agithub.search_items(
+            repo, True, state=f.state, labels=f.labels, assignee=f.assignee, created=f.created(),
+            page=f.page, per_page=PAGE_SIZE,
+        )
+    else:
+        items = await agithub.list_issues(repo, include_prs=True, limit=None)
+        prs = [i for i in items if i["is_pr"] and f.match(i)]
+        total = len(prs)
+        prs = _page_of(prs, f.page)
+    pages = _page_count(total)
+    return (_items_section(_header(repo, f, pages), prs) if total else None), pages
+
+
+def _parse_listing_args(config, args) -> tuple[filters.Filters, list[str]]:
+    """Filters and the repos they apply to; raises ValueError with a message for the user."""
+    f, rest = filters.parse(args)
+    repos = _resolve_repos(config, rest)
+    if not repos:
+        raise ValueError(f"Repo not found. Configured: {', '.join(config.github_repos)}")
+    return f, repos
+
+
 async def cmd_issues(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     config = _get_config()
     if not _authorized(update, config):
         return
 
-    repos = _resolve_repos(config, ctx.args)
-    if not repos:
-        await update.message.reply_text(f"Repo not found. Configured: {', '.join(config.github_repos)}")
+    try:
+        f, repos = _parse_listing_args(config, ctx.args)
+    except ValueError as e:
+        await _reply(update, str(e))
         return
 
-    await update.message.reply_text("Fetching issues...")
+    chat_id = update.effective_chat.id
+
+    async def show(repo):
+        # Post the raw/cached page as soon as it's fetched, then edit in the triage
+        listing = None
 
-    text = ""
-    for repo in repos:
-        all_items = github.list_issues(repo, include_prs=True)
-        issues = [i for i in all_items if not i["is_pr"]]
-        prs = [i for i in all_items if i["is_pr"]]
-        if not issues:
-            continue
-        analyzed = agent.analyze_issues(issues, config.anthropic_api_key, prs)
-        text += f"[{repo}]\n"
-        for a in analyzed:
-            text += (
-                f"#{a['number']} {a['title']}\n"
-                f"  Difficulty: {a['difficulty']} | Urgency: {a['urgency']}\n"
-                f"  {a['summary']}\n\n"
-            )
+        async def listed(text):
+            nonlocal listing
+            listing = asyncio.create_task(outbox.post(chat_id, text))
+
+        try:
+            text, pages = await _issue_page(repo, f, config, listed)
+        except Exception as e:
+            text, pages = f"[{repo}]\nFailed to analyze: {e}", 1
+        markup = _page_markup("issues", repo, f, pages) if text else None
+        if listing:
+            await outbox.edit(await listing, text or f"[{repo}]\nNo open issues.", markup)
+        elif text:
+            await outbox.send(chat_id, text, markup=markup)
+        return text
 
-    await update.message.reply_text(text or "No open issues.")
+    await triage.prime_mirrors(repos)
+    results = await triage.fan_out(repos, show, config.max_concurrent_repos)
+    if not any(text for _, text in results):
+        await _reply(update, "No matching issues." if f.args else "No open issues.")
 
 
 async def cmd_prs(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
@@ -110,26 +256,55 @@ async def cmd_prs(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     if not _authorized(update, config):
         return
 
-    repos = _resolve_repos(config, ctx.args)
-    if not repos:
-        await update.message.reply_text(f"Repo not found. Configured: {', '.join(config.github_repos)}")
+    try:
+        f, repos = _parse_listing_args(config, ctx.args)
+        if f.on_rows():
+            raise ValueError("difficulty, urgency and has_pr only apply to /issues")
+    except ValueError as e:
+        await _reply(update, str(e))
         return
 
-    text = ""
-    for repo in repos:
-        prs = [i for i in github.list_issues(repo, include_prs=True) if i["is_pr"]]
-        if not prs:
+    await triage.prime_mirrors(repos)
+    chat_id = update.effective_chat.id
+    found = False
+    for repo, result in await triage.fan_out(repos, lambda r: _pr_page(r, f), config.max_concurrent_repos):
+        if isinstance(result, Exception):
+            await _reply(update, f"[{repo}]\nFailed to fetch: {result}")
+            found = True
             continue
-        text += f"[{repo}]\n"
-        for p in prs:
-            labels = ", ".join(p["labels"]) if p["labels"] else ""
-            text += f"#{p['number']} {p['title']}"
-            if labels:
-                text += f" [{labels}]"
-            text += "\n"
-        text += "\n"
+        text, pages = result
+        if text:
+            await outbox.send(chat_id, text, markup=_page_markup("prs", repo, f, pages))
+            found = True
+
+    if not found:
+        await _reply(update, "No matching pull requests." if f.args else "No open pull requests.")
 
-    await update.message.reply_text(text or "No open pull requests.")
+
+async def on_page(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    """"Next page" button under an /issues or /prs listing: edit the message to show that page."""
+    config = _get_config()
+    if not _authorized(update, config):
+        return
+    query = update.callback_query
+    _, listing_id, page = query.data.split(":")
+    listing = _listings.get(int(listing_id))
+    if listing is None:
+        await query.answer("This listing has expired; run the command again.")
+        return
+    await query.answer()
+    command, repo, args = listing
+    f, _ = filters.parse(args + [f"page:{page}"])
+    try:
+        if command == "issues":
+            text, pages = await _issue_page(repo, f, config)
+        else:
+            text, pages = await _pr_page(repo, f)
+    except Exception as e:
+        await outbox.send(update.effective_chat.id, f"[{repo}]\nFailed to fetch page {page}: {e}")
+        return
+    markup = _page_markup(command, repo, f, pages, int(listing_id))
+    await outbox.edit(query.message, text or f"[{repo}]\nNo more results.", markup)
 
 
 async def cmd_suggest(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
@@ -139,27 +314,47 @@ async def cmd_suggest(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     repos = _resolve_repos(config, ctx.args)
     if not repos:
-        await update.message.reply_text(f"Repo not found. Configured: {', '.join(config.github_repos)}")
+        await _reply(update, f"Repo not found. Configured: {', '.join(config.github_repos)}")
         return
 
+    # Progress message, posted once some repo needs the LLM and edited as repos finish
+    chat_id = update.effective_chat.id
+    status = {}
+    progress = None
+
+    async def report(repo, state):
+        nonlocal progress
+        status[repo] = state
+        text = "Triaging issues...\n" + "\n".join(f"{r}: {st}" for r, st in status.items())
+        if progress is None:
+            progress = asyncio.create_task(outbox.post(chat_id, text))
+        else:
+            await outbox.edit(await progress, text)
+
+    async def triage_repo(repo):
+        async def listed(rows):
+            pending = sum("difficulty" not in r for r in rows)
+            await report(repo, f"{len(rows)} open, {pending} to triage")
+
+        analyzed = await triage.analyze_repo(repo, config, on_listed=listed)
+        if progress:
+            await report(repo, f"{len(analyzed)} triaged")
+        return analyzed
+
+    await triage.prime_mirrors(repos)
     all_analyzed = []
-    for repo in repos:
-        all_items = github.list_issues(repo, include_prs=True)
-        issues = [i for i in all_items if not i["is_pr"]]
-        prs = [i for i in all_items if i["is_pr"]]
-        if not issues:
+    for repo, analyzed in await triage.fan_out(repos, triage_repo, config.max_concurrent_repos):
+        if isinstance(analyzed, Exception):
+            await _reply(update, f"Failed to analyze {repo}: {analyzed}")
             continue
-        analyzed = agent.analyze_issues(issues, config.anthropic_api_key, prs)
-        for a in analyzed:
-            a["repo"] = repo
         all_analyzed.extend(analyzed)
 
     if not all_analyzed:
-        await update.message.reply_text("No open issues to suggest.")
+        await _reply(update, "No open issues to suggest.")
         return
 
-    suggestion = agent.suggest_next(all_analyzed, config.anthropic_api_key)
-    await update.message.reply_text(suggestion)
+    suggestion = await agent.suggest_next(all_analyzed, config.anthropic_api_key)
+    await _reply(update, suggestion)
 
 
 def _parse_repo_and_number(config, args):
@@ -195,91 +390,171 @@ def _parse_repo_and_number(config, args):
     return repo, number, args[2:]
 
 
-async def cmd_work(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    global _current_task
-    config = _get_config()
-    if not _authorized(update, config):
-        return
-
-    if not ctx.args:
-        await update.message.reply_text("Usage: /work <number> or /work <repo> <number>")
-        return
+def _pop_priority(args: list[str]) -> tuple[int, list[str]]:
+    """Strip a leading `!` (priority 1) or `!<n>` token from the remaining args."""
+    if args and args[0].startswith("!"):
+        try:
+            return int(args[0][1:] or 1), args[1:]
+        except ValueError:
+            pass
+    return 0, args
 
-    try:
-        repo, number, _ = _parse_repo_and_number(config, ctx.args)
-    except ValueError as e:
-        await update.message.reply_text(str(e))
-        return
 
-    issue = github.get_issue(repo, number)
+def _queued_note(job) -> str:
+    if job.state == "running":
+        return f"Job {job.id} started."
+    position = [j.id for j in jobs.active() if j.state == "queued"].index(job.id) + 1
+    return f"Job {job.id} queued (position {position}). Check /status."
 
-    if _current_task and not _current_task.done():
-        await update.message.reply_text("Already working on something. Check /status.")
-        return
 
-    await update.message.reply_text(f"Starting work on {repo}#{number}: {issue['title']}")
+def _live_output(chat_id: int, title: str):
+    """on_output callback that keeps one progress message updated in place."""
+    message = None
+    last = None
 
     async def on_output(text: str):
-        pass
+        nonlocal message, last
+        body = f"{title}\n\n{text[-3500:]}"
+        if message is None:
+            message = await outbox.post(chat_id, body)
+        elif body != last:
+            await outbox.edit(message, body)
+        last = body
+
+    return on_output
+
+
+def _submit_work(chat_id: int, config: Config, repo: str, issue: dict, priority: int, journal_id: int, resume=None):
+    """Queue a /work job that reports back to chat_id."""
+    on_output = _live_output(chat_id, f"Working on {repo}#{issue['number']}...")
+
+    async def do_work():
+        try:
+            result = await worker.work_on_issue(config.workspace_dir, repo, issue, on_output, resume)
+            await outbox.send(chat_id, result)
+        except Exception as e:
+            await outbox.send(chat_id, f"Error: {e}")
+            raise  # so the job is recorded as failed
+
+    return jobs.submit(repo, f"work {repo}#{issue['number']}", do_work, priority, journal_id)
+
+
+def _submit_pr(
+    chat_id: int, config: Config, repo: str, pr: dict, comments: list[dict], user_instructions: str,
+    priority: int, journal_id: int, resume=None,
+):
+    """Queue a /pr job that reports back to chat_id."""
+    on_output = _live_output(chat_id, f"Addressing {repo} PR #{pr['number']}...")
 
     async def do_work():
         try:
-            result = await worker.work_on_issue(
-                config.workspace_dir, repo, issue, on_output,
+            result = await worker.address_pr_comments(
+                config.workspace_dir, repo, pr, comments, user_instructions, on_output, resume,
             )
-            await update.message.reply_text(result)
+            await outbox.send(chat_id, result)
         except Exception as e:
-            await update.message.reply_text(f"Error: {e}")
+            await outbox.send(chat_id, f"Error: {e}")
+            raise  # so the job is recorded as failed
 
-    _current_task = asyncio.create_task(do_work())
+    return jobs.submit(repo, f"pr {repo}#{pr['number']}", do_work, priority, journal_id)
 
 
-async def cmd_pr(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    global _current_task
+async def _resume_jobs() -> None:
+    """Requeue /work and /pr jobs a restart interrupted, and tell their chats."""
+    config = _get_config()
+    for entry in store.journal_active():
+        chat_id = entry["chat_id"]
+        reply = functools.partial(outbox.send, chat_id)
+        what = f"{entry['kind']} {entry['repo']}#{entry['number']}"
+        if store.journal_resumed(entry["id"]) > MAX_RESUMES:
+            store.journal_close(entry["id"], "abandoned")
+            await reply(f"Giving up on {what}: interrupted by a restart {MAX_RESUMES + 1} times.")
+            continue
+        params = entry["params"]
+        if entry["kind"] == "work":
+            job = _submit_work(chat_id, config, entry["repo"], params["issue"], params["priority"], entry["id"], entry)
+        else:
+            job = _submit_pr(
+                chat_id, config, entry["repo"], params["pr"], params["comments"], params["instructions"],
+                params["priority"], entry["id"], entry,
+            )
+        log.info("Resuming %s from phase %s", what, entry["phase"])
+        await reply(f"Resuming {what} after a restart (last completed step: {entry['phase']}).\n{_queued_note(job)}")
+
+
+async def cmd_work(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     config = _get_config()
     if not _authorized(update, config):
         return
 
     if not ctx.args:
-        await update.message.reply_text(
-            "Usage: /pr <number> [comments] or /pr <repo> <number> [comments]"
-        )
+        await _reply(update, "Usage: /work <number> or /work <repo> <number> [!priority]")
         return
 
     try:
         repo, number, remaining = _parse_repo_and_number(config, ctx.args)
     except ValueError as e:
-        await update.message.reply_text(str(e))
+        await _reply(update, str(e))
         return
 
-    user_instructions = " ".join(remaining)
+    priority, _ = _pop_priority(remaining)
+    issue = await agithub.get_issue(repo, number)
+    journal_id = store.journal_open(
+        "work", repo, number, update.effective_chat.id, {"issue": issue, "priority": priority},
+    )
+    job = _submit_work(update.effective_chat.id, config, repo, issue, priority, journal_id)
+    await _reply(
+        update,
+        f"Work on {repo}#{number}: {issue['title']}\n{_queued_note(job)}"
+    )
+
+
+async def cmd_pr(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    config = _get_config()
+    if not _authorized(update, config):
+        return
 
-    if _current_task and not _current_task.done():
-        await update.message.reply_text("Already working on something. Check /status.")
+    if not ctx.args:
+        await _reply(
+            update,
+            "Usage: /pr <number> [!priority] [comments] or /pr <repo> <number> [!priority] [comments]"
+        )
+        return
+
+    try:
+        repo, number, remaining = _parse_repo_and_number(config, ctx.args)
+    except ValueError as e:
+        await _reply(update, str(e))
         return
 
-    pr = github.get_pr(repo, number)
-    comments = github.get_pr_comments(repo, number)
+    priority, remaining = _pop_priority(remaining)
+    user_instructions = " ".join(remaining)
 
-    await update.message.reply_text(
+    pr, comments = await agithub.get_pr_context(repo, number)
+    journal_id = store.journal_open("pr", repo, number, update.effective_chat.id, {
+        "pr": pr, "comments": comments, "instructions": user_instructions, "priority": priority,
+    })
+    job = _submit_pr(update.effective_chat.id, config, repo, pr, comments, user_instructions, priority, journal_id)
+    await _reply(
+        update,
         f"Addressing review comments on {repo} PR #{number}: {pr['title']}\n"
-        f"Found {len(comments)} comment(s)."
+        f"Found {len(comments)} comment(s).\n{_queued_note(job)}"
     )
 
-    async def on_output(text: str):
-        pass
-
-    async def do_work():
-        try:
-            result = await worker.address_pr_comments(
-                config.workspace_dir, repo, pr, comments,
-                user_instructions, on_output,
-            )
-            await update.message.reply_text(result)
-        except Exception as e:
-            await update.message.reply_text(f"Error: {e}")
 
-    _current_task = asyncio.create_task(do_work())
+async def cmd_cancel(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+    config = _get_config()
+    if not _authorized(update, config):
+        return
+    try:
+        job_id = int(ctx.args[0])
+    except (IndexError, ValueError):
+        await _reply(update, "Usage: /cancel <job id>")
+        return
+    if jobs.cancel(job_id):
+        await _reply(update, f"Cancelled job {job_id}.")
+    else:
+        await _reply(update, f"No queued or running job {job_id}.")
 
 
 async def cmd_review(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
@@ -289,20 +564,22 @@ async def cmd_review(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 
     repos = _resolve_repos(config, ctx.args)
     if not repos:
-        await update.message.reply_text(f"Repo not found. Configured: {', '.join(config.github_repos)}")
+        await _reply(update, f"Repo not found. Configured: {', '.join(config.github_repos)}")
         return
 
-    await update.message.reply_text("Starting code review...")
+    await _reply(update, "Starting code review...")
 
     async def do_review():
         try:
             for repo in repos:
-                repo_path = os.path.join(config.workspace_dir, repo)
-                github.clone_repo(repo, repo_path)
-                existing = github.list_issues(repo, include_prs=False)
-                suggestions = agent.review_codebase(repo_path, existing, config.anthropic_api_key)
+                existing = await agithub.list_issues(repo, include_prs=False)
+                async with workspace.checkout(config.workspace_dir, repo) as repo_path:
+                    suggestions = await agent.review_codebase(
+                        repo_path, existing, config.anthropic_api_key,
+                    )
+                store.record_review(repo, "codebase", detail="\n".join(s["title"] for s in suggestions))
                 if not suggestions:
-                    await update.message.reply_text(f"Review of {repo}: no suggestions.")
+                    await _reply(update, f"Review of {repo}: no suggestions.")
                     continue
                 created = []
                 for s in suggestions:
@@ -311,35 +588,89 @@ async def cmd_review(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
                         f"---\n"
                         f"_Identified by [minbot](https://github.com/ChicagoHAI/minbot) code review_"
                     )
-                    url = github.create_issue(repo, s["title"], body)
+                    url = await agithub.create_issue(repo, s["title"], body)
                     created.append(f"- {s['title']}: {url}")
-                await update.message.reply_text(
+                await _reply(
+                    update,
                     f"Review of {repo} — created {len(created)} issue(s):\n"
                     + "\n".join(created)
                 )
         except Exception as e:
-            await update.message.reply_text(f"Review error: {e}")
+            await _reply(update, f"Review error: {e}")
 
     asyncio.create_task(do_review())
 
 
+def _format_elapsed(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
 async def cmd_status(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     config = _get_config()
     if not _authorized(update, config):
         return
-    if _current_task is None:
-        await update.message.reply_text("No work in progress.")
-    elif _current_task.done():
-        await update.message.reply_text("Last task completed.")
-    else:
-        await update.message.reply_text("Work in progress...")
+    lines = []
+    for job in jobs.active():
+        if job.state == "running":
+            lines.append(f"[{job.id}] running {_format_elapsed(job.elapsed())}: {job.description}")
+            if job.telemetry:
+                lines.append(f"    {job.telemetry.status_line()}")
+        else:
+            lines.append(f"[{job.id}] queued (priority {job.priority}): {job.description}")
+    # From the store, so jobs finished before a restart still show
+    for h in store.job_history(3):
+        took = f" after {_format_elapsed(h['finished_at'] - h['started_at'])}" if h["started_at"] else ""
+        lines.append(f"[{h['job_id']}] {h['state']}{took}: {h['description']}")
+    text = "\n".join(lines) if lines else "No work in progress."
+    await _reply(update, f"{text}\n\n{_api_usage()}")
+
+
+def _api_usage() -> str:
+    """Summary of GitHub rate-limit budget, cache effectiveness and LLM token use."""
+    http = github.http_stats()
+    tri = triage.cache_stats()
+    budget = (
+        f"{http['rate_remaining']}/{http['rate_limit']} left"
+        if http["rate_remaining"] is not None else "budget unknown"
+    )
+    llm = agent.usage_stats()
+    return (
+        f"GitHub API: {budget}, {http['requests']} requests, "
+        f"{http['hit_ratio']:.0%} served by 304, "
+        f"{http['throttled_seconds']:.0f}s spent throttled\n"
+        f"Triage cache: {tri['hits']} hits, {tri['misses']} misses\n"
+        f"LLM: {llm['calls']} calls, {llm['output_tokens']:,} tokens out, "
+        f"{llm['cache_read_ratio']:.0%} of input from prompt cache"
+    )
 
 
-def main():
-    config = load_config()
-    github.set_token(config.github_token)
-    app = Application.builder().token(config.telegram_token).build()
+def _apply_config(config: Config) -> None:
+    """Push runtime settings from a config snapshot into the modules that use them."""
+    jobs.configure(config.max_jobs, config.max_jobs_per_repo)
+    github.set_rate(config.github_requests_per_hour)
+    agent.configure(config.llm_concurrency, config.llm_timeout_seconds)
+    # A repo counts as warm for two warmer intervals, so one slow cycle
+    # doesn't push jobs back onto a cold fetch
+    warm_seconds = (config.warm_interval_minutes or 0) * 60 * 2
+    workspace.configure(config.clone, config.clone_overrides, warm_seconds)
+
+
+def _on_config_change(old: Config, new: Config) -> None:
+    log.info("Config changed, applying")
+    if new.github_token != old.github_token:
+        github.set_token(new.github_token)
+    _apply_config(new)
+
 
+def _build_app(token: str) -> Application:
+    """The Telegram application with every handler registered.
+
+    Updates are handled concurrently, so a slow /issues or /suggest doesn't
+    hold up /status or other commands behind it.
+    """
+    app = Application.builder().token(token).concurrent_updates(True).build()
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("issues", cmd_issues))
     app.add_handler(CommandHandler("prs", cmd_prs))
@@ -348,18 +679,48 @@ def main():
     app.add_handler(CommandHandler("pr", cmd_pr))
     app.add_handler(CommandHandler("review", cmd_review))
     app.add_handler(CommandHandler("status", cmd_status))
+    app.add_handler(CommandHandler("cancel", cmd_cancel))
     app.add_handler(CommandHandler("repos", cmd_repos))
+    app.add_handler(CallbackQueryHandler(on_page, pattern=r"^page:"))
+    return app
+
+
+def main():
+    config = get_config()
+    github.set_token(config.github_token)
+    _apply_config(config)
+    config_service.on_change(_on_config_change)
+    app = _build_app(config.telegram_token)
 
     async def send_message(text: str):
         c = _get_config()
         if c.telegram_chat_id:
-            await app.bot.send_message(chat_id=c.telegram_chat_id, text=text)
+            await outbox.send(c.telegram_chat_id, text, linger=NOTIFY_LINGER_SECONDS)
+
+    watcher = None
+    hook_server = None
 
     async def post_init(application):
+        nonlocal watcher, hook_server
+        outbox.configure(application.bot)
+        watcher = asyncio.create_task(config_service.watch())
         scheduler.start(config, send_message)
+        if config.webhook_port:
+            hook_server = await webhook.serve(config.webhook_host, config.webhook_port, send_message)
         await send_message("minbot is ready.")
+        await _resume_jobs()
+
+    async def post_shutdown(application):
+        if watcher:
+            watcher.cancel()
+        if hook_server:
+            hook_server.close()
+        await outbox.flush()
+        await agent.close()
+        store.close()
 
     app.post_init = post_init
+    app.post_shutdown = post_shutdown
 
     log.info("Starting minbot...")
     app.run_polling()
@@ -1,11 +1,39 @@
+"""Config model and the in-memory config service.
+
+get_config() serves an immutable snapshot that is loaded once and swapped
+when the file changes (watch() polls its mtime). save_config() writes via
+an atomic rename.
+"""
+
+import asyncio
 import json
+import logging
+import os
+import tempfile
 from pathlib import Path
-from pydantic import BaseModel
+from typing import Callable
+from pydantic import BaseModel, ConfigDict, model_validator
+
+log = logging.getLogger(__name__)
 
 CONFIG_PATH = Path.home() / ".minbot" / "config.json"
 
 
+class CloneStrategy(BaseModel):
+    filter: str | None = None
+    depth: int | None = None
+    reference: str | None = None
+
+
+class RepoSchedule(BaseModel):
+    """Per-repo interval overrides. None uses the global interval, 0 turns the job off."""
+    check_interval_hours: int | None = None
+    review_interval_hours: int | None = None
+
+
 class Config(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     telegram_token: str
     telegram_chat_id: int | None = None
     github_token: str
@@ -14,7 +42,33 @@ class Config(BaseModel):
     check_interval_hours: int = 6
     suggest_interval_hours: int = 24
     review_interval_hours: int | None = None
+    repo_schedules: dict[str, RepoSchedule] = {}
+    github_requests_per_hour: int | None = 3000
+    webhook_port: int | None = None
+    webhook_host: str = "0.0.0.0"
+    webhook_secret: str | None = None
     workspace_dir: str = "/workspace"
+    max_concurrent_repos: int = 4
+    max_jobs: int = 2
+    max_jobs_per_repo: int = 1
+    llm_concurrency: int = 4
+    llm_timeout_seconds: float = 120
+    warm_interval_minutes: int | None = 10
+    clone: CloneStrategy = CloneStrategy()
+    clone_overrides: dict[str, CloneStrategy] = {}
+
+    @model_validator(mode="after")
+    def _webhook_needs_secret(self):
+        if self.webhook_port and not self.webhook_secret:
+            raise ValueError("webhook_port requires webhook_secret")
+        return self
+
+
+WATCH_INTERVAL = 2.0
+
+_current: Config | None = None
+_stamp: tuple[int, int] | None = None
+_listeners: list[Callable[[Config, Config], None]] = []
 
 
 def load_config(path: Path = CONFIG_PATH) -> Config:
@@ -22,5 +76,79 @@ def load_config(path: Path = CONFIG_PATH) -> Config:
 
 
 def save_config(config: Config, path: Path = CONFIG_PATH) -> None:
+    """Write the config atomically; saving the live file also swaps the snapshot."""
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(config.model_dump_json(indent=2))
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".config-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(config.model_dump_json(indent=2))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    if path == CONFIG_PATH:
+        _swap(config, _file_stamp(path))
+
+
+def _file_stamp(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _swap(new: Config, stamp) -> None:
+    global _current, _stamp
+    old, _current, _stamp = _current, new, stamp
+    if old is not None and old != new:
+        for listener in list(_listeners):
+            try:
+                listener(old, new)
+            except Exception:
+                log.exception("Config listener failed")
+
+
+def get_config() -> Config:
+    """The current config snapshot. Loaded from disk only on first use."""
+    if _current is None:
+        reload()
+    return _current
+
+
+def reload() -> bool:
+    """Reload the config if the file changed. Returns True if the snapshot was swapped.
+
+    A file that fails to parse or validate is logged and ignored; the
+    previous snapshot stays in effect.
+    """
+    global _stamp
+    stamp = _file_stamp(CONFIG_PATH)
+    if _current is not None and stamp == _stamp:
+        return False
+    try:
+        new = load_config(CONFIG_PATH)
+    except Exception:
+        if _current is None:
+            raise
+        log.exception("Ignoring invalid config change")
+        _stamp = stamp
+        return False
+    _swap(new, stamp)
+    log.info("Config loaded from %s", CONFIG_PATH)
+    return True
+
+
+def on_change(listener: Callable[[Config, Config], None]) -> None:
+    """Call listener(old, new) whenever the snapshot is replaced by a different config."""
+    _listeners.append(listener)
+
+
+async def watch(interval: float = WATCH_INTERVAL) -> None:
+    """Poll the config file's mtime and reload on change. Runs until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            reload()
+        except Exception:
+            log.exception("Config reload failed")
@@ -0,0 +1,146 @@
+"""Filters for /issues and /prs, given as `key:value` command arguments.
+
+    label:bug           has the label (repeat for several; all must match)
+    assignee:alice      assigned to alice; assignee:none for unassigned
+    difficulty:easy     triaged difficulty: easy, medium or hard (comma-separate several)
+    urgency:high        triaged urgency: low, medium or high
+    age:<7d, age:>30d   opened less / more than 7 days ago (units h, d, w)
+    has_pr:yes          whether triage found an open PR for the issue
+    state:closed        open (default), closed or all
+    page:2              page of results
+
+Item filters (label, assignee, age) apply to the mirror or go into the
+GitHub search query; row filters (difficulty, urgency, has_pr) apply to
+triage rows and only make sense for open issues.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400}
+_LEVELS = {
+    "difficulty": {"easy", "medium", "hard"},
+    "urgency": {"low", "medium", "high"},
+}
+_YES = {"yes": True, "true": True, "y": True, "no": False, "false": False, "n": False}
+
+
+@dataclass
+class Filters:
+    labels: list[str] = field(default_factory=list)
+    assignee: str | None = None  # login, or "none" for unassigned
+    difficulty: set[str] = field(default_factory=set)
+    urgency: set[str] = field(default_factory=set)
+    newer_than: timedelta | None = None
+    older_than: timedelta | None = None
+    has_pr: bool | None = None
+    state: str = "open"
+    page: int = 1
+    args: list[str] = field(default_factory=list)  # the filter arguments as given, minus page
+
+    def on_rows(self) -> bool:
+        """Whether any filter needs triage rows to decide."""
+        return bool(self.difficulty or self.urgency) or self.has_pr is not None
+
+    def match(self, item: dict, now: datetime | None = None) -> bool:
+        """Label, assignee and age filters against a mirror item."""
+        if not set(self.labels) <= set(item["labels"]):
+            return False
+        assignees = item.get("assignees", [])
+        if self.assignee == "none" and assignees:
+            return False
+        if self.assignee not in (None, "none") and self.assignee.lower() not in {a.lower() for a in assignees}:
+            return False
+        age = (now or datetime.now(timezone.utc)) - _parse_time(item["createdAt"])
+        if self.newer_than is not None and age >= self.newer_than:
+            return False
+        if self.older_than is not None and age <= self.older_than:
+            return False
+        return True
+
+    def match_row(self, row: dict) -> bool:
+        """Difficulty, urgency and has_pr filters against a triage row."""
+        if self.difficulty and row.get("difficulty") not in self.difficulty:
+            return False
+        if self.urgency and row.get("urgency") not in self.urgency:
+            return False
+        if self.has_pr is not None and bool(row.get("has_pr")) != self.has_pr:
+            return False
+        return True
+
+    def created(self, now: datetime | None = None) -> str | None:
+        """The age filters as a search `created:` qualifier value, e.g. ">=2026-10-09"."""
+        now = now or datetime.now(timezone.utc)
+        after = (now - self.newer_than).date().isoformat() if self.newer_than is not None else None
+        before = (now - self.older_than).date().isoformat() if self.older_than is not None else None
+        if after and before:
+            return f"{after}..{before}"
+        if after:
+            return f">={after}"
+        if before:
+            return f"<={before}"
+        return None
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc)
+
+
+def _duration(value: str) -> timedelta:
+    number, unit = value[:-1], value[-1:].lower()
+    if unit not in _UNITS or not number.isdigit():
+        raise ValueError(f"Bad age {value!r}; use e.g. <7d, >2w or <12h")
+    return timedelta(seconds=int(number) * _UNITS[unit])
+
+
+def parse(args: list[str]) -> tuple[Filters, list[str]]:
+    """Split `key:value` filters out of command args.
+
+    Returns the filters and the remaining (positional) args. Raises
+    ValueError on an unknown key or a bad value.
+    """
+    f = Filters()
+    rest = []
+    for arg in args:
+        key, sep, value = arg.partition(":")
+        key = key.lower()
+        if not sep:
+            rest.append(arg)
+            continue
+        if not value:
+            raise ValueError(f"Missing value for {key}:")
+        if key == "label":
+            f.labels.append(value)
+        elif key == "assignee":
+            f.assignee = value.lstrip("@")
+        elif key in _LEVELS:
+            levels = set(value.lower().split(","))
+            if not levels <= _LEVELS[key]:
+                raise ValueError(f"{key} must be one of: {', '.join(sorted(_LEVELS[key]))}")
+            getattr(f, key).update(levels)
+        elif key == "age":
+            if value[0] == "<":
+                f.newer_than = _duration(value[1:])
+            elif value[0] == ">":
+                f.older_than = _duration(value[1:])
+            else:
+                raise ValueError("age needs < or >, e.g. age:<7d")
+        elif key == "has_pr":
+            if value.lower() not in _YES:
+                raise ValueError("has_pr must be yes or no")
+            f.has_pr = _YES[value.lower()]
+        elif key == "state":
+            if value.lower() not in ("open", "closed", "all"):
+                raise ValueError("state must be open, closed or all")
+            f.state = value.lower()
+        elif key == "page":
+            if not value.isdigit() or int(value) < 1:
+                raise ValueError("page must be a positive number")
+            f.page = int(value)
+            continue
+        else:
+            raise ValueError(f"Unknown filter {key}:")
+        f.args.append(arg)
+    if f.on_rows() and f.state != "open":
+        raise ValueError("difficulty, urgency and has_pr only apply to open issues")
+    return f, rest
@@ -0,0 +1,156 @@
+"""Job queue for long-running /work and /pr runs.
+
+Jobs start in priority order (then FIFO) as long as the global and
+per-repo concurrency limits allow. Finished jobs are kept in memory for
+/status and recorded in the store's job history. A job with a journal
+entry closes it when it finishes, however it finishes; entries still open
+at startup belong to jobs a restart interrupted.
+"""
+
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+from minbot import store
+
+log = logging.getLogger(__name__)
+
+KEEP_FINISHED = 20
+
+max_jobs = 2
+max_jobs_per_repo = 1
+
+_jobs: dict[int, "Job"] = {}
+_ids = itertools.count(1)
+_current: contextvars.ContextVar["Job | None"] = contextvars.ContextVar("job", default=None)
+
+
+@dataclass
+class Job:
+    id: int
+    repo: str
+    description: str
+    run: Callable[[], Awaitable] = field(repr=False)
+    priority: int = 0
+    state: str = "queued"  # queued, running, done, failed, cancelled
+    created: float = field(default_factory=time.monotonic)
+    started: float | None = None
+    finished: float | None = None
+    task: asyncio.Task | None = field(default=None, repr=False)
+    telemetry: Any = field(default=None, repr=False)  # set by the worker while Claude runs
+    journal_id: int | None = None  # store journal entry, closed when the job finishes
+
+    def elapsed(self) -> float:
+        """Seconds running so far (or in total, once finished)."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+
+def configure(max_total: int, max_per_repo: int) -> None:
+    """Set concurrency limits. Takes effect on the next dispatch."""
+    global max_jobs, max_jobs_per_repo
+    max_jobs = max(1, max_total)
+    max_jobs_per_repo = max(1, max_per_repo)
+    _dispatch()
+
+
+def submit(
+    repo: str, description: str, run: Callable[[], Awaitable], priority: int = 0,
+    journal_id: int | None = None,
+) -> Job:
+    """Queue a job. `run` is called with no arguments and awaited when the job starts."""
+    job = Job(
+        id=next(_ids), repo=repo, description=description, run=run, priority=priority,
+        journal_id=journal_id,
+    )
+    _jobs[job.id] = job
+    _dispatch()
+    return job
+
+
+def current() -> Job | None:
+    """The job whose task is running the caller, if any."""
+    return _current.get()
+
+
+def get(job_id: int) -> Job | None:
+    return _jobs.get(job_id)
+
+
+def active() -> list[Job]:
+    """Running jobs, then queued jobs in the order they will start."""
+    running = sorted((j for j in _jobs.values() if j.state == "running"), key=lambda j: j.started)
+    return running + _queued()
+
+
+def recent() -> list[Job]:
+    """Finished jobs, most recent first."""
+    done = [j for j in _jobs.values() if j.finished is not None]
+    return sorted(done, key=lambda j: j.finished, reverse=True)
+
+
+def cancel(job_id: int) -> bool:
+    """Cancel a queued or running job. Returns False if there's nothing to cancel."""
+    job = _jobs.get(job_id)
+    if not job or job.state not in ("queued", "running"):
+        return False
+    if job.state == "queued":
+        _finish(job, "cancelled")
+    else:
+        job.task.cancel()
+    return True
+
+
+def _queued() -> list[Job]:
+    return sorted((j for j in _jobs.values() if j.state == "queued"), key=lambda j: (-j.priority, j.id))
+
+
+def _dispatch() -> None:
+    running = [j for j in _jobs.values() if j.state == "running"]
+    per_repo = Counter(j.repo for j in running)
+    for job in _queued():
+        if len(running) >= max_jobs:
+            break
+        if per_repo[job.repo] >= max_jobs_per_repo:
+            continue
+        job.state = "running"
+        job.started = time.monotonic()
+        job.task = asyncio.create_task(_run(job))
+        running.append(job)
+        per_repo[job.repo] += 1
+
+
+async def _run(job: Job) -> None:
+    _current.set(job)
+    try:
+        await job.run()
+        _finish(job, "done")
+    except asyncio.CancelledError:
+        _finish(job, "cancelled")
+    except Exception:
+        log.exception("Job %s (%s) failed", job.id, job.description)
+        _finish(job, "failed")
+
+
+def _finish(job: Job, state: str) -> None:
+    job.state = state
+    job.finished = time.monotonic()
+    try:
+        finished_at = time.time()
+        store.record_job(
+            job.id, job.repo, job.description, state,
+            finished_at - job.elapsed() if job.started is not None else None, finished_at,
+            job.telemetry.to_dict() if job.telemetry else None,
+        )
+        if job.journal_id is not None:
+            store.journal_close(job.journal_id, state)
+    except Exception:
+        log.exception("Couldn't record job %s", job.id)
+    for old in recent()[KEEP_FINISHED:]:
+        del _jobs[old.id]
+    _dispatch()
@@ -0,0 +1,252 @@
+"""Outbound Telegram messages: splitting, coalescing and per-chat rate limits.
+
+Everything the bot says goes through here. Each chat has a FIFO queue
+drained by its own task, which keeps messages to a chat in order and
+spaces them out (Telegram allows about one message a second per chat,
+20 a minute in groups and 30 a second overall). Texts waiting in a queue
+are merged into as few messages as fit under the 4096-character limit,
+and anything longer is split at paragraph, then line, then word
+boundaries. Flood-control errors (RetryAfter) pause the chat for as long
+as Telegram asks and the message is retried.
+
+Progress messages are posted once and then edited in place; a newer edit
+of the same message replaces one still waiting in the queue. post()
+returns a Post holding every message the text was split into, so an edit
+rewrites each of them rather than sending the overflow again. A send that
+times out is not retried, since Telegram may have delivered it.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+log = logging.getLogger(__name__)
+
+MAX_LENGTH = 4096
+CHAT_INTERVAL = 1.0
+GROUP_INTERVAL = 3.0
+GLOBAL_INTERVAL = 1 / 30
+MAX_ATTEMPTS = 5
+
+_bot = None
+_queues: dict[int, list["_Item"]] = {}
+_workers: dict[int, asyncio.Task] = {}
+_next_send: dict[int, float] = {}
+_next_global = 0.0
+
+
+@dataclass(eq=False)  # queued items are found by identity
+class _Item:
+    text: str
+    ready: float  # monotonic time before which the item is held back
+    message: Any = None  # set for edits: the message to edit
+    future: asyncio.Future | None = None  # set by post(): resolved with the sent message
+    markup: Any = None  # reply_markup (e.g. an inline keyboard); such items are never merged
+
+
+@dataclass
+class Post:
+    """A posted text: the messages it was split into, in order."""
+    chat_id: int
+    messages: list = field(default_factory=list)
+    pending: list[_Item] = field(default_factory=list)  # added chunks not yet sent
+
+
+def configure(bot) -> None:
+    """Set the telegram Bot that messages are sent with."""
+    global _bot
+    _bot = bot
+
+
+def split(text: str, limit: int = MAX_LENGTH) -> list[str]:
+    """Cut text into chunks of at most `limit` characters at the most logical boundary."""
+    chunks = []
+    while len(text) > limit:
+        for sep in ("\n\n", "\n", " "):
+            cut = text.rfind(sep, 0, limit + 1)
+            if cut > 0:
+                break
+        else:
+            cut, sep = limit, ""
+        chunks.append(text[:cut])
+        text = text[cut + len(sep):].lstrip("\n")
+    if text or not chunks:
+        chunks.append(text)
+    return chunks
+
+
+def _enqueue(chat_id: int, item: _Item) -> None:
+    _queues.setdefault(chat_id, []).append(item)
+    if chat_id not in _workers:
+        _workers[chat_id] = asyncio.create_task(_drain(chat_id))
+
+
+async def send(chat_id: int, text: str, linger: float = 0.0, markup=None) -> None:
+    """Queue text for a chat and return without waiting for delivery.
+
+    `linger` holds the text back for that many seconds so messages sent in
+    a burst (scheduled checks, webhook notifications) go out together.
+    `markup` is attached to the last message the text is split into.
+    """
+    ready = time.monotonic() + linger
+    *chunks, last = split(text)
+    for chunk in chunks:
+        _enqueue(chat_id, _Item(chunk, ready))
+    _enqueue(chat_id, _Item(last, ready, markup=markup))
+
+
+async def post(chat_id: int, text: str) -> Post:
+    """Send text on its own, after anything already queued, and return its Post."""
+    handle = Post(chat_id)
+    for chunk in split(text):
+        future = asyncio.get_running_loop().create_future()
+        _enqueue(chat_id, _Item(chunk, 0.0, future=future))
+        handle.messages.append(await future)
+    return handle
+
+
+def _queue_edit(message, text: str, markup) -> None:
+    for item in _queues.get(message.chat_id, []):
+        if item.message is not None and item.message.message_id == message.message_id:
+            item.text, item.markup = text, markup
+            return
+    _enqueue(message.chat_id, _Item(text, 0.0, message=message, markup=markup))
+
+
+def _added(handle: Post, item: _Item, future: asyncio.Future) -> None:
+    needed = item in handle.pending
+    if needed:
+        handle.pending.remove(item)
+    if future.cancelled() or future.exception() is not None:
+        return
+    if needed:
+        handle.messages.append(future.result())
+    else:
+        # A later edit no longer needed it, but it was already on its way
+        _queue_edit(future.result(), "", None)
+
+
+async def edit(target, text: str, markup=None) -> None:
+    """Queue an edit of a Post (or a single sent message), replacing edits still waiting.
+
+    Each chunk of the new text edits the message at its position; chunks
+    beyond those continue in new messages, which join the Post, and
+    messages no longer needed are deleted. `markup` replaces the last
+    message's inline keyboard (None removes it).
+    """
+    handle = target if isinstance(target, Post) else Post(target.chat_id, [target])
+    chunks = split(text)
+    sent = len(handle.messages)
+    for i, chunk in enumerate(chunks):
+        chunk_markup = markup if i == len(chunks) - 1 else None
+        if i < sent:
+            _queue_edit(handle.messages[i], chunk, chunk_markup)
+        elif i - sent < len(handle.pending):
+            # Still waiting to be sent: send the newer text instead
+            item = handle.pending[i - sent]
+            item.text, item.markup = chunk, chunk_markup
+        else:
+            item = _Item(chunk, 0.0, future=asyncio.get_running_loop().create_future(), markup=chunk_markup)
+            handle.pending.append(item)
+            item.future.add_done_callback(lambda future, item=item: _added(handle, item, future))
+            _enqueue(handle.chat_id, item)
+    for message in handle.messages[len(chunks):]:
+        _queue_edit(message, "", None)  # empty text deletes it
+    del handle.messages[len(chunks):]
+    queue = _queues.get(handle.chat_id, [])
+    for item in handle.pending[max(0, len(chunks) - sent):]:
+        handle.pending.remove(item)
+        if item in queue:
+            queue.remove(item)
+            item.future.cancel()
+
+
+async def flush() -> None:
+    """Wait until every queued message has been delivered (or given up on)."""
+    while _workers:
+        await asyncio.gather(*_workers.values(), return_exceptions=True)
+
+
+def _mergeable(item: _Item) -> bool:
+    return item.message is None and item.future is None and item.markup is None
+
+
+def _take(queue: list[_Item]) -> _Item:
+    """Pop the next item, merging plain texts queued behind it while they fit."""
+    item = queue.pop(0)
+    if not _mergeable(item):
+        return item
+    while queue and _mergeable(queue[0]) and len(item.text) + 2 + len(queue[0].text) <= MAX_LENGTH:
+        item = _Item(f"{item.text}\n\n{queue.pop(0).text}", item.ready)
+    return item
+
+
+async def _wait_global() -> None:
+    global _next_global
+    now = time.monotonic()
+    delay = _next_global - now
+    _next_global = max(now, _next_global) + GLOBAL_INTERVAL
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+def _seconds(retry_after) -> float:
+    return retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+
+
+async def _deliver(chat_id: int, item: _Item):
+    """Send, edit or delete once, retrying on flood control and network errors.
+
+    A send that times out may have reached Telegram, so it isn't retried.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        await _wait_global()
+        try:
+            if item.message is not None and not item.text:
+                return await item.message.delete()
+            if item.message is not None:
+                return await item.message.edit_text(item.text, reply_markup=item.markup)
+            return await _bot.send_message(chat_id=chat_id, text=item.text, reply_markup=item.markup)
+        except RetryAfter as e:
+            delay = _seconds(e.retry_after)
+            log.warning("Flood control on chat %s, waiting %.0fs", chat_id, delay)
+            _next_send[chat_id] = time.monotonic() + delay
+            await asyncio.sleep(delay)
+        except BadRequest as e:
+            if item.message is not None and "not modified" in str(e):
+                return item.message
+            raise
+        except NetworkError as e:
+            if attempt == MAX_ATTEMPTS - 1 or (isinstance(e, TimedOut) and item.message is None):
+                raise
+            await asyncio.sleep(2 ** attempt)
+    raise RuntimeError(f"Gave up sending to chat {chat_id} after {MAX_ATTEMPTS} attempts")
+
+
+async def _drain(chat_id: int) -> None:
+    """Deliver a chat's queue in order, spaced by the chat's rate limit."""
+    queue = _queues[chat_id]
+    interval = GROUP_INTERVAL if chat_id < 0 else CHAT_INTERVAL
+    try:
+        while queue:
+            delay = max(queue[0].ready, _next_send.get(chat_id, 0.0)) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue  # more may have been queued meanwhile
+            item = _take(queue)
+            try:
+                result = await _deliver(chat_id, item)
+            except Exception as e:
+                log.error("Dropped message to chat %s: %s", chat_id, e)
+                if item.future:
+                    item.future.set_exception(e)
+            else:
+                if item.future:
+                    item.future.set_result(result)
+            _next_send[chat_id] = max(_next_send.get(chat_id, 0.0), time.monotonic() + interval)
+    finally:
+        del _workers[chat_id]
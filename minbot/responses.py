@@ -0,0 +1,100 @@
+"""Incremental JSON extraction and validation for LLM responses.
+
+Responses are supposed to be a JSON array but may come wrapped in fences,
+with prose around them, or cut off mid-array. JSONStream pulls out each
+complete top-level object as the text arrives, so every well-formed row
+survives whatever happens to the rest.
+"""
+
+import json
+import logging
+from typing import Literal, TypeVar
+from pydantic import BaseModel, ValidationError, field_validator
+
+log = logging.getLogger(__name__)
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class TriageRow(BaseModel):
+    number: int
+    title: str = ""
+    difficulty: Literal["easy", "medium", "hard"]
+    urgency: Literal["low", "medium", "high"]
+    summary: str = ""
+    has_pr: bool = False
+
+    @field_validator("difficulty", "urgency", mode="before")
+    @classmethod
+    def _lower(cls, v):
+        return v.strip().lower() if isinstance(v, str) else v
+
+
+class ReviewSuggestion(BaseModel):
+    title: str
+    body: str
+
+    @field_validator("title")
+    @classmethod
+    def _not_blank(cls, v):
+        if not v.strip():
+            raise ValueError("empty title")
+        return v.strip()
+
+
+class JSONStream:
+    """Yields complete top-level JSON objects from text fed in pieces."""
+
+    def __init__(self):
+        self._buf: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> list[dict]:
+        found = []
+        for ch in text:
+            if self._depth == 0:
+                # Outside any object: skip fences, prose, array brackets, commas
+                if ch == "{":
+                    self._depth = 1
+                    self._buf = [ch]
+                continue
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        obj = json.loads("".join(self._buf))
+                    except ValueError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        found.append(obj)
+                    self._buf = []
+        return found
+
+
+def validate(model: type[M], obj: dict) -> M | None:
+    """`model` parsed from obj, or None (logged) if it doesn't fit the schema."""
+    try:
+        return model.model_validate(obj)
+    except ValidationError as e:
+        log.warning("Dropping invalid %s: %s", model.__name__, e.errors()[0].get("msg"))
+        return None
+
+
+def extract(text: str, model: type[M]) -> list[M]:
+    """Every valid `model` object in a complete response."""
+    rows = (validate(model, obj) for obj in JSONStream().feed(text))
+    return [r for r in rows if r is not None]
@@ -1,45 +1,62 @@
-"""Periodic issue checking and proactive suggestions."""
+"""Periodic issue checking and proactive suggestions.
 
-import json
+The job set is reconciled against the config whenever it changes: jobs
+are added, removed or rescheduled in place, and every run reads the
+current config snapshot, so interval and repo-list edits apply without a
+restart. Each job has max_instances=1, so a reschedule never starts a
+second copy of a run that is still in flight.
+
+Issue checks and reviews run as one job per repo ("check_issues:owner/repo").
+Every job's phase within its interval is a hash of its id, so repos are
+spread over the interval the same way across restarts instead of all
+firing at once, and the startup runs are staggered the same way. Runs set
+github.background, so their API calls go through the token bucket. When
+webhooks deliver new issues (minbot.webhook), the checks only reconcile,
+at most once every WEBHOOK_CHECK_HOURS.
+"""
+
+import hashlib
 import logging
-import os
 import random
+import time
 import traceback
-from pathlib import Path
+from datetime import datetime, timedelta, timezone
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from minbot import github, agent
+from minbot import agithub, agent, github, store, triage, workspace
+from minbot import config as config_service
 
 
 log = logging.getLogger(__name__)
 _scheduler = None
-_KNOWN_ISSUES_PATH = Path.home() / ".minbot" / "known_issues.json"
-
-
-def _load_known_issues() -> dict[str, set[int]]:
-    if _KNOWN_ISSUES_PATH.exists():
-        data = json.loads(_KNOWN_ISSUES_PATH.read_text())
-        return {repo: set(nums) for repo, nums in data.items()}
-    return {}
-
+_send_message = None
+_triggers: dict[str, dict] = {}
+_PHASE_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MAX_JITTER_SECONDS = 300
+STARTUP_STAGGER_SECONDS = 15
+# With webhooks on, polling only reconciles missed deliveries
+WEBHOOK_CHECK_HOURS = 24
+REVIEW_REPEAT_DAYS = 7
 
-def _save_known_issues(known: dict[str, set[int]]) -> None:
-    data = {repo: sorted(nums) for repo, nums in known.items()}
-    _KNOWN_ISSUES_PATH.write_text(json.dumps(data))
 
-
-async def _check_issues(config, send_message):
-    """Check for new issues across all repos and notify via Telegram."""
+async def _check_issues(config, send_message, repos: list[str] | None = None, report_empty: bool = True):
+    """Check for new issues in `repos` (default: all) and notify via Telegram."""
+    repos = config.github_repos if repos is None else repos
     try:
-        known = _load_known_issues()
         found_new = False
 
-        for repo in config.github_repos:
-            issues = github.list_issues(repo, include_prs=False)
-            current = {i["number"] for i in issues}
-            prev = known.get(repo, set())
-            new_numbers = current - prev
+        await triage.prime_mirrors(repos)
+        fetched = await triage.fan_out(
+            repos,
+            lambda r: agithub.list_issues(r, include_prs=False, limit=None),
+            config.max_concurrent_repos,
+        )
+        for repo, issues in fetched:
+            if isinstance(issues, Exception):
+                await send_message(f"Issue check failed for {repo}: {issues}")
+                continue
+            new_numbers = store.sync_seen(repo, {i["number"] for i in issues})
 
-            if repo in known and new_numbers:
+            if new_numbers:
                 found_new = True
                 new_issues = [i for i in issues if i["number"] in new_numbers]
                 text = f"New issues in {repo}:\n\n"
@@ -51,11 +68,7 @@ async def _check_issues(config, send_message):
                     text += "\n"
                 await send_message(text)
 
-            known[repo] = current
-
-        _save_known_issues(known)
-
-        if not found_new:
+        if not found_new and report_empty:
             await send_message("Issue check: no new issues.")
     except Exception as e:
         log.error("Issue check failed: %s", traceback.format_exc())
@@ -66,67 +79,66 @@ async def _send_suggestions(config, send_message):
     """Proactively suggest what to work on next across all repos."""
     try:
         all_analyzed = []
-        for repo in config.github_repos:
-            try:
-                all_items = github.list_issues(repo, include_prs=True)
-                issues = [i for i in all_items if not i["is_pr"]]
-                prs = [i for i in all_items if i["is_pr"]]
-                analyzed = agent.analyze_issues(issues, config.anthropic_api_key, prs)
-                for a in analyzed:
-                    a["repo"] = repo
-                all_analyzed.extend(analyzed)
-            except Exception as e:
-                log.error("Failed to analyze %s: %s", repo, e)
-                await send_message(f"Failed to analyze {repo}: {e}")
+        for repo, analyzed in await triage.analyze_repos(config.github_repos, config):
+            if isinstance(analyzed, Exception):
+                await send_message(f"Failed to analyze {repo}: {analyzed}")
+                continue
+            all_analyzed.extend(analyzed)
 
         if not all_analyzed:
             await send_message("No open issues to suggest.")
             return
 
-        suggestion = agent.suggest_next(all_analyzed, config.anthropic_api_key)
+        suggestion = await agent.suggest_next(all_analyzed, config.anthropic_api_key)
         await send_message(f"Work suggestion:\n\n{suggestion}")
     except Exception as e:
         log.error("Suggestion failed: %s", traceback.format_exc())
         await send_message(f"Suggestion failed: {e}")
 
 
-async def _review_code(config, send_message):
-    """Periodic code review: randomly review codebase or an open PR.
+async def _review_code(config, send_message, repos: list[str] | None = None):
+    """Periodic code review of `repos` (default: all): randomly review codebase or an open PR.
 
     Codebase review: creates GitHub issues for each suggestion.
     PR review: runs Claude on the PR branch, posts review as a comment.
     """
     try:
-        for repo in config.github_repos:
+        for repo in config.github_repos if repos is None else repos:
             try:
                 # 70% chance to review a PR, 30% to review codebase
                 do_pr_review = random.random() < 0.7
-                prs = github.list_prs(repo) if do_pr_review else []
+                prs = await agithub.list_prs(repo) if do_pr_review else []
 
                 if prs:
-                    pr_info = random.choice(prs)
-                    pr = github.get_pr(repo, pr_info["number"])
-                    comments = github.get_pr_comments(repo, pr_info["number"])
-                    repo_path = os.path.join(config.workspace_dir, repo)
-                    github.clone_repo(repo, repo_path)
-                    github.checkout_pr_branch(repo_path, pr["branch"])
-                    review = agent.review_pr(pr, comments, repo_path, config.anthropic_api_key)
+                    # Prefer PRs that haven't had a review lately
+                    reviewed = store.last_pr_reviews(repo)
+                    cutoff = time.time() - REVIEW_REPEAT_DAYS * 86400
+                    fresh = [p for p in prs if reviewed.get(p["number"], 0) < cutoff]
+                    pr_info = random.choice(fresh or prs)
+                    pr, comments = await agithub.get_pr_context(repo, pr_info["number"])
+                    async with workspace.checkout(config.workspace_dir, repo, pr["branch"]) as repo_path:
+                        review = await agent.review_pr(
+                            pr, comments, repo_path, config.anthropic_api_key,
+                        )
                     comment_body = (
                         f"**Automated code review by minbot**\n\n"
                         f"{review}\n\n"
                         f"---\n"
                         f"_Generated by [minbot](https://github.com/ChicagoHAI/minbot)_"
                     )
-                    github.add_pr_comment(repo, pr["number"], comment_body)
+                    await agithub.add_pr_comment(repo, pr["number"], comment_body)
+                    store.record_review(repo, "pr", pr["number"], review)
                     await send_message(
                         f"PR Review — {repo} #{pr['number']}: {pr['title']}\n\n"
                         f"Posted review comment on the PR.\n\n{review[:3000]}"
                     )
                 else:
-                    repo_path = os.path.join(config.workspace_dir, repo)
-                    github.clone_repo(repo, repo_path)
-                    existing = github.list_issues(repo, include_prs=False)
-                    suggestions = agent.review_codebase(repo_path, existing, config.anthropic_api_key)
+                    existing = await agithub.list_issues(repo, include_prs=False)
+                    async with workspace.checkout(config.workspace_dir, repo) as repo_path:
+                        suggestions = await agent.review_codebase(
+                            repo_path, existing, config.anthropic_api_key,
+                        )
+                    store.record_review(repo, "codebase", detail="\n".join(s["title"] for s in suggestions))
                     if not suggestions:
                         await send_message(f"Code Review — {repo}: no suggestions.")
                         continue
@@ -137,7 +149,7 @@ async def _review_code(config, send_message):
                             f"---\n"
                             f"_Identified by [minbot](https://github.com/ChicagoHAI/minbot) code review_"
                         )
-                        url = github.create_issue(repo, s["title"], body)
+                        url = await agithub.create_issue(repo, s["title"], body)
                         created.append(f"- {s['title']}: {url}")
                     await send_message(
                         f"Code Review — {repo}\n\n"
@@ -151,29 +163,135 @@ async def _review_code(config, send_message):
         await send_message(f"Review job failed: {e}")
 
 
+async def _warm_workspaces(config):
+    """Fetch every repo and its open PR branches so jobs start from a local checkout."""
+    async def warm(repo):
+        prs = await agithub.list_prs(repo, limit=None)
+        await agithub.run_git(workspace.warm, config.workspace_dir, repo, [p["branch"] for p in prs])
+
+    for repo, result in await triage.fan_out(config.github_repos, warm, config.max_concurrent_repos):
+        if isinstance(result, Exception):
+            log.warning("Warming %s failed: %s", repo, result)
+
+
+# Global jobs: coroutine functions taking (config, send_message)
+_JOBS = {
+    # One batched mirror build for every repo, so per-repo jobs find theirs ready
+    "prime": lambda config, send_message: triage.prime_mirrors(config.github_repos),
+    "suggestions": _send_suggestions,
+    "warm": lambda config, send_message: _warm_workspaces(config),
+}
+
+# Per-repo jobs, scheduled as "<name>:<repo>": take (config, send_message, repo)
+_REPO_JOBS = {
+    "check_issues": lambda config, send_message, repo: _check_issues(
+        config, send_message, [repo], report_empty=False,
+    ),
+    "review": lambda config, send_message, repo: _review_code(config, send_message, [repo]),
+}
+
+
+async def _run_job(job_id: str):
+    """Run a scheduled job against the config as it is now."""
+    token = github.background.set(True)
+    try:
+        config = config_service.get_config()
+        name, _, repo = job_id.partition(":")
+        if not repo:
+            await _JOBS[name](config, _send_message)
+        elif repo in config.github_repos:
+            await _REPO_JOBS[name](config, _send_message, repo)
+    finally:
+        github.background.reset(token)
+
+
+def _repo_interval(config, repo: str, field: str) -> int | None:
+    override = config.repo_schedules.get(repo)
+    value = getattr(override, field) if override else None
+    if value is not None:
+        return value
+    if field == "check_interval_hours" and config.webhook_port:
+        return max(config.check_interval_hours, WEBHOOK_CHECK_HOURS)
+    return getattr(config, field)
+
+
+def _desired(config) -> dict[str, dict]:
+    """Interval trigger arguments for every job the config asks for."""
+    jobs = {"suggestions": {"hours": config.suggest_interval_hours}}
+    if config.warm_interval_minutes:
+        jobs["warm"] = {"minutes": config.warm_interval_minutes}
+    for repo in config.github_repos:
+        for name, field in [("check_issues", "check_interval_hours"), ("review", "review_interval_hours")]:
+            hours = _repo_interval(config, repo, field)
+            if hours:
+                jobs[f"{name}:{repo}"] = {"hours": hours}
+    return jobs
+
+
+def _phase(job_id: str, seconds: int) -> int:
+    """Deterministic offset of a job within its interval."""
+    return int(hashlib.sha256(job_id.encode()).hexdigest()[:8], 16) % max(1, seconds)
+
+
+def _trigger_args(job_id: str, interval: dict) -> dict:
+    seconds = int(timedelta(**interval).total_seconds())
+    return {
+        **interval,
+        "start_date": _PHASE_EPOCH + timedelta(seconds=_phase(job_id, seconds)),
+        "jitter": min(MAX_JITTER_SECONDS, seconds // 20),
+    }
+
+
+def reconcile(config) -> None:
+    """Add, remove and reschedule interval jobs to match `config`."""
+    if _scheduler is None:
+        return
+    desired = _desired(config)
+    first = not _triggers
+    added = []
+    for job_id in list(_triggers):
+        if job_id not in desired:
+            _scheduler.remove_job(job_id)
+            del _triggers[job_id]
+            log.info("Removed scheduled job %s", job_id)
+    for job_id, interval in desired.items():
+        if job_id not in _triggers:
+            _scheduler.add_job(
+                _run_job, "interval", args=[job_id], id=job_id, max_instances=1, coalesce=True,
+                **_trigger_args(job_id, interval),
+            )
+            log.info("Scheduled %s every %s", job_id, interval)
+            added.append(job_id)
+        elif _triggers[job_id] != interval:
+            _scheduler.reschedule_job(job_id, trigger="interval", **_trigger_args(job_id, interval))
+            log.info("Rescheduled %s to every %s", job_id, interval)
+        _triggers[job_id] = interval
+    if not first and any(job_id.startswith("check_issues:") for job_id in added):
+        # New repos: build their mirrors together rather than one per job
+        _scheduler.add_job(_run_job, "date", args=["prime"], run_date=datetime.now(timezone.utc))
+
+
+def _startup_runs(config) -> list[str]:
+    """One-off jobs to run at startup, in order: prime, warm, each repo's check, suggestions."""
+    runs = ["prime"]
+    runs += ["warm"] if "warm" in _triggers else []
+    runs += [f"check_issues:{repo}" for repo in config.github_repos]
+    return runs + ["suggestions"]
+
+
 def start(config, send_message) -> AsyncIOScheduler:
-    """Start the periodic issue checker and suggestion jobs."""
-    global _scheduler
+    """Start the periodic jobs and keep them in sync with config changes."""
+    global _scheduler, _send_message
     _scheduler = AsyncIOScheduler(job_defaults={"misfire_grace_time": 3600})
-    _scheduler.add_job(
-        _check_issues, "interval",
-        hours=config.check_interval_hours,
-        args=[config, send_message],
-    )
-    _scheduler.add_job(
-        _send_suggestions, "interval",
-        hours=config.suggest_interval_hours,
-        args=[config, send_message],
-    )
-    if config.review_interval_hours:
-        _scheduler.add_job(
-            _review_code, "interval",
-            hours=config.review_interval_hours,
-            args=[config, send_message],
-        )
-    # Run both immediately on startup
-    _scheduler.add_job(_check_issues, args=[config, send_message])
-    _scheduler.add_job(_send_suggestions, args=[config, send_message])
+    _send_message = send_message
+    _triggers.clear()
+    reconcile(config)
+    # Run once on startup, staggered rather than all at once
+    now = datetime.now(timezone.utc)
+    for i, job_id in enumerate(_startup_runs(config)):
+        run_date = now + timedelta(seconds=i * STARTUP_STAGGER_SECONDS)
+        _scheduler.add_job(_run_job, "date", args=[job_id], run_date=run_date)
+    config_service.on_change(lambda old, new: reconcile(new))
     _scheduler.start()
     return _scheduler
 
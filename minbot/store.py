@@ -0,0 +1,305 @@
+"""Durable state in one SQLite database (~/.minbot/minbot.db, WAL mode).
+
+Tables:
+    repos         repos whose open issues have a baseline (first check done)
+    seen_issues   issues/PRs already announced, per repo
+    triage        cached triage rows, keyed by issue content and PR set
+    job_history   finished /work and /pr jobs
+    reviews       periodic and manual review runs
+    journal       /work and /pr jobs in flight, with the last phase each completed
+
+Every write is a small upsert or delete in its own transaction, so a
+crash loses at most the change in flight. known_issues.json from older
+versions is imported once and renamed.
+"""
+
+import contextlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+DB_PATH = Path.home() / ".minbot" / "minbot.db"
+_LEGACY_KNOWN_ISSUES = Path.home() / ".minbot" / "known_issues.json"
+_BATCH = 500  # keys per IN (...) query, under SQLite's variable limit
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    repo TEXT PRIMARY KEY,
+    baseline_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen_issues (
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    is_pr INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    PRIMARY KEY (repo, number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS triage (
+    key TEXT PRIMARY KEY,
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    row TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS triage_ts ON triage (ts);
+CREATE TABLE IF NOT EXISTS job_history (
+    id INTEGER PRIMARY KEY,
+    job_id INTEGER NOT NULL,
+    repo TEXT NOT NULL,
+    description TEXT NOT NULL,
+    state TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL NOT NULL,
+    telemetry TEXT
+);
+CREATE INDEX IF NOT EXISTS job_history_finished ON job_history (finished_at);
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    number INTEGER,
+    reviewed_at REAL NOT NULL,
+    detail TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS reviews_repo ON reviews (repo, number, reviewed_at);
+CREATE TABLE IF NOT EXISTS journal (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    chat_id INTEGER,
+    params TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    data TEXT NOT NULL DEFAULT '{}',
+    state TEXT NOT NULL DEFAULT 'active',
+    resumes INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_state ON journal (state);
+"""
+
+_conn: sqlite3.Connection | None = None
+_lock = threading.RLock()
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(_SCHEMA)
+        _conn = conn
+        _migrate()
+    return _conn
+
+
+def close() -> None:
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+@contextlib.contextmanager
+def _tx():
+    """One write transaction. Serialised across threads."""
+    with _lock:
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _query(sql: str, params=()) -> list[tuple]:
+    with _lock:
+        return _db().execute(sql, params).fetchall()
+
+
+def _migrate() -> None:
+    """Import the seen-issues file earlier versions kept, once."""
+    if _LEGACY_KNOWN_ISSUES.exists():
+        known = json.loads(_LEGACY_KNOWN_ISSUES.read_text())
+        now = time.time()
+        with _tx() as conn:
+            conn.executemany("INSERT OR IGNORE INTO repos VALUES (?, ?)", [(r, now) for r in known])
+            conn.executemany(
+                "INSERT OR IGNORE INTO seen_issues VALUES (?, ?, 0, ?)",
+                [(r, n, now) for r, nums in known.items() for n in nums],
+            )
+        _LEGACY_KNOWN_ISSUES.rename(_LEGACY_KNOWN_ISSUES.with_suffix(".json.migrated"))
+        log.info("Imported %s", _LEGACY_KNOWN_ISSUES)
+
+
+# Seen issues
+
+def sync_seen(repo: str, open_numbers: set[int]) -> set[int]:
+    """Record a repo's open issues. Returns the ones not seen before.
+
+    The first call for a repo only sets the baseline and returns nothing.
+    Issues no longer open are dropped, so a reopened issue counts as new.
+    """
+    with _tx() as conn:
+        baselined = conn.execute("SELECT 1 FROM repos WHERE repo = ?", (repo,)).fetchone()
+        seen = {n for (n,) in conn.execute(
+            "SELECT number FROM seen_issues WHERE repo = ? AND is_pr = 0", (repo,),
+        )}
+        new, gone = open_numbers - seen, seen - open_numbers
+        now = time.time()
+        conn.executemany(
+            "INSERT OR IGNORE INTO seen_issues VALUES (?, ?, 0, ?)", [(repo, n, now) for n in new],
+        )
+        conn.executemany(
+            "DELETE FROM seen_issues WHERE repo = ? AND number = ?", [(repo, n) for n in gone],
+        )
+        if not baselined:
+            conn.execute("INSERT INTO repos VALUES (?, ?)", (repo, now))
+            return set()
+        return new
+
+
+def mark_seen(repo: str, number: int, is_pr: bool = False) -> bool:
+    """Record one issue or PR announced as it happened. False if it was already seen."""
+    with _tx() as conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO seen_issues VALUES (?, ?, ?, ?)", (repo, number, int(is_pr), time.time()),
+        )
+        return cur.rowcount == 1
+
+
+# Triage
+
+def triage_rows(keys: list[str], max_age: float) -> dict[str, dict]:
+    """Cached triage rows for `keys` that are younger than max_age seconds."""
+    cutoff = time.time() - max_age
+    found = {}
+    for i in range(0, len(keys), _BATCH):
+        batch = keys[i:i + _BATCH]
+        marks = ",".join("?" * len(batch))
+        for key, row in _query(
+            f"SELECT key, row FROM triage WHERE key IN ({marks}) AND ts >= ?", (*batch, cutoff),
+        ):
+            found[key] = json.loads(row)
+    return found
+
+
+def save_triage(rows: list[tuple[str, str, int, dict]], max_age: float, max_entries: int) -> None:
+    """Upsert (key, repo, number, row) entries, then drop expired and the oldest beyond max_entries."""
+    now = time.time()
+    with _tx() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO triage VALUES (?, ?, ?, ?, ?)",
+            [(key, repo, number, json.dumps(row), now) for key, repo, number, row in rows],
+        )
+        conn.execute("DELETE FROM triage WHERE ts < ?", (now - max_age,))
+        conn.execute(
+            "DELETE FROM triage WHERE key NOT IN (SELECT key FROM triage ORDER BY ts DESC LIMIT ?)",
+            (max_entries,),
+        )
+
+
+# History
+
+def record_job(
+    job_id: int, repo: str, description: str, state: str,
+    started_at: float | None, finished_at: float, telemetry: dict | None = None,
+) -> None:
+    with _tx() as conn:
+        conn.execute(
+            "INSERT INTO job_history (job_id, repo, description, state, started_at, finished_at, telemetry)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, repo, description, state, started_at, finished_at,
+             json.dumps(telemetry) if telemetry is not None else None),
+        )
+
+
+def job_history(limit: int = 20) -> list[dict]:
+    """Most recently finished jobs first."""
+    rows = _query(
+        "SELECT job_id, repo, description, state, started_at, finished_at, telemetry"
+        " FROM job_history ORDER BY finished_at DESC LIMIT ?", (limit,),
+    )
+    keys = ("job_id", "repo", "description", "state", "started_at", "finished_at", "telemetry")
+    history = [dict(zip(keys, row)) for row in rows]
+    for h in history:
+        h["telemetry"] = json.loads(h["telemetry"]) if h["telemetry"] else None
+    return history
+
+
+def record_review(repo: str, kind: str, number: int | None = None, detail: str = "") -> None:
+    """Log a review run: kind "pr" (with its number) or "codebase"."""
+    with _tx() as conn:
+        conn.execute(
+            "INSERT INTO reviews (repo, kind, number, reviewed_at, detail) VALUES (?, ?, ?, ?, ?)",
+            (repo, kind, number, time.time(), detail),
+        )
+
+
+def last_pr_reviews(repo: str) -> dict[int, float]:
+    """When each PR of a repo was last reviewed (unix time)."""
+    return dict(_query(
+        "SELECT number, MAX(reviewed_at) FROM reviews WHERE repo = ? AND kind = 'pr' GROUP BY number",
+        (repo,),
+    ))
+
+
+# Job journal
+
+def journal_open(kind: str, repo: str, number: int, chat_id: int | None, params: dict) -> int:
+    """Start a journal entry for a queued job. Returns its id."""
+    with _tx() as conn:
+        cur = conn.execute(
+            "INSERT INTO journal (kind, repo, number, chat_id, params, phase, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+            (kind, repo, number, chat_id, json.dumps(params), time.time()),
+        )
+        return cur.lastrowid
+
+
+def journal_phase(entry_id: int, phase: str, **data) -> None:
+    """Record that a job completed `phase`, merging `data` into what it has saved so far."""
+    with _tx() as conn:
+        (saved,) = conn.execute("SELECT data FROM journal WHERE id = ?", (entry_id,)).fetchone()
+        conn.execute(
+            "UPDATE journal SET phase = ?, data = ?, updated_at = ? WHERE id = ?",
+            (phase, json.dumps({**json.loads(saved), **data}), time.time(), entry_id),
+        )
+
+
+def journal_close(entry_id: int, state: str) -> None:
+    with _tx() as conn:
+        conn.execute(
+            "UPDATE journal SET state = ?, updated_at = ? WHERE id = ?", (state, time.time(), entry_id),
+        )
+
+
+def journal_resumed(entry_id: int) -> int:
+    """Count a resume of an entry. Returns how many times it has been resumed."""
+    with _tx() as conn:
+        conn.execute("UPDATE journal SET resumes = resumes + 1 WHERE id = ?", (entry_id,))
+        return conn.execute("SELECT resumes FROM journal WHERE id = ?", (entry_id,)).fetchone()[0]
+
+
+def journal_active() -> list[dict]:
+    """Entries whose job never finished, i.e. was interrupted by a restart, oldest first."""
+    rows = _query(
+        "SELECT id, kind, repo, number, chat_id, params, phase, data, resumes"
+        " FROM journal WHERE state = 'active' ORDER BY id",
+    )
+    keys = ("id", "kind", "repo", "number", "chat_id", "params", "phase", "data", "resumes")
+    entries = [dict(zip(keys, row)) for row in rows]
+    for e in entries:
+        e["params"], e["data"] = json.loads(e["params"]), json.loads(e["data"])
+    return entries
@@ -0,0 +1,179 @@
+"""Parse Claude CLI stream-json output into per-run telemetry.
+
+The worker runs the CLI with --output-format stream-json, which prints one
+JSON event per line (assistant messages with text and tool calls, tool
+results, and a final result with usage and cost). Every second of wall time
+is attributed to a phase: the tool call in flight (tests, editing, reading,
+shell, other) or, when no tool is running, "thinking".
+"""
+
+import json
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+EDIT_TOOLS = {"Edit", "MultiEdit", "Write", "NotebookEdit"}
+READ_TOOLS = {"Read", "Grep", "Glob", "LS", "WebFetch", "WebSearch"}
+_TEST_COMMAND = re.compile(
+    r"\b(pytest|unittest|tox|nox|jest|vitest|mocha|rspec|phpunit|ctest"
+    r"|go test|cargo test|(npm|yarn|pnpm)( run)? test|make (test|check))\b"
+)
+MAX_FILES = 50
+
+
+def _phase(tool: str, tool_input: dict) -> str:
+    if tool in EDIT_TOOLS:
+        return "editing"
+    if tool in READ_TOOLS:
+        return "reading"
+    if tool == "Bash":
+        return "tests" if _TEST_COMMAND.search(tool_input.get("command", "")) else "shell"
+    return "other"
+
+
+def _duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+@dataclass
+class RunTelemetry:
+    root: str = ""  # checkout the run works in; edited paths are shown relative to it
+    started: float = field(default_factory=time.monotonic)
+    last_event: float | None = None
+    seconds: Counter = field(default_factory=Counter)
+    tool_calls: Counter = field(default_factory=Counter)
+    files_edited: list[str] = field(default_factory=list)
+    turns: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost_usd: float | None = None
+    result: str = ""
+    last_text: str = ""
+    _pending: dict[str, str] = field(default_factory=dict, repr=False)
+    _usage: dict[str | None, dict] = field(default_factory=dict, repr=False)
+
+    def feed(self, line: str, now: float | None = None) -> str | None:
+        """Account for one line of CLI output. Returns text to show the user, if any.
+
+        Lines that aren't stream-json events are shown as they are.
+        """
+        now = time.monotonic() if now is None else now
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return line if line.strip() else None
+        if not isinstance(event, dict):
+            return line
+
+        # Time since the previous event belongs to the tool that was running,
+        # or to the model if none was
+        previous = self.last_event if self.last_event is not None else self.started
+        phase = next(iter(self._pending.values()), "thinking")
+        self.seconds[phase] += max(0.0, now - previous)
+        self.last_event = now
+
+        kind = event.get("type")
+        if kind == "assistant":
+            return self._assistant(event.get("message") or {})
+        if kind == "user":
+            for block in (event.get("message") or {}).get("content") or []:
+                if isinstance(block, dict) and block.get("type") == "tool_result":
+                    self._pending.pop(block.get("tool_use_id"), None)
+            return None
+        if kind == "result":
+            self.result = event.get("result") or ""
+            self.turns = event.get("num_turns") or self.turns
+            self.cost_usd = event.get("total_cost_usd", self.cost_usd)
+            if event.get("usage"):
+                self._add_usage(event["usage"], reset=True)
+            return None
+        return None
+
+    def _assistant(self, message: dict) -> str | None:
+        # Each content block of a message arrives as its own event repeating
+        # the message id and usage; count them once
+        if message.get("id") not in self._usage:
+            self.turns += 1
+            self._usage[message.get("id")] = {}
+        if message.get("usage"):
+            self._usage[message.get("id")] = message["usage"]
+            self.input_tokens = self.output_tokens = 0
+            for usage in self._usage.values():
+                self._add_usage(usage)
+        shown = []
+        for block in message.get("content") or []:
+            if block.get("type") == "text" and block.get("text", "").strip():
+                self.last_text = block["text"]
+                shown.append(block["text"])
+            elif block.get("type") == "tool_use":
+                name, tool_input = block.get("name", "?"), block.get("input") or {}
+                self._pending[block.get("id", "")] = _phase(name, tool_input)
+                self.tool_calls[name] += 1
+                path = tool_input.get("file_path") or tool_input.get("notebook_path")
+                if path and self.root and path.startswith(self.root.rstrip("/") + "/"):
+                    path = path[len(self.root.rstrip("/")) + 1:]
+                if name in EDIT_TOOLS and path and path not in self.files_edited:
+                    if len(self.files_edited) < MAX_FILES:
+                        self.files_edited.append(path)
+                detail = tool_input.get("command") or path or tool_input.get("pattern") or ""
+                shown.append(f"> {name} {detail}".rstrip())
+        return "\n".join(shown) or None
+
+    def _add_usage(self, usage: dict, reset: bool = False) -> None:
+        if reset:
+            self.input_tokens = self.output_tokens = 0
+        self.input_tokens += (
+            usage.get("input_tokens", 0)
+            + usage.get("cache_read_input_tokens", 0)
+            + usage.get("cache_creation_input_tokens", 0)
+        )
+        self.output_tokens += usage.get("output_tokens", 0)
+
+    def elapsed(self) -> float:
+        return (self.last_event or time.monotonic()) - self.started
+
+    def breakdown(self) -> str:
+        """Wall time per phase, largest first, e.g. "tests 2m10s, thinking 1m05s"."""
+        return ", ".join(f"{phase} {_duration(s)}" for phase, s in self.seconds.most_common() if s >= 1)
+
+    def status_line(self) -> str:
+        """One-line progress summary for /status."""
+        parts = [f"{self.turns} turns", f"{sum(self.tool_calls.values())} tool calls"]
+        if self.files_edited:
+            parts.append(f"{len(self.files_edited)} files edited")
+        if self.breakdown():
+            parts.append(self.breakdown())
+        return "; ".join(parts)
+
+    def summary(self) -> str:
+        """Markdown run report for PR bodies."""
+        lines = [f"- Wall time: {_duration(self.elapsed())} ({self.breakdown() or 'n/a'})"]
+        lines.append(f"- Turns: {self.turns}, tool calls: " + (
+            ", ".join(f"{n} {t}" for t, n in self.tool_calls.most_common()) or "none"
+        ))
+        tokens = f"- Tokens: {self.input_tokens:,} in / {self.output_tokens:,} out"
+        if self.cost_usd is not None:
+            tokens += f", ${self.cost_usd:.2f}"
+        lines.append(tokens)
+        if self.files_edited:
+            lines.append("- Files edited: " + ", ".join(f"`{f}`" for f in self.files_edited))
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        """Compact form saved next to the run's log."""
+        return {
+            "elapsed": round(self.elapsed(), 1),
+            "seconds": {k: round(v, 1) for k, v in self.seconds.items()},
+            "tool_calls": dict(self.tool_calls),
+            "files_edited": self.files_edited,
+            "turns": self.turns,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": self.cost_usd,
+        }
@@ -0,0 +1,122 @@
+"""Per-repo issue fetch and triage, fanned out across repos."""
+
+import asyncio
+import hashlib
+import json
+import logging
+from minbot import agithub, agent, store
+
+log = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_MAX_ENTRIES = 5000
+_ROW_KEYS = ("difficulty", "urgency", "summary", "has_pr")
+
+_stats = {"hits": 0, "misses": 0}
+
+
+def _hash(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _cache_key(repo: str, issue: dict, prs_hash: str) -> str:
+    content = _hash([issue["title"], issue.get("body", ""), sorted(issue.get("labels", []))])
+    return f"{repo}#{issue['number']}:{content}:{prs_hash}"
+
+
+def cache_stats() -> dict:
+    """Triage cache hit/miss counters since startup."""
+    total = _stats["hits"] + _stats["misses"]
+    return {**_stats, "hit_ratio": _stats["hits"] / total if total else 0.0}
+
+
+async def fan_out(repos: list[str], fn, limit: int) -> list[tuple[str, object]]:
+    """Run `await fn(repo)` for each repo with at most `limit` in flight.
+
+    Returns (repo, result) pairs in the order of `repos`. A repo that raises
+    yields the exception as its result so one failure can't sink the rest.
+    """
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def one(repo):
+        async with sem:
+            try:
+                return repo, await fn(repo)
+            except Exception as e:
+                log.error("Failed on %s: %s", repo, e)
+                return repo, e
+
+    return await asyncio.gather(*(one(r) for r in repos))
+
+
+async def prime_mirrors(repos: list[str]) -> None:
+    """Cold-start issue mirrors for several repos in batched GraphQL queries.
+
+    Best effort: if the batch fails (e.g. one repo is inaccessible), each
+    repo's own sync primes it individually later.
+    """
+    try:
+        await agithub.prime_mirrors(repos)
+    except Exception as e:
+        log.warning("Batched mirror priming failed, falling back to per-repo sync: %s", e)
+
+
+async def analyze_repo(repo: str, config, on_listed=None, select=None) -> list[dict]:
+    """Fetch open issues and PRs for a repo and triage the issues.
+
+    Issues whose content and the repo's PR set are unchanged since the last
+    run are served from the store's triage table; only the rest go to the LLM.
+    Returns the analyze_issues rows in issue order, each tagged with "repo".
+
+    If some issues need the LLM and on_listed is given, it is awaited first
+    with every issue's row as known so far: cached rows, and bare
+    number/title rows for the rest.
+
+    select, if given, is called with the open issues (newest first) and
+    returns the ones to triage, e.g. one filtered page; the rest are left
+    alone. Cache keys don't depend on it.
+    """
+    all_items = await agithub.list_issues(repo, include_prs=True, limit=None)
+    issues = [i for i in all_items if not i["is_pr"]]
+    prs = [i for i in all_items if i["is_pr"]]
+    if select:
+        issues = select(issues)
+    if not issues:
+        return []
+
+    prs_hash = _hash(sorted((p["number"], p["title"]) for p in prs))
+    keys = {i["number"]: _cache_key(repo, i, prs_hash) for i in issues}
+    cached = store.triage_rows(list(keys.values()), CACHE_TTL_SECONDS)
+    rows = {}
+    for i in issues:
+        if keys[i["number"]] in cached:
+            rows[i["number"]] = {"number": i["number"], "title": i["title"], **cached[keys[i["number"]]]}
+    misses = [i for i in issues if i["number"] not in rows]
+    _stats["hits"] += len(rows)
+    _stats["misses"] += len(misses)
+
+    if misses:
+        if on_listed:
+            await on_listed([
+                {**rows.get(i["number"], {"number": i["number"], "title": i["title"]}), "repo": repo}
+                for i in issues
+            ])
+        fresh = await agent.analyze_issues(misses, config.anthropic_api_key, prs)
+        fresh = [a for a in fresh if a.get("number") in keys]
+        for a in fresh:
+            rows[a["number"]] = a
+        store.save_triage(
+            [(keys[a["number"]], repo, a["number"], {k: a[k] for k in _ROW_KEYS if k in a}) for a in fresh],
+            CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES,
+        )
+
+    analyzed = [rows[i["number"]] for i in issues if i["number"] in rows]
+    for a in analyzed:
+        a["repo"] = repo
+    return analyzed
+
+
+async def analyze_repos(repos: list[str], config) -> list[tuple[str, object]]:
+    """analyze_repo for every repo, concurrently, in config order."""
+    await prime_mirrors(repos)
+    return await fan_out(repos, lambda r: analyze_repo(r, config), config.max_concurrent_repos)
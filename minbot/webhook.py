@@ -0,0 +1,173 @@
+"""GitHub webhook receiver, an alternative to polling for new issues and PRs.
+
+A small HTTP endpoint (asyncio streams, no web framework) accepts POSTed
+deliveries, checks the X-Hub-Signature-256 HMAC against webhook_secret,
+answers 202 straight away and handles the event in the background:
+
+    issues               mirror updated; new issues are triaged and announced
+    pull_request         mirror updated; new PRs are announced
+    pull_request_review  submitted reviews are announced
+    issue_comment        mirror updated; comments on PRs are announced
+
+Handling runs as background GitHub work (token bucket), and scheduled
+issue checks drop to a daily reconciliation while webhooks are on.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+from collections import deque
+from minbot import agithub, github, store, triage
+from minbot import config as config_service
+
+log = logging.getLogger(__name__)
+
+MAX_BODY = 5 * 1024 * 1024
+MAX_HEADERS = 100
+READ_TIMEOUT = 10
+SEEN_DELIVERIES = 500
+# Footer minbot puts on its own comments; those echo back as deliveries
+_OWN_MARKER = "[minbot](https://github.com/ChicagoHAI/minbot)"
+_REASONS = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+    405: "Method Not Allowed", 413: "Payload Too Large",
+}
+
+_seen: deque[str] = deque(maxlen=SEEN_DELIVERIES)
+_tasks: set[asyncio.Task] = set()
+
+
+def verify(secret: str, body: bytes, signature: str | None) -> bool:
+    """Check a X-Hub-Signature-256 header ("sha256=<hex>") against the body."""
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+def _labels(item: dict) -> str:
+    return f" [{', '.join(item['labels'])}]" if item["labels"] else ""
+
+
+async def _new_issue(repo: str, item: dict, config, send_message) -> None:
+    """Announce a new issue with its triage row, if triage succeeds.
+
+    Only this issue is triaged, not the rest of the repo's backlog.
+    """
+    text = f"New issue in {repo}:\n\n#{item['number']} {item['title']}{_labels(item)}"
+    try:
+        rows = await triage.analyze_repo(
+            repo, config, select=lambda issues: [i for i in issues if i["number"] == item["number"]],
+        )
+        row = rows[0] if rows else None
+        if row:
+            text += f"\n\n{row['difficulty']} / {row['urgency']}: {row['summary']}"
+    except Exception as e:
+        log.warning("Triage of %s#%d failed: %s", repo, item["number"], e)
+    await send_message(text)
+
+
+async def handle(event: str, payload: dict, send_message) -> None:
+    """Apply one delivery to local state and send any notification it calls for."""
+    config = config_service.get_config()
+    repo = (payload.get("repository") or {}).get("full_name")
+    if repo not in config.github_repos:
+        return
+    action = payload.get("action")
+
+    if event == "issues":
+        raw = payload["issue"]
+        if action in ("deleted", "transferred"):
+            raw = {**raw, "state": "closed"}
+        item = await agithub.run(github.record_item, repo, raw)
+        if action == "opened" and store.mark_seen(repo, item["number"]):
+            await _new_issue(repo, item, config, send_message)
+
+    elif event == "pull_request":
+        pr = payload["pull_request"]
+        await agithub.run(github.record_item, repo, pr)
+        if action == "opened" and store.mark_seen(repo, pr["number"], is_pr=True):
+            await send_message(
+                f"New PR in {repo}:\n\n#{pr['number']} {pr['title']} ({pr['head']['ref']})"
+            )
+
+    elif event == "pull_request_review":
+        review, pr = payload["review"], payload["pull_request"]
+        if action == "submitted" and (review["state"] != "commented" or review.get("body")):
+            text = f"Review on {repo} #{pr['number']} by {review['user']['login']}: {review['state']}"
+            if review.get("body"):
+                text += f"\n\n{review['body'][:1000]}"
+            await send_message(text)
+
+    elif event == "issue_comment":
+        issue, comment = payload["issue"], payload["comment"]
+        await agithub.run(github.record_item, repo, issue)
+        body = comment.get("body") or ""
+        if action == "created" and "pull_request" in issue and _OWN_MARKER not in body:
+            await send_message(
+                f"Comment on {repo} #{issue['number']} by {comment['user']['login']}:\n\n{body[:1000]}"
+            )
+
+
+async def _process(event: str, delivery: str | None, payload: dict, send_message) -> None:
+    github.background.set(True)
+    try:
+        await handle(event, payload, send_message)
+    except Exception:
+        log.exception("Webhook %s (%s) failed", event, delivery)
+
+
+async def _receive(reader: asyncio.StreamReader, send_message) -> int:
+    """Read one request and queue its event. Returns the HTTP status to answer with."""
+    method, _, _ = (await reader.readline()).decode("latin-1").partition(" ")
+    headers = {}
+    for _ in range(MAX_HEADERS):
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        return 400
+    if method != "POST":
+        return 405
+    length = int(headers.get("content-length", "0"))
+    if length > MAX_BODY:
+        return 413
+    body = await reader.readexactly(length)
+
+    if not verify(config_service.get_config().webhook_secret or "", body, headers.get("x-hub-signature-256")):
+        return 401
+    event, delivery = headers.get("x-github-event", ""), headers.get("x-github-delivery")
+    if delivery and delivery in _seen:
+        return 200  # redelivery of one already handled
+    payload = json.loads(body)
+    if delivery:
+        _seen.append(delivery)
+    if event != "ping":
+        task = asyncio.create_task(_process(event, delivery, payload, send_message))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    return 202
+
+
+async def serve(host: str, port: int, send_message) -> asyncio.Server:
+    """Start listening for deliveries. Close the returned server to stop."""
+    async def on_connection(reader, writer):
+        try:
+            status = await asyncio.wait_for(_receive(reader, send_message), READ_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            status = 400
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode()
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(on_connection, host, port)
+    log.info("Listening for GitHub webhooks on %s:%d", host, port)
+    return server
@@ -1,20 +1,152 @@
-"""Claude Code CLI integration for working on issues and PRs."""
+"""Claude Code CLI integration for working on issues and PRs.
+
+Jobs with a journal entry record each phase they complete (checked_out,
+claude_done, pushed, pr_created). A job resumed after a restart skips
+what its entry says is done: from claude_done it only restores Claude's
+commit, pushes and opens the PR; from checked_out it runs Claude again,
+told to continue from whatever is already on the branch.
+"""
 
 import asyncio
 import json
 import logging
 import os
-import subprocess
+from collections import deque
 from pathlib import Path
-from minbot import github
+from minbot import agithub, jobs, store, workspace
+from minbot.telemetry import RunTelemetry
 
 log = logging.getLogger(__name__)
 
 LOGS_DIR = os.path.join(str(Path.home()), ".minbot", "logs", "claude")
 
+# Output kept in memory: the last TAIL_LINES lines, each cut to MAX_LINE bytes
+TAIL_LINES = 200
+MAX_LINE = 2000
+# stream-json events longer than this (huge tool results) are skipped whole
+MAX_EVENT = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Minimum seconds between on_output calls; output in between is coalesced
+OUTPUT_INTERVAL = 5.0
+OUTPUT_CHARS = 4000
+
+
+async def _notify(on_output, text: str) -> None:
+    try:
+        await on_output(text)
+    except Exception:
+        # A failed progress update (e.g. Telegram hiccup) must not kill the job
+        log.warning("on_output failed", exc_info=True)
+
+
+def _save_telemetry(log_path: str, telemetry: RunTelemetry) -> None:
+    stats_path = os.path.splitext(log_path)[0] + ".stats.json"
+    try:
+        with open(stats_path, "w") as f:
+            json.dump(telemetry.to_dict(), f)
+    except OSError:
+        log.warning("Could not save run stats to %s", stats_path, exc_info=True)
+
+
+async def _run_claude(
+    cmd: list[str], cwd: str, log_path: str, on_output=None,
+) -> tuple[int, str, RunTelemetry]:
+    """Run the Claude CLI, teeing its output to `log_path` and a ring buffer.
+
+    The CLI runs with --output-format stream-json; each event is parsed into
+    a RunTelemetry (attached to the current job for /status and saved next
+    to the log) and rendered as readable text for the tail.
+
+    Memory stays bounded however long the run is. While it runs, on_output
+    (if given) is called with the latest tail of the output at most once per
+    OUTPUT_INTERVAL, and once more at the end.
+
+    Returns (exit code, tail, telemetry).
+    """
+    tail: deque[str] = deque(maxlen=TAIL_LINES)
+    changed = asyncio.Event()
+    telemetry = RunTelemetry(root=cwd)
+    job = jobs.current()
+    if job:
+        job.telemetry = telemetry
+
+    def add(line: bytes) -> None:
+        shown = telemetry.feed(line.decode(errors="replace"))
+        if shown:
+            tail.extend(part[:MAX_LINE] for part in shown.split("\n"))
+
+    def text() -> str:
+        return "\n".join(tail)[-OUTPUT_CHARS:]
+
+    async def publish():
+        while True:
+            await changed.wait()
+            changed.clear()
+            await _notify(on_output, text())
+            await asyncio.sleep(OUTPUT_INTERVAL)
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    publisher = asyncio.create_task(publish()) if on_output else None
+    try:
+        partial = b""
+        overflowing = False  # dropping an oversized line up to its newline
+        with open(log_path, "wb") as log_file:
+            while chunk := await proc.stdout.read(CHUNK_SIZE):
+                log_file.write(chunk)
+                lines = (partial + chunk).split(b"\n")
+                partial = lines.pop()
+                if overflowing and lines:
+                    lines.pop(0)
+                    overflowing = False
+                if overflowing or len(partial) > MAX_EVENT:
+                    partial, overflowing = b"", True
+                for line in lines:
+                    if len(line) <= MAX_EVENT:
+                        add(line)
+                changed.set()
+            if partial:
+                add(partial)
+        await proc.wait()
+    except asyncio.CancelledError:
+        # /cancel: don't leave Claude running in the checkout
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    finally:
+        if publisher:
+            publisher.cancel()
+        _save_telemetry(log_path, telemetry)
+
+    if on_output and tail:
+        await _notify(on_output, text())
+    return proc.returncode, "\n".join(tail), telemetry
+
+
+RESUME_NOTE = (
+    "\n\nNote: an earlier run of this task was interrupted by a restart. The branch may "
+    "already contain part of the work, committed or not (check git log and git status); "
+    "continue from there instead of starting over."
+)
+
+
+async def _record(phase: str, repo_path: str | None = None, **data) -> None:
+    """Journal that the current job completed `phase`. With repo_path, also saves its HEAD."""
+    job = jobs.current()
+    if job is None or job.journal_id is None:
+        return
+    if repo_path:
+        data["head"] = await agithub.run_git(workspace.head, repo_path)
+    store.journal_phase(job.journal_id, phase, **data)
+
 
 async def work_on_issue(
-    workspace_dir: str, repo: str, issue: dict, on_output=None,
+    workspace_dir: str, repo: str, issue: dict, on_output=None, resume: dict | None = None,
 ) -> str:
     """Run Claude Code on an issue. Returns the final output.
 
@@ -22,13 +154,63 @@ async def work_on_issue(
         workspace_dir: Base directory for cloned repos.
         repo: GitHub repo in owner/repo format.
         issue: Issue dict with number, title, body.
-        on_output: Optional async callback for streaming output lines.
+        on_output: Optional async callback, called with the latest output
+            tail as the run progresses.
+        resume: Journal entry of an interrupted run of this job, if any.
     """
-    repo_path = os.path.join(workspace_dir, repo)
     branch = f"issue-{issue['number']}"
-    github.clone_repo(repo, repo_path)
-    github.create_branch(repo_path, branch)
+    async with workspace.checkout(workspace_dir, repo, branch, create=True, resume=resume is not None) as repo_path:
+        return await _work_on_issue(repo_path, repo, branch, issue, on_output, resume)
+
+
+async def _work_on_issue(
+    repo_path: str, repo: str, branch: str, issue: dict, on_output, resume: dict | None,
+) -> str:
+    phase = resume["phase"] if resume else None
+    if phase in ("claude_done", "pushed", "pr_created"):
+        done = resume["data"]
+        await agithub.run_git(workspace.restore, repo_path, done["head"])
+        summary, stats, status = done["summary"], done["stats"], done["status"]
+    else:
+        await _record("checked_out")
+        summary, stats, status = await _claude_on_issue(
+            repo_path, repo, branch, issue, on_output, phase == "checked_out",
+        )
+        await _record("claude_done", repo_path, summary=summary, stats=stats, status=status)
 
+    if phase not in ("pushed", "pr_created"):
+        # Push (Claude already merged main and ran tests)
+        await agithub.push_branch(repo_path, branch, set_upstream=True)
+        await _record("pushed")
+    pr_body = (
+        f"Closes #{issue['number']}\n\n"
+        f"## Issue\n\n"
+        f"**{issue['title']}**\n\n"
+        f"{issue.get('body', '')[:500]}\n\n"
+        f"## Changes\n\n"
+        f"{summary}\n\n"
+        f"<details><summary>Run stats</summary>\n\n{stats}\n\n</details>\n\n"
+        f"---\n"
+        f"Automated by [minbot](https://github.com/ChicagoHAI/minbot) using Claude Code."
+    )
+    pr_url = await agithub.create_pr(
+        repo,
+        title=f"Fix #{issue['number']}: {issue['title']}",
+        body=pr_body,
+        branch=branch,
+    )
+    await _record("pr_created", pr_url=pr_url)
+
+    return f"Done! PR created: {pr_url}\n{status}"
+
+
+async def _claude_on_issue(
+    repo_path: str, repo: str, branch: str, issue: dict, on_output, resumed: bool,
+) -> tuple[str, str, str]:
+    """Run Claude on the issue. Returns (PR summary, run stats, status line).
+
+    Raises RuntimeError if Claude exits non-zero.
+    """
     prompt = (
         f"Work on this GitHub issue.\n\n"
         f"Issue #{issue['number']}: {issue['title']}\n\n"
@@ -41,6 +223,8 @@ async def work_on_issue(
         f"5. Run the build and tests again after the merge. Fix any issues.\n"
         f"6. Commit and push the branch '{branch}'."
     )
+    if resumed:
+        prompt += RESUME_NOTE
 
     # Log to file — no buffer limits, persistent for debugging
     log_dir = os.path.join(LOGS_DIR, repo.replace("/", "_"))
@@ -49,60 +233,25 @@ async def work_on_issue(
 
     cmd = [
         "claude", "--dangerously-skip-permissions",
+        "--output-format", "stream-json", "--verbose",
         "-p", prompt,
     ]
     log.info("Running claude on %s#%s (log: %s)", repo, issue['number'], log_path)
 
-    with open(log_path, "w") as log_file:
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            cwd=repo_path,
-            stdout=log_file,
-            stderr=log_file,
-        )
-        await proc.wait()
-
-    log.info("Claude finished with exit code %s (log: %s)", proc.returncode, log_path)
+    returncode, output, telemetry = await _run_claude(cmd, repo_path, log_path, on_output)
+    log.info("Claude finished with exit code %s (log: %s)", returncode, log_path)
 
-    with open(log_path) as f:
-        output = f.read()
+    if returncode != 0:
+        raise RuntimeError(f"Claude Code exited with code {returncode}\nLog: {log_path}\n{output[-2000:]}")
 
-    if on_output and output:
-        await on_output(output[-4000:])
-
-    if proc.returncode != 0:
-        return f"Claude Code exited with code {proc.returncode}\nLog: {log_path}\n{output[-2000:]}"
-
-    # Push (Claude already merged main and ran tests)
-    subprocess.run(
-        ["git", "push", "-u", "origin", branch],
-        cwd=repo_path, check=True, capture_output=True,
-    )
-    # Use the last portion of Claude's output as the PR summary
-    summary = output.strip()[-3000:] if output.strip() else "No output captured."
-    pr_body = (
-        f"Closes #{issue['number']}\n\n"
-        f"## Issue\n\n"
-        f"**{issue['title']}**\n\n"
-        f"{issue.get('body', '')[:500]}\n\n"
-        f"## Changes\n\n"
-        f"{summary}\n\n"
-        f"---\n"
-        f"Automated by [minbot](https://github.com/ChicagoHAI/minbot) using Claude Code."
-    )
-    pr_url = github.create_pr(
-        repo,
-        title=f"Fix #{issue['number']}: {issue['title']}",
-        body=pr_body,
-        branch=branch,
-    )
-
-    return f"Done! PR created: {pr_url}"
+    # Claude's final message is the PR summary
+    summary = (telemetry.result or telemetry.last_text or output).strip()[-3000:] or "No output captured."
+    return summary, telemetry.summary(), telemetry.status_line()
 
 
 async def address_pr_comments(
     workspace_dir: str, repo: str, pr: dict, comments: list[dict],
-    user_instructions: str = "", on_output=None,
+    user_instructions: str = "", on_output=None, resume: dict | None = None,
 ) -> str:
     """Run Claude Code on a PR branch to address review comments.
 
@@ -112,13 +261,32 @@ async def address_pr_comments(
         pr: PR dict with number, title, body, branch.
         comments: List of review/issue comments from get_pr_comments.
         user_instructions: Additional instructions from the user's Telegram message.
-        on_output: Optional async callback for streaming output lines.
+        on_output: Optional async callback, called with the latest output
+            tail as the run progresses.
+        resume: Journal entry of an interrupted run of this job, if any.
     """
-    repo_path = os.path.join(workspace_dir, repo)
     branch = pr["branch"]
-    github.clone_repo(repo, repo_path)
-    github.checkout_pr_branch(repo_path, branch)
+    async with workspace.checkout(workspace_dir, repo, branch, resume=resume is not None) as repo_path:
+        return await _address_pr_comments(
+            repo_path, repo, branch, pr, comments, user_instructions, on_output, resume,
+        )
 
+
+async def _address_pr_comments(
+    repo_path: str, repo: str, branch: str, pr: dict, comments: list[dict],
+    user_instructions: str, on_output, resume: dict | None,
+) -> str:
+    phase = resume["phase"] if resume else None
+    if phase in ("claude_done", "pushed"):
+        done = resume["data"]
+        if phase == "claude_done":
+            # If the checkout reset the branch to origin, put Claude's commits back
+            await agithub.run_git(workspace.restore, repo_path, done["head"])
+            await agithub.push_branch(repo_path, branch)
+            await _record("pushed")
+        return f"Done! Pushed changes to branch '{branch}' for PR #{pr['number']}.\n{done['status']}"
+
+    await _record("checked_out")
     comments_text = ""
     for c in comments:
         if c["type"] == "review":
@@ -142,6 +310,8 @@ async def address_pr_comments(
         f"3. Run every check from the CI pipeline. Fix all failures.\n"
         f"4. Commit and push to branch '{branch}'."
     )
+    if phase == "checked_out":
+        prompt += RESUME_NOTE
 
     log_dir = os.path.join(LOGS_DIR, repo.replace("/", "_"))
     os.makedirs(log_dir, exist_ok=True)
@@ -149,33 +319,19 @@ async def address_pr_comments(
 
     cmd = [
         "claude", "--dangerously-skip-permissions",
+        "--output-format", "stream-json", "--verbose",
         "-p", prompt,
     ]
     log.info("Running claude on %s PR #%s (log: %s)", repo, pr['number'], log_path)
 
-    with open(log_path, "w") as log_file:
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            cwd=repo_path,
-            stdout=log_file,
-            stderr=log_file,
-        )
-        await proc.wait()
+    returncode, output, telemetry = await _run_claude(cmd, repo_path, log_path, on_output)
+    log.info("Claude finished with exit code %s (log: %s)", returncode, log_path)
 
-    log.info("Claude finished with exit code %s (log: %s)", proc.returncode, log_path)
+    if returncode != 0:
+        raise RuntimeError(f"Claude Code exited with code {returncode}\nLog: {log_path}\n{output[-2000:]}")
 
-    with open(log_path) as f:
-        output = f.read()
-
-    if on_output and output:
-        await on_output(output[-4000:])
-
-    if proc.returncode != 0:
-        return f"Claude Code exited with code {proc.returncode}\nLog: {log_path}\n{output[-2000:]}"
-
-    subprocess.run(
-        ["git", "push", "origin", branch],
-        cwd=repo_path, check=True, capture_output=True,
-    )
+    await _record("claude_done", repo_path, status=telemetry.status_line())
+    await agithub.push_branch(repo_path, branch)
+    await _record("pushed")
 
-    return f"Done! Pushed changes to branch '{branch}' for PR #{pr['number']}."
+    return f"Done! Pushed changes to branch '{branch}' for PR #{pr['number']}.\n{telemetry.status_line()}"
@@ -0,0 +1,231 @@
+"""Per-job git worktrees over one bare clone per repo.
+
+Layout under workspace_dir:
+    .repos/<owner>/<repo>.git          bare clone, branches under origin/*
+    .worktrees/<owner>/<repo>/wt-<n>   worktrees handed out to jobs
+
+Idle worktrees are reused (reset, cleaned and switched to the job's
+branch) and trimmed back to POOL_SIZE per repo when jobs finish. A job
+resumed after a restart gets its old worktree back untouched, uncommitted
+work included.
+
+warm() is run in the background by the scheduler. While a repo is warm,
+jobs on the default branch or a new branch skip the fetch entirely and
+start from a local checkout.
+"""
+
+import contextlib
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from minbot import agithub, github
+from minbot.config import CloneStrategy
+
+log = logging.getLogger(__name__)
+
+POOL_SIZE = 2
+
+_clone = CloneStrategy()
+_clone_overrides: dict[str, CloneStrategy] = {}
+_fresh_seconds = 0.0
+_fetched: dict[str, float] = {}
+_repo_locks: defaultdict[str, threading.Lock] = defaultdict(threading.Lock)
+_busy: set[str] = set()
+
+
+def _git(cwd: str, *args: str) -> str:
+    result = subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True)
+    return result.stdout.strip()
+
+
+def _has_ref(cwd: str, ref: str) -> bool:
+    result = subprocess.run(["git", "rev-parse", "--verify", "--quiet", ref], cwd=cwd, capture_output=True)
+    return result.returncode == 0
+
+
+def configure(
+    clone: CloneStrategy, overrides: dict[str, CloneStrategy] | None = None, fresh_seconds: float = 0,
+) -> None:
+    """Set the clone strategies and how long a fetched repo counts as warm."""
+    global _clone, _clone_overrides, _fresh_seconds
+    _clone = clone
+    _clone_overrides = overrides or {}
+    _fresh_seconds = fresh_seconds
+
+
+def _fetch(workspace_dir: str, repo: str, branches: list[str]) -> None:
+    """Clone or fetch the bare repo with its configured strategy.
+
+    A reference of the form owner/repo means another repo's bare clone here.
+    """
+    strategy = _clone_overrides.get(repo, _clone)
+    reference = strategy.reference
+    if reference and not os.path.isabs(reference) and reference.count("/") == 1:
+        reference = bare_path(workspace_dir, reference)
+    github.clone_repo(
+        repo, bare_path(workspace_dir, repo), branches,
+        filter_spec=strategy.filter, depth=strategy.depth, reference=reference,
+    )
+    _fetched[repo] = time.monotonic()
+
+
+def _is_warm(repo: str) -> bool:
+    return time.monotonic() - _fetched.get(repo, float("-inf")) < _fresh_seconds
+
+
+def bare_path(workspace_dir: str, repo: str) -> str:
+    return os.path.join(workspace_dir, ".repos", f"{repo}.git")
+
+
+def _trees_dir(workspace_dir: str, repo: str) -> str:
+    return os.path.join(workspace_dir, ".worktrees", repo)
+
+
+def _worktrees(workspace_dir: str, repo: str) -> list[str]:
+    d = _trees_dir(workspace_dir, repo)
+    if not os.path.isdir(d):
+        return []
+    return sorted(os.path.join(d, n) for n in os.listdir(d))
+
+
+def _prepare(path: str, default: str, branch: str | None, create: bool) -> None:
+    """Reset a worktree and switch it to the job's branch.
+
+    Ignored files (build caches, virtualenvs) are kept so reuse stays cheap.
+    """
+    _git(path, "reset", "--hard")
+    _git(path, "clean", "-fd")
+    if branch is None:
+        _git(path, "checkout", "--detach", f"origin/{default}")
+    elif not create:
+        # Existing remote branch (PRs): local branch follows the remote
+        _git(path, "checkout", "-B", branch, f"origin/{branch}")
+    elif _has_ref(path, f"refs/heads/{branch}"):
+        _git(path, "checkout", branch)
+        _git(path, "merge", f"origin/{default}", "--no-edit")
+    else:
+        _git(path, "checkout", "-b", branch, f"origin/{default}")
+
+
+def _add_worktree(workspace_dir: str, repo: str, default: str) -> str:
+    trees = _worktrees(workspace_dir, repo)
+    n = 1
+    while os.path.join(_trees_dir(workspace_dir, repo), f"wt-{n}") in trees:
+        n += 1
+    path = os.path.join(_trees_dir(workspace_dir, repo), f"wt-{n}")
+    bare = bare_path(workspace_dir, repo)
+    _git(bare, "worktree", "prune")
+    _git(bare, "worktree", "add", "--detach", path, f"origin/{default}")
+    return path
+
+
+def warm(workspace_dir: str, repo: str, branches: list[str]) -> None:
+    """Fetch the default branch and `branches` (open PR heads) ahead of jobs.
+
+    Branches that aren't on origin (PRs from forks) are skipped. Also makes
+    sure an idle worktree exists so the next job doesn't pay for a checkout.
+    """
+    bare = bare_path(workspace_dir, repo)
+    with _repo_locks[repo]:
+        if not os.path.isdir(bare):
+            _fetch(workspace_dir, repo, [])
+        heads = _git(bare, "ls-remote", "--heads", "origin").splitlines()
+        remote = {line.split("refs/heads/", 1)[1] for line in heads if "refs/heads/" in line}
+        branches = [b for b in branches if b in remote]
+        _fetch(workspace_dir, repo, branches)
+        if not any(t not in _busy for t in _worktrees(workspace_dir, repo)):
+            _add_worktree(workspace_dir, repo, _git(bare, "symbolic-ref", "--short", "HEAD"))
+    log.info("Warmed %s (%d PR branches)", repo, len(branches))
+
+
+def acquire(
+    workspace_dir: str, repo: str, branch: str | None = None, create: bool = False, resume: bool = False,
+) -> str:
+    """Fetch the repo and hand out a worktree for one job. Returns its path.
+
+    branch=None gives a detached checkout of the default branch (reviews).
+    create=True starts `branch` from the default branch, or merges the
+    default branch into it if it already exists locally (/work). Otherwise
+    `branch` is reset to origin/<branch> (/pr).
+
+    resume=True is for a job interrupted by a restart: if an idle worktree
+    still has `branch` checked out, it is handed back as it was, so the
+    interrupted run's uncommitted changes survive.
+
+    The fetch is skipped while the repo is warm, except for /pr, which
+    always fetches its branch so it never works on a stale head.
+    """
+    started = time.monotonic()
+    bare = bare_path(workspace_dir, repo)
+    with _repo_locks[repo]:
+        if branch and not create:
+            _fetch(workspace_dir, repo, [branch])
+        elif not (os.path.isdir(bare) and _is_warm(repo)):
+            _fetch(workspace_dir, repo, [])
+        default = _git(bare, "symbolic-ref", "--short", "HEAD")
+        trees = _worktrees(workspace_dir, repo)
+        holders = {t: _git(t, "branch", "--show-current") for t in trees} if branch else {}
+        if any(b == branch and t in _busy for t, b in holders.items()):
+            raise RuntimeError(f"Branch {branch} is already checked out by another job")
+        idle = [t for t in trees if t not in _busy]
+        # Prefer the worktree that already has this branch: git won't check
+        # one branch out twice, and it's the cheapest switch
+        idle.sort(key=lambda t: holders.get(t) != branch)
+        path = idle[0] if idle else _add_worktree(workspace_dir, repo, default)
+        _busy.add(path)
+        try:
+            if resume and branch and holders.get(path) == branch:
+                log.info("Resuming %s in %s as left", branch, path)
+            else:
+                _prepare(path, default, branch, create)
+        except Exception:
+            _busy.discard(path)
+            raise
+    log.info(
+        "Worktree %s for %s (%s) ready in %.1fs",
+        path, repo, branch or "default branch", time.monotonic() - started,
+    )
+    return path
+
+
+def release(workspace_dir: str, repo: str, path: str) -> None:
+    """Return a worktree to the pool and drop idle ones beyond POOL_SIZE."""
+    with _repo_locks[repo]:
+        _busy.discard(path)
+        gc(workspace_dir, repo)
+
+
+def gc(workspace_dir: str, repo: str, keep: int | None = None) -> None:
+    """Remove idle worktrees beyond `keep` (default POOL_SIZE) and prune stale metadata."""
+    bare = bare_path(workspace_dir, repo)
+    if not os.path.isdir(bare):
+        return
+    idle = [t for t in _worktrees(workspace_dir, repo) if t not in _busy]
+    for path in idle[POOL_SIZE if keep is None else keep:]:
+        _git(bare, "worktree", "remove", "--force", path)
+    _git(bare, "worktree", "prune")
+
+
+def head(path: str) -> str:
+    """Commit a worktree has checked out."""
+    return _git(path, "rev-parse", "HEAD")
+
+
+def restore(path: str, commit: str) -> None:
+    """Point a worktree's branch back at `commit`, e.g. work a restarted job already did."""
+    _git(path, "reset", "--hard", commit)
+
+
+@contextlib.asynccontextmanager
+async def checkout(
+    workspace_dir: str, repo: str, branch: str | None = None, create: bool = False, resume: bool = False,
+):
+    """Async context manager around acquire/release. Yields the worktree path."""
+    path = await agithub.run_git(acquire, workspace_dir, repo, branch, create, resume)
+    try:
+        yield path
+    finally:
+        await agithub.run_git(release, workspace_dir, repo, path)
@@ -0,0 +1,14 @@
+"""Shared fixtures."""
+
+import pytest
+from minbot import store
+
+
+@pytest.fixture(autouse=True)
+def state_db(tmp_path, monkeypatch):
+    """Give every test its own empty state database."""
+    store.close()
+    monkeypatch.setattr(store, "DB_PATH", tmp_path / "minbot.db")
+    monkeypatch.setattr(store, "_LEGACY_KNOWN_ISSUES", tmp_path / "known_issues.json")
+    yield tmp_path / "minbot.db"
+    store.close()
@@ -1,83 +1,396 @@
 """Tests for LLM agent reasoning."""
 
+import asyncio
 import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+import httpx
+import pytest
+import anthropic
 from minbot import agent
 
 
-def _mock_message(text: str):
+@pytest.fixture(autouse=True)
+def _reset_runtime(monkeypatch):
+    monkeypatch.setattr(agent, "max_concurrent", agent.max_concurrent)
+    monkeypatch.setattr(agent, "timeout", agent.timeout)
+    agent._client = agent._semaphore = agent._review_semaphore = agent._loop = None
+    yield
+    agent._client = agent._semaphore = agent._review_semaphore = agent._loop = None
+
+
+def _mock_message(text: str, **usage):
     msg = MagicMock()
+    msg.usage = MagicMock(**{f: usage.get(f, 0) for f in agent.USAGE_FIELDS})
     block = MagicMock()
     block.text = text
     msg.content = [block]
     return msg
 
 
-@patch("minbot.agent.anthropic")
-def test_analyze_issues_sdk(mock_anthropic):
+def _mock_client(mock_anthropic, *responses):
+    client = MagicMock()
+    client.messages.create = AsyncMock(side_effect=list(responses))
+    mock_anthropic.AsyncAnthropic.return_value = client
+    return client
+
+
+class _FakeStream:
+    """Stands in for client.messages.stream(...): yields `text` in small pieces."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @property
+    async def text_stream(self):
+        for i in range(0, len(self.text), 7):
+            yield self.text[i:i + 7]
+
+    async def get_final_message(self):
+        return _mock_message(self.text)
+
+
+def _mock_stream_client(mock_anthropic, *responses):
+    """Client whose stream() answers with each response text (or raises it) in turn."""
     client = MagicMock()
-    mock_anthropic.Anthropic.return_value = client
+    client.messages.stream = MagicMock(side_effect=[
+        r if isinstance(r, Exception) else _FakeStream(r) for r in responses
+    ])
+    mock_anthropic.AsyncAnthropic.return_value = client
+    return client
+
+
+def _sent_text(call) -> str:
+    """The user message text of a recorded create()/stream() call."""
+    return "".join(block["text"] for block in call[1]["messages"][0]["content"])
+
+
+def _row(n, **extra):
+    return {"number": n, "title": f"Issue {n}", "difficulty": "easy", "urgency": "low", "summary": "s", **extra}
+
 
+def _mock_proc(stdout: str, returncode: int = 0):
+    proc = MagicMock()
+    proc.returncode = returncode
+    proc.communicate = AsyncMock(return_value=(stdout.encode(), b""))
+    return proc
+
+
+def _status_error(status: int, headers: dict | None = None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "https://api"))
+    return anthropic.APIStatusError("error", response=response, body=None)
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.anthropic")
+async def test_analyze_issues_sdk(mock_anthropic):
     analysis = [
         {"number": 1, "title": "Bug", "difficulty": "easy", "urgency": "high", "summary": "Fix the bug"},
         {"number": 2, "title": "Feature", "difficulty": "hard", "urgency": "low", "summary": "Add feature"},
     ]
-    client.messages.create.return_value = _mock_message(json.dumps(analysis))
+    client = _mock_stream_client(mock_anthropic, "```json\n" + json.dumps(analysis) + "\n```")
 
     issues = [
         {"number": 1, "title": "Bug", "body": "Fix it"},
         {"number": 2, "title": "Feature", "body": "Add it"},
     ]
-    result = agent.analyze_issues(issues, api_key="fake-key")
+    result = await agent.analyze_issues(issues, api_key="fake-key")
     assert len(result) == 2
     assert result[0]["difficulty"] == "easy"
     assert result[1]["urgency"] == "low"
-    client.messages.create.assert_called_once()
+    client.messages.stream.assert_called_once()
 
 
-@patch("minbot.agent.subprocess")
-def test_analyze_issues_cli(mock_subprocess):
+@pytest.mark.asyncio
+@patch("asyncio.create_subprocess_exec")
+async def test_analyze_issues_cli(mock_exec):
     analysis = [
         {"number": 1, "title": "Bug", "difficulty": "easy", "urgency": "high", "summary": "Fix the bug"},
     ]
-    mock_subprocess.run.return_value = MagicMock(
-        stdout=json.dumps(analysis), returncode=0,
-    )
+    mock_exec.return_value = _mock_proc(json.dumps(analysis))
 
     issues = [{"number": 1, "title": "Bug", "body": "Fix it"}]
-    result = agent.analyze_issues(issues)
+    result = await agent.analyze_issues(issues)
     assert len(result) == 1
     assert result[0]["difficulty"] == "easy"
-    mock_subprocess.run.assert_called_once()
+    mock_exec.assert_called_once()
 
 
-def test_analyze_issues_empty():
-    result = agent.analyze_issues([])
+@pytest.mark.asyncio
+async def test_analyze_issues_empty():
+    result = await agent.analyze_issues([])
     assert result == []
 
 
+@pytest.mark.asyncio
 @patch("minbot.agent.anthropic")
-def test_suggest_next_sdk(mock_anthropic):
-    client = MagicMock()
-    mock_anthropic.Anthropic.return_value = client
-    client.messages.create.return_value = _mock_message("Work on issue #1 first because it's urgent.")
+async def test_suggest_next_sdk(mock_anthropic):
+    _mock_client(mock_anthropic, _mock_message("Work on issue #1 first because it's urgent."))
 
     issues = [{"number": 1, "title": "Bug", "difficulty": "easy", "urgency": "high"}]
-    result = agent.suggest_next(issues, api_key="fake-key")
+    result = await agent.suggest_next(issues, api_key="fake-key")
     assert "#1" in result
 
 
-@patch("minbot.agent.subprocess")
-def test_suggest_next_cli(mock_subprocess):
-    mock_subprocess.run.return_value = MagicMock(
-        stdout="Work on issue #1 first.", returncode=0,
-    )
+@pytest.mark.asyncio
+@patch("asyncio.create_subprocess_exec")
+async def test_suggest_next_cli(mock_exec):
+    mock_exec.return_value = _mock_proc("Work on issue #1 first.")
 
     issues = [{"number": 1, "title": "Bug", "difficulty": "easy", "urgency": "high"}]
-    result = agent.suggest_next(issues)
+    result = await agent.suggest_next(issues)
     assert "#1" in result
 
 
-def test_suggest_next_empty():
-    result = agent.suggest_next([])
+@pytest.mark.asyncio
+async def test_suggest_next_empty():
+    result = await agent.suggest_next([])
     assert "No open issues" in result
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.asyncio.sleep", new_callable=AsyncMock)
+@patch("minbot.agent.anthropic")
+async def test_client_is_reused_and_overload_is_retried(mock_anthropic, mock_sleep):
+    client = _mock_client(
+        mock_anthropic,
+        _status_error(529),
+        _status_error(429, {"retry-after": "3"}),
+        _mock_message("first"),
+        _mock_message("second"),
+    )
+
+    assert await agent.suggest_next([{"number": 1}], api_key="k") == "first"
+    assert await agent.suggest_next([{"number": 1}], api_key="k") == "second"
+
+    mock_anthropic.AsyncAnthropic.assert_called_once()
+    assert client.messages.create.call_count == 4
+    delays = [c[0][0] for c in mock_sleep.call_args_list]
+    assert 0 <= delays[0] <= agent.BACKOFF_BASE
+    assert delays[1] == 3.0
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.asyncio.sleep", new_callable=AsyncMock)
+@patch("minbot.agent.anthropic")
+async def test_client_errors_are_not_retried(mock_anthropic, mock_sleep):
+    client = _mock_client(mock_anthropic, _status_error(400))
+
+    with pytest.raises(anthropic.APIStatusError):
+        await agent.suggest_next([{"number": 1}], api_key="k")
+    assert client.messages.create.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.CHUNK_MAX_ISSUES", 10)
+@patch("minbot.agent.anthropic")
+async def test_analyze_issues_chunks_large_backlogs(mock_anthropic):
+    issues = [{"number": n, "title": f"Issue {n}", "body": "x" * 50_000} for n in range(1, 26)]
+
+    def stream(**kwargs):
+        sent = json.loads(_sent_text(((), kwargs)).split("bodies may be truncated):\n")[1])
+        assert all(len(i["body"]) <= agent.BODY_CHARS + 10 for i in sent)
+        return _FakeStream(json.dumps([_row(i["number"], has_pr=False) for i in sent]))
+    client = MagicMock()
+    client.messages.stream = MagicMock(side_effect=stream)
+    mock_anthropic.AsyncAnthropic.return_value = client
+
+    result = await agent.analyze_issues(issues, api_key="k")
+
+    assert client.messages.stream.call_count == 3
+    assert [r["number"] for r in result] == list(range(1, 26))
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.CHUNK_MAX_ISSUES", 2)
+async def test_analyze_issues_keeps_chunks_that_succeeded():
+    issues = [{"number": n, "title": f"Issue {n}", "body": ""} for n in range(1, 5)]
+
+    async def chunk(items, prefix, api_key):
+        if items[0]["number"] == 1:
+            raise RuntimeError("rate limited")
+        return [_row(i["number"]) for i in items]
+
+    with patch("minbot.agent._analyze_chunk", side_effect=chunk):
+        result = await agent.analyze_issues(issues, api_key="k")
+    assert [r["number"] for r in result] == [3, 4]
+
+    async def failing(items, prefix, api_key):
+        raise RuntimeError("rate limited")
+
+    with patch("minbot.agent._analyze_chunk", side_effect=failing), pytest.raises(RuntimeError):
+        await agent.analyze_issues(issues, api_key="k")
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.anthropic")
+async def test_analyze_issues_salvages_rows_and_rerequests_missing(mock_anthropic):
+    issues = [{"number": n, "title": f"Issue {n}", "body": ""} for n in (1, 2, 3)]
+    client = _mock_stream_client(
+        mock_anthropic,
+        # Prose around the array, one invalid row, and a truncated tail
+        "Here you go:\n[" + json.dumps(_row(1)) + ", " + json.dumps(_row(2, urgency="whenever"))
+        + ', {"number": 3, "title": "Iss',
+        json.dumps([_row(2), _row(3)]),
+    )
+
+    result = await agent.analyze_issues(issues, api_key="k")
+
+    assert [r["number"] for r in result] == [1, 2, 3]
+    second_prompt = _sent_text(client.messages.stream.call_args_list[1])
+    assert '"number":1,' not in second_prompt
+    assert '"number":2,' in second_prompt and '"number":3,' in second_prompt
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.anthropic")
+async def test_analyze_issues_keeps_rows_when_stream_drops(mock_anthropic):
+    issues = [{"number": n, "title": f"Issue {n}", "body": ""} for n in (1, 2)]
+
+    class Dropped(_FakeStream):
+        @property
+        async def text_stream(self):
+            yield "[" + json.dumps(_row(1)) + ","
+            raise RuntimeError("connection reset")
+    client = MagicMock()
+    client.messages.stream = MagicMock(side_effect=[Dropped(""), _FakeStream(json.dumps([_row(2)]))])
+    mock_anthropic.AsyncAnthropic.return_value = client
+
+    result = await agent.analyze_issues(issues, api_key="k")
+    assert [r["number"] for r in result] == [1, 2]
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.anthropic")
+async def test_analyze_issues_raises_when_nothing_is_valid(mock_anthropic):
+    _mock_stream_client(mock_anthropic, "Sorry, I can't.", "No.", "Still no.")
+    with pytest.raises(ValueError, match="No valid triage rows"):
+        await agent.analyze_issues([{"number": 1, "title": "Bug", "body": ""}], api_key="k")
+
+
+@pytest.mark.asyncio
+@patch("asyncio.create_subprocess_exec")
+async def test_review_codebase_skips_invalid_suggestions(mock_exec):
+    suggestions = [{"title": "Fix race", "body": "Details"}, {"title": "", "body": "No title"}, {"body": "x"}]
+    mock_exec.return_value = _mock_proc("Findings:\n" + json.dumps(suggestions))
+
+    result = await agent.review_codebase("/repo")
+    assert result == [{"title": "Fix race", "body": "Details"}]
+
+
+@pytest.mark.asyncio
+@patch("asyncio.create_subprocess_exec")
+async def test_review_codebase_empty_array_is_a_clean_review(mock_exec):
+    mock_exec.return_value = _mock_proc("[]")
+    assert await agent.review_codebase("/repo") == []
+
+    mock_exec.return_value = _mock_proc("Nothing worth filing:\n```json\n[ ]\n```")
+    assert await agent.review_codebase("/repo") == []
+
+    for raw in ("I couldn't review this repo.", '[{"title": "", "body": "x"}]'):
+        mock_exec.return_value = _mock_proc(raw)
+        with pytest.raises(ValueError, match="No suggestions"):
+            await agent.review_codebase("/repo")
+
+
+@pytest.mark.asyncio
+@patch("asyncio.create_subprocess_exec")
+async def test_long_reviews_do_not_take_short_call_slots(mock_exec):
+    agent.configure(1, 120)
+    release = asyncio.Event()
+    review = _mock_proc("[]")
+
+    async def slow_review():
+        await release.wait()
+        return b"[]", b""
+
+    review.communicate = AsyncMock(side_effect=slow_review)
+    mock_exec.side_effect = [review, review, _mock_proc("Short answer")]
+    reviews = [asyncio.create_task(agent.review_codebase("/repo")) for _ in range(agent.MAX_CONCURRENT_REVIEWS)]
+    await asyncio.sleep(0)
+
+    # Both reviews are running, and the only short-call slot is still free
+    assert await asyncio.wait_for(agent._call_cli("Triage this"), 1) == "Short answer"
+    release.set()
+    assert await asyncio.gather(*reviews) == [[], []]
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.anthropic")
+async def test_suggest_next_sends_compact_ranked_rows(mock_anthropic):
+    client = _mock_client(mock_anthropic, _mock_message("Do #2."))
+    rows = [
+        {"repo": "o/r", "number": 1, "title": "Has PR", "urgency": "high", "difficulty": "easy", "has_pr": True},
+        {"repo": "o/r", "number": 2, "title": "Urgent", "urgency": "high", "difficulty": "easy", "has_pr": False},
+    ] + [
+        {"repo": "o/r", "number": n, "title": "Meh", "urgency": "low", "difficulty": "hard", "has_pr": False}
+        for n in range(3, 3 + agent.SUGGEST_TOP + 5)
+    ]
+
+    await agent.suggest_next(rows, api_key="k")
+
+    sent = json.loads(_sent_text(client.messages.create.call_args).split("Issues (JSON):\n")[1])
+    assert len(sent) == agent.SUGGEST_TOP
+    assert sent[0]["number"] == 2
+    assert all(r["number"] != 1 and "has_pr" not in r for r in sent)
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.anthropic")
+async def test_stable_prefix_is_marked_for_caching_and_usage_recorded(mock_anthropic):
+    prs = [{"number": n, "title": "x" * 400} for n in range(20)]
+    issues = [{"number": n, "title": f"Issue {n}", "body": "y" * 1000} for n in range(1, 80)]
+    order = []
+
+    def stream(**kwargs):
+        sent = json.loads(kwargs["messages"][0]["content"][1]["text"].split("truncated):\n")[1])
+        order.append(len(sent))
+        text = json.dumps([_row(i["number"]) for i in sent])
+        fake = _FakeStream(text)
+        usage = {"input_tokens": 10, "cache_read_input_tokens": 3000, "output_tokens": 50}
+        fake.get_final_message = AsyncMock(return_value=_mock_message(text, **usage))
+        return fake
+    client = MagicMock()
+    client.messages.stream = MagicMock(side_effect=stream)
+    mock_anthropic.AsyncAnthropic.return_value = client
+    agent._usage.clear()
+
+    await agent.analyze_issues(issues, api_key="k", prs=prs)
+
+    request = client.messages.stream.call_args_list[0][1]
+    assert request["system"][0]["cache_control"] == {"type": "ephemeral"}
+    prefix, variable = request["messages"][0]["content"]
+    assert prefix["cache_control"] == {"type": "ephemeral"} and "Open pull requests" in prefix["text"]
+    assert "cache_control" not in variable
+    # Every chunk shares the same cached prefix
+    assert len({c[1]["messages"][0]["content"][0]["text"] for c in client.messages.stream.call_args_list}) == 1
+    stats = agent.usage_stats()
+    assert stats["calls"] == len(order) > 1
+    assert stats["cache_read_input_tokens"] == 3000 * len(order)
+    assert stats["cache_read_ratio"] > 0.9
+
+
+@pytest.mark.asyncio
+@patch("minbot.agent.anthropic")
+async def test_configure_rebuilds_runtime_only_on_change(mock_anthropic):
+    _mock_client(mock_anthropic)
+    agent.configure(4, 120)
+    semaphore = agent._runtime()
+    client = agent._get_client("k")
+
+    # A reload with the same values keeps what in-flight calls hold
+    agent.configure(4, 120)
+    assert agent._runtime() is semaphore
+    assert agent._get_client("k") is client
+
+    agent.configure(2, 30)
+    assert agent._runtime() is not semaphore
+    client.with_options.assert_called_once_with(timeout=30)
+    assert agent._get_client("k") is client.with_options.return_value
+    mock_anthropic.AsyncAnthropic.assert_called_once()
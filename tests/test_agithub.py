@@ -0,0 +1,50 @@
+"""Tests for the async GitHub facade."""
+
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+import pytest
+from minbot import agithub
+
+
+@pytest.mark.asyncio
+@patch("minbot.agithub.github")
+async def test_list_issues_returns_sync_result(mock_gh):
+    mock_gh.list_issues.return_value = [{"number": 1, "title": "Bug"}]
+    result = await agithub.list_issues("owner/repo", include_prs=True)
+    assert result == [{"number": 1, "title": "Bug"}]
+    mock_gh.list_issues.assert_called_once_with("owner/repo", include_prs=True, limit=30)
+
+
+@pytest.mark.asyncio
+async def test_run_uses_worker_thread():
+    main = threading.get_ident()
+    ident = await agithub.run(threading.get_ident)
+    assert ident != main
+
+
+@pytest.mark.asyncio
+@patch("minbot.agithub.github")
+async def test_slow_call_does_not_block_loop(mock_gh):
+    mock_gh.list_issues.side_effect = lambda *a, **kw: time.sleep(0.3) or []
+    slow = [asyncio.create_task(agithub.list_issues(f"owner/repo{n}")) for n in range(10)]
+
+    start = time.monotonic()
+    await asyncio.sleep(0.01)
+    assert time.monotonic() - start < 0.05
+
+    await asyncio.gather(*slow)
+
+
+@pytest.mark.asyncio
+@patch("minbot.agithub.github")
+async def test_slow_git_work_does_not_hold_up_api_calls(mock_gh):
+    release = threading.Event()
+    clones = [asyncio.create_task(agithub.run_git(release.wait)) for _ in range(agithub.MAX_WORKERS)]
+    mock_gh.get_issue.return_value = {"number": 1}
+    try:
+        assert await asyncio.wait_for(agithub.get_issue("owner/repo", 1), 1) == {"number": 1}
+    finally:
+        release.set()
+        await asyncio.gather(*clones)
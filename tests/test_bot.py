@@ -3,18 +3,29 @@
 import asyncio
 from unittest.mock import patch, MagicMock, AsyncMock
 import pytest
-from minbot.bot import cmd_start, cmd_issues, cmd_prs, cmd_status, cmd_work, cmd_suggest, cmd_repos
+from minbot.bot import _live_output, on_page, cmd_start, cmd_issues, cmd_prs, cmd_status, cmd_work, cmd_suggest, cmd_repos, cmd_cancel
+from minbot.jobs import Job
 from minbot.config import Config
+from minbot import store
 
 
 def _make_update(chat_id=12345):
     update = MagicMock()
     update.effective_chat.id = chat_id
-    update.message = MagicMock()
-    update.message.reply_text = AsyncMock()
     return update
 
 
+@pytest.fixture(autouse=True)
+def outbox():
+    """Capture what handlers send instead of going through Telegram."""
+    with patch("minbot.bot.outbox", new_callable=AsyncMock) as mock:
+        yield mock
+
+
+def _sent(outbox) -> list[str]:
+    return [c[0][1] for c in outbox.send.call_args_list]
+
+
 def _make_context(args=None):
     ctx = MagicMock()
     ctx.args = args or []
@@ -42,13 +53,13 @@ def _fake_config_multi():
 @pytest.mark.asyncio
 @patch("minbot.bot.save_config")
 @patch("minbot.bot._get_config")
-async def test_cmd_start(mock_config, mock_save):
+async def test_cmd_start(mock_config, mock_save, outbox):
     mock_config.return_value = _fake_config()
     update = _make_update()
     update.effective_chat.id = 12345
     await cmd_start(update, _make_context())
-    update.message.reply_text.assert_called_once()
-    text = update.message.reply_text.call_args[0][0]
+    assert len(_sent(outbox)) == 1
+    text = _sent(outbox)[-1]
     assert "/issues" in text
     assert "/prs" in text
     assert "/work" in text
@@ -57,20 +68,20 @@ async def test_cmd_start(mock_config, mock_save):
 
 @pytest.mark.asyncio
 @patch("minbot.bot._get_config")
-async def test_cmd_repos(mock_config):
+async def test_cmd_repos(mock_config, outbox):
     mock_config.return_value = _fake_config_multi()
     update = _make_update()
     await cmd_repos(update, _make_context())
-    text = update.message.reply_text.call_args[0][0]
+    text = _sent(outbox)[-1]
     assert "owner/repo" in text
     assert "owner/repo2" in text
 
 
 @pytest.mark.asyncio
 @patch("minbot.bot._get_config")
-@patch("minbot.bot.agent")
-@patch("minbot.bot.github")
-async def test_cmd_issues(mock_gh, mock_agent, mock_config):
+@patch("minbot.triage.agent", new_callable=AsyncMock)
+@patch("minbot.triage.agithub", new_callable=AsyncMock)
+async def test_cmd_issues(mock_gh, mock_agent, mock_config, outbox):
     mock_config.return_value = _fake_config()
     mock_gh.list_issues.return_value = [
         {"number": 1, "title": "Bug", "body": "Fix", "is_pr": False, "labels": [], "createdAt": "2024-01-01T00:00:00"},
@@ -82,26 +93,82 @@ async def test_cmd_issues(mock_gh, mock_agent, mock_config):
     update = _make_update()
     await cmd_issues(update, _make_context())
 
-    assert update.message.reply_text.call_count == 2
-    text = update.message.reply_text.call_args[0][0]
+    # The raw list goes out before triage, then is edited in place
+    raw = outbox.post.call_args[0][1]
+    assert "[owner/repo]" in raw and "#1 Bug" in raw and "triaging" in raw
+    message, text, markup = outbox.edit.call_args[0]
+    assert message is outbox.post.return_value
     assert "#1" in text
     assert "easy" in text
     assert "[owner/repo]" in text
+    assert markup is None
+    outbox.send.assert_not_called()
+
+    # Fully cached: a single message, no edit
+    outbox.reset_mock()
+    await cmd_issues(update, _make_context())
+    outbox.post.assert_not_called()
+    assert "Difficulty: easy" in _sent(outbox)[0]
+
+
+@pytest.mark.asyncio
+@patch("minbot.bot._get_config")
+@patch("minbot.triage.agent", new_callable=AsyncMock)
+@patch("minbot.triage.agithub", new_callable=AsyncMock)
+async def test_cmd_issues_filters_and_pages(mock_gh, mock_agent, mock_config, outbox):
+    mock_config.return_value = _fake_config()
+    mock_gh.list_issues.return_value = [
+        {"number": n, "title": f"Issue {n}", "body": "", "is_pr": False, "assignees": [],
+         "labels": ["bug"] if n % 2 else [], "createdAt": "2026-10-01T00:00:00Z"}
+        for n in range(30, 0, -1)
+    ]
+    mock_agent.analyze_issues.side_effect = lambda batch, *a: [
+        {"number": i["number"], "title": i["title"], "difficulty": "easy", "urgency": "low", "summary": "s"}
+        for i in batch
+    ]
+
+    update = _make_update()
+    await cmd_issues(update, _make_context(args=["label:bug"]))
+
+    # Only the first page of matching issues is triaged
+    assert [i["number"] for i in mock_agent.analyze_issues.call_args[0][0]] == list(range(29, 9, -2))
+    text, markup = outbox.edit.call_args[0][1:]
+    assert text.startswith("[owner/repo] page 1/2") and "#30" not in text
+    button = markup.inline_keyboard[0][0]
+    assert button.text == "Next page (2/2)"
+
+    query = MagicMock(data=button.callback_data, message=MagicMock())
+    query.answer = AsyncMock()
+    update.callback_query = query
+    await on_page(update, _make_context())
+
+    assert [i["number"] for i in mock_agent.analyze_issues.call_args[0][0]] == [9, 7, 5, 3, 1]
+    message, text, markup = outbox.edit.call_args[0]
+    assert message is query.message
+    assert text.startswith("[owner/repo] page 2/2") and "#1 Issue 1" in text
+    assert markup is None
+
+    outbox.reset_mock()
+    await cmd_issues(update, _make_context(args=["urgency:high"]))
+    assert _sent(outbox) == ["No matching issues."]
+    await cmd_issues(update, _make_context(args=["urgency:urgent"]))
+    assert "urgency must be one of" in _sent(outbox)[-1]
 
 
 @pytest.mark.asyncio
 @patch("minbot.bot._get_config")
-@patch("minbot.bot.github")
-async def test_cmd_prs(mock_gh, mock_config):
+@patch("minbot.bot.agithub", new_callable=AsyncMock)
+async def test_cmd_prs(mock_gh, mock_config, outbox):
     mock_config.return_value = _fake_config()
     mock_gh.list_issues.return_value = [
-        {"number": 10, "title": "Fix bug", "labels": ["bugfix"], "createdAt": "2024-01-01T00:00:00", "is_pr": True},
+        {"number": 10, "title": "Fix bug", "labels": ["bugfix"], "createdAt": "2024-01-01T00:00:00Z",
+         "state": "open", "is_pr": True},
     ]
 
     update = _make_update()
     await cmd_prs(update, _make_context())
 
-    text = update.message.reply_text.call_args[0][0]
+    text = _sent(outbox)[-1]
     assert "#10" in text
     assert "Fix bug" in text
     assert "[owner/repo]" in text
@@ -109,92 +176,246 @@ async def test_cmd_prs(mock_gh, mock_config):
 
 @pytest.mark.asyncio
 @patch("minbot.bot._get_config")
-@patch("minbot.bot.github")
-async def test_cmd_prs_empty(mock_gh, mock_config):
+@patch("minbot.bot.agithub", new_callable=AsyncMock)
+async def test_cmd_prs_closed_searches_github(mock_gh, mock_config, outbox):
+    mock_config.return_value = _fake_config()
+    mock_gh.search_items.return_value = (
+        [{"number": 4, "title": "Old fix", "labels": [], "state": "closed", "is_pr": True}], 1,
+    )
+
+    update = _make_update()
+    await cmd_prs(update, _make_context(args=["state:closed", "assignee:alice"]))
+
+    mock_gh.search_items.assert_called_once_with(
+        "owner/repo", True, state="closed", labels=[], assignee="alice", created=None, page=1, per_page=10,
+    )
+    mock_gh.list_issues.assert_not_called()
+    assert _sent(outbox) == ["[owner/repo]\n#4 Old fix (closed)"]
+
+
+@pytest.mark.asyncio
+@patch("minbot.bot._get_config")
+@patch("minbot.bot.agithub", new_callable=AsyncMock)
+async def test_cmd_prs_empty(mock_gh, mock_config, outbox):
     mock_config.return_value = _fake_config()
     mock_gh.list_issues.return_value = []
 
     update = _make_update()
     await cmd_prs(update, _make_context())
 
-    text = update.message.reply_text.call_args[0][0]
+    text = _sent(outbox)[-1]
     assert "No open pull requests" in text
 
 
 @pytest.mark.asyncio
 @patch("minbot.bot._get_config")
-@patch("minbot.bot.agent")
-@patch("minbot.bot.github")
-async def test_cmd_issues_empty(mock_gh, mock_agent, mock_config):
+@patch("minbot.triage.agent", new_callable=AsyncMock)
+@patch("minbot.triage.agithub", new_callable=AsyncMock)
+async def test_cmd_issues_empty(mock_gh, mock_agent, mock_config, outbox):
     mock_config.return_value = _fake_config()
     mock_gh.list_issues.return_value = []
 
     update = _make_update()
     await cmd_issues(update, _make_context())
 
-    texts = [call[0][0] for call in update.message.reply_text.call_args_list]
+    texts = _sent(outbox)
     assert any("No open issues" in t for t in texts)
 
 
 @pytest.mark.asyncio
 @patch("minbot.bot._get_config")
-async def test_cmd_status_no_work(mock_config):
+async def test_cmd_status_no_work(mock_config, outbox):
     mock_config.return_value = _fake_config()
     update = _make_update()
     await cmd_status(update, _make_context())
-    text = update.message.reply_text.call_args[0][0]
+    text = _sent(outbox)[-1]
     assert "No work" in text
 
 
 @pytest.mark.asyncio
+@patch("minbot.bot.jobs")
 @patch("minbot.bot._get_config")
-async def test_cmd_work_no_args(mock_config):
+async def test_cmd_status_lists_jobs(mock_config, mock_jobs, outbox):
+    mock_config.return_value = _fake_config()
+    running = Job(id=1, repo="owner/repo", description="work owner/repo#1", run=None,
+                  state="running", started=0.0)
+    queued = Job(id=2, repo="owner/repo", description="pr owner/repo#7", run=None, priority=1)
+    mock_jobs.active.return_value = [running, queued]
+    # Finished before a restart: only the store remembers it
+    store.record_job(0, "owner/repo", "work owner/repo#3", "done", 100.0, 160.0)
+    update = _make_update()
+    await cmd_status(update, _make_context())
+    text = _sent(outbox)[-1]
+    assert "[1] running" in text
+    assert "[2] queued (priority 1): pr owner/repo#7" in text
+    assert "[0] done after 1m00s: work owner/repo#3" in text
+
+
+@pytest.mark.asyncio
+@patch("minbot.bot.jobs")
+@patch("minbot.bot._get_config")
+async def test_cmd_cancel(mock_config, mock_jobs, outbox):
+    mock_config.return_value = _fake_config()
+    mock_jobs.cancel.return_value = True
+    update = _make_update()
+    await cmd_cancel(update, _make_context(args=["3"]))
+    mock_jobs.cancel.assert_called_once_with(3)
+    assert "Cancelled job 3" in _sent(outbox)[-1]
+
+
+@pytest.mark.asyncio
+@patch("minbot.bot._get_config")
+async def test_cmd_work_no_args(mock_config, outbox):
     mock_config.return_value = _fake_config()
     update = _make_update()
     await cmd_work(update, _make_context(args=[]))
-    text = update.message.reply_text.call_args[0][0]
+    text = _sent(outbox)[-1]
     assert "Usage" in text
 
 
 @pytest.mark.asyncio
 @patch("minbot.bot._get_config")
-async def test_cmd_work_multi_repo_no_repo_arg(mock_config):
+async def test_cmd_work_multi_repo_no_repo_arg(mock_config, outbox):
     mock_config.return_value = _fake_config_multi()
     update = _make_update()
     await cmd_work(update, _make_context(args=["1"]))
-    text = update.message.reply_text.call_args[0][0]
+    text = _sent(outbox)[-1]
     assert "Multiple repos" in text or "Specify repo" in text
 
 
 @pytest.mark.asyncio
 @patch("minbot.bot._get_config")
-@patch("minbot.bot.agent")
-@patch("minbot.bot.github")
-async def test_cmd_suggest(mock_gh, mock_agent, mock_config):
+@patch("minbot.bot.agent", new_callable=AsyncMock)
+@patch("minbot.triage.agent", new_callable=AsyncMock)
+@patch("minbot.triage.agithub", new_callable=AsyncMock)
+async def test_cmd_suggest(mock_gh, mock_triage_agent, mock_agent, mock_config, outbox):
     mock_config.return_value = _fake_config()
     mock_gh.list_issues.return_value = [{"number": 1, "title": "Bug", "is_pr": False, "labels": [], "createdAt": "2024-01-01T00:00:00"}]
-    mock_agent.analyze_issues.return_value = [{"number": 1, "difficulty": "easy", "urgency": "high"}]
+    mock_triage_agent.analyze_issues.return_value = [{"number": 1, "difficulty": "easy", "urgency": "high"}]
     mock_agent.suggest_next.return_value = "Work on #1."
 
     update = _make_update()
     await cmd_suggest(update, _make_context())
 
-    text = update.message.reply_text.call_args[0][0]
+    text = _sent(outbox)[-1]
     assert "#1" in text
 
 
 @pytest.mark.asyncio
 @patch("minbot.bot._get_config")
-@patch("minbot.bot.agent")
-@patch("minbot.bot.github")
-async def test_cmd_suggest_empty(mock_gh, mock_agent, mock_config):
+@patch("minbot.bot.agent", new_callable=AsyncMock)
+@patch("minbot.triage.agent", new_callable=AsyncMock)
+@patch("minbot.triage.agithub", new_callable=AsyncMock)
+async def test_cmd_suggest_empty(mock_gh, mock_triage_agent, mock_agent, mock_config, outbox):
     mock_config.return_value = _fake_config()
     mock_gh.list_issues.return_value = []
 
     update = _make_update()
     await cmd_suggest(update, _make_context())
 
-    text = update.message.reply_text.call_args[0][0]
+    text = _sent(outbox)[-1]
     assert "No open issues" in text
-    mock_agent.analyze_issues.assert_not_called()
+    mock_triage_agent.analyze_issues.assert_not_called()
     mock_agent.suggest_next.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_live_output_edits_one_message(outbox):
+    message = MagicMock()
+    outbox.post.return_value = message
+
+    on_output = _live_output(12345, "Working on owner/repo#1...")
+    await on_output("step 1")
+    await on_output("step 1\nstep 2")
+    await on_output("step 1\nstep 2")
+
+    outbox.post.assert_called_once_with(12345, "Working on owner/repo#1...\n\nstep 1")
+    outbox.edit.assert_called_once_with(message, "Working on owner/repo#1...\n\nstep 1\nstep 2")
+
+
+@pytest.mark.asyncio
+@patch("minbot.bot.worker")
+@patch("minbot.bot._get_config")
+async def test_resume_jobs_requeues_interrupted_work(mock_config, mock_worker, outbox):
+    from minbot import bot, jobs
+
+    mock_config.return_value = _fake_config()
+    mock_worker.work_on_issue = AsyncMock(return_value="Done! PR created: url")
+    issue = {"number": 7, "title": "Bug", "body": ""}
+    entry_id = store.journal_open("work", "owner/repo", 7, 12345, {"issue": issue, "priority": 0})
+    store.journal_phase(entry_id, "claude_done", head="abc", summary="s", stats="", status="")
+    gone = store.journal_open("pr", "owner/repo", 8, 12345, {})
+    for _ in range(bot.MAX_RESUMES + 1):
+        store.journal_resumed(gone)
+
+    await bot._resume_jobs()
+    job = next(j for j in jobs.active() + jobs.recent() if j.journal_id == entry_id)
+    await job.task
+
+    args = mock_worker.work_on_issue.call_args[0]
+    assert args[1:3] == ("owner/repo", issue)
+    assert args[4]["phase"] == "claude_done" and args[4]["data"]["head"] == "abc"
+    assert {c[0][0] for c in outbox.send.call_args_list} == {12345}
+    texts = _sent(outbox)
+    assert any("Resuming work owner/repo#7" in t for t in texts)
+    assert any("Giving up on pr owner/repo#8" in t for t in texts)
+    assert "Done! PR created: url" in texts
+    # Finished jobs close their entries, so nothing is left to resume
+    assert store.journal_active() == []
+
+
+@pytest.mark.asyncio
+@patch("minbot.bot.worker")
+@patch("minbot.bot._get_config")
+async def test_failed_work_reports_and_records_failure(mock_config, mock_worker, outbox):
+    from minbot import bot
+
+    mock_config.return_value = _fake_config()
+    mock_worker.work_on_issue = AsyncMock(side_effect=RuntimeError("Claude Code exited with code 1"))
+    entry_id = store.journal_open("work", "owner/repo", 7, 12345, {})
+
+    job = bot._submit_work(12345, _fake_config(), "owner/repo", {"number": 7}, 0, entry_id)
+    await job.task
+
+    assert job.state == "failed"
+    assert store.job_history()[0]["state"] == "failed"
+    assert store.journal_active() == []
+    assert _sent(outbox) == ["Error: Claude Code exited with code 1"]
+
+
+def _command(app, update_id, text):
+    from telegram import Update
+    return Update.de_json({"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "chat": {"id": 12345, "type": "private"}, "text": text,
+        "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+    }}, app.bot)
+
+
+@pytest.mark.asyncio
+async def test_slow_issues_does_not_hold_up_status():
+    from telegram import User
+    from minbot import bot
+
+    release, answered = asyncio.Event(), asyncio.Event()
+
+    async def slow_issues(update, ctx):
+        await release.wait()
+
+    async def status(update, ctx):
+        answered.set()
+
+    with patch.object(bot, "cmd_issues", slow_issues), patch.object(bot, "cmd_status", status):
+        app = bot._build_app("123:fake-token")
+    app.bot._bot_user = User(id=1, first_name="minbot", is_bot=True, username="minbot_bot")
+    with patch.object(type(app.bot), "initialize", AsyncMock()), \
+         patch.object(type(app.bot), "shutdown", AsyncMock()):
+        await app.initialize()
+        await app.start()
+        try:
+            await app.update_queue.put(_command(app, 1, "/issues"))
+            await app.update_queue.put(_command(app, 2, "/status"))
+            await asyncio.wait_for(answered.wait(), 1)
+        finally:
+            release.set()
+            await app.stop()
+            await app.shutdown()
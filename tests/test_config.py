@@ -0,0 +1,81 @@
+"""Tests for the config service."""
+
+import json
+import os
+from unittest.mock import patch
+import pytest
+from pydantic import ValidationError
+from minbot import config
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"telegram_token": "t", "github_token": "g", "github_repos": ["o/a"]}))
+    with patch("minbot.config.CONFIG_PATH", path):
+        config._current = config._stamp = None
+        config._listeners.clear()
+        yield path
+    config._current = config._stamp = None
+    config._listeners.clear()
+
+
+def _rewrite(path, **changes):
+    data = json.loads(path.read_text())
+    data.update(changes)
+    path.write_text(json.dumps(data))
+    # Make sure the mtime moves even on coarse-grained filesystems
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_snapshot_is_loaded_once(config_path):
+    first = config.get_config()
+    with patch("minbot.config.load_config") as load:
+        assert config.get_config() is first
+        assert config.reload() is False
+        load.assert_not_called()
+    with pytest.raises(ValidationError):
+        first.github_repos = []
+
+
+def test_reload_swaps_snapshot_and_notifies(config_path):
+    old = config.get_config()
+    seen = []
+    config.on_change(lambda a, b: seen.append((a.github_repos, b.github_repos)))
+
+    _rewrite(config_path, github_repos=["o/a", "o/b"])
+    assert config.reload() is True
+
+    assert config.get_config().github_repos == ["o/a", "o/b"]
+    assert old.github_repos == ["o/a"]
+    assert seen == [(["o/a"], ["o/a", "o/b"])]
+
+
+def test_invalid_change_keeps_previous_snapshot(config_path):
+    old = config.get_config()
+    config_path.write_text("{not json")
+    os.utime(config_path, ns=(0, 1))
+    assert config.reload() is False
+    assert config.get_config() is old
+
+
+def test_save_is_atomic_and_updates_snapshot(config_path):
+    new = config.get_config().model_copy(update={"telegram_chat_id": 42})
+    with patch("minbot.config.os.replace", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            config.save_config(new, config_path)
+    assert json.loads(config_path.read_text()).get("telegram_chat_id") is None
+    assert [p.name for p in config_path.parent.iterdir()] == ["config.json"]
+
+    config.save_config(new, config_path)
+    assert json.loads(config_path.read_text())["telegram_chat_id"] == 42
+    assert config.get_config().telegram_chat_id == 42
+    assert config.reload() is False
+
+
+def test_webhook_port_requires_secret():
+    base = {"telegram_token": "t", "github_token": "g", "github_repos": ["o/a"]}
+    with pytest.raises(ValidationError):
+        config.Config(**base, webhook_port=8080)
+    assert config.Config(**base, webhook_port=8080, webhook_secret="s").webhook_port == 8080
@@ -0,0 +1,60 @@
+"""Tests for /issues and /prs filter parsing and matching."""
+
+from datetime import datetime, timedelta, timezone
+import pytest
+from minbot import filters
+
+NOW = datetime(2026, 10, 16, tzinfo=timezone.utc)
+
+
+def _item(labels=(), assignees=(), days_old=1):
+    created = (NOW - timedelta(days=days_old)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return {"labels": list(labels), "assignees": list(assignees), "createdAt": created}
+
+
+def test_parse_splits_filters_from_repo_args():
+    f, rest = filters.parse(["repo", "label:bug", "label:ui", "assignee:@alice", "difficulty:easy,medium",
+                             "age:<2w", "has_pr:no", "page:3"])
+    assert rest == ["repo"]
+    assert f.labels == ["bug", "ui"] and f.assignee == "alice"
+    assert f.difficulty == {"easy", "medium"} and f.has_pr is False
+    assert f.newer_than == timedelta(weeks=2) and f.page == 3
+    assert f.on_rows()
+    # Page isn't part of the listing's identity
+    assert "page:3" not in f.args and "label:bug" in f.args
+
+
+@pytest.mark.parametrize("arg", [
+    "colour:red", "urgency:extreme", "age:7d", "age:<7y", "page:0", "state:merged", "label:",
+])
+def test_parse_rejects_bad_filters(arg):
+    with pytest.raises(ValueError):
+        filters.parse([arg])
+
+
+def test_row_filters_need_open_state():
+    with pytest.raises(ValueError):
+        filters.parse(["state:closed", "urgency:high"])
+
+
+def test_match_items_and_rows():
+    f, _ = filters.parse(["label:bug", "assignee:Alice", "age:>3d"])
+    assert f.match(_item(["bug", "ui"], ["alice"], days_old=5), NOW)
+    assert not f.match(_item(["ui"], ["alice"], days_old=5), NOW)
+    assert not f.match(_item(["bug"], ["bob"], days_old=5), NOW)
+    assert not f.match(_item(["bug"], ["alice"], days_old=1), NOW)
+
+    unassigned, _ = filters.parse(["assignee:none"])
+    assert unassigned.match(_item(), NOW) and not unassigned.match(_item(assignees=["bob"]), NOW)
+
+    rows, _ = filters.parse(["urgency:high", "has_pr:yes"])
+    assert rows.match_row({"urgency": "high", "has_pr": True})
+    assert not rows.match_row({"urgency": "low", "has_pr": True})
+    assert not rows.match_row({"urgency": "high", "has_pr": False})
+
+
+def test_created_qualifier():
+    assert filters.parse(["age:<7d"])[0].created(NOW) == ">=2026-10-09"
+    assert filters.parse(["age:>30d"])[0].created(NOW) == "<=2026-09-16"
+    assert filters.parse(["age:<30d", "age:>7d"])[0].created(NOW) == "2026-09-16..2026-10-09"
+    assert filters.parse([])[0].created(NOW) is None
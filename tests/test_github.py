@@ -1,98 +1,365 @@
 """Tests for GitHub operations."""
 
+import json
+import re
 from unittest.mock import patch, MagicMock
+import pytest
 from minbot import github
 
 
-def _setup_client():
-    """Set up a mock GitHub client."""
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """A mock GitHub client with an empty issue mirror and HTTP cache."""
     mock_client = MagicMock()
-    github._client = mock_client
-    github._token = "fake-token"
+    monkeypatch.setattr(github, "_client", mock_client)
+    monkeypatch.setattr(github, "_token", "fake-token")
+    monkeypatch.setattr(github, "_MIRROR_DIR", tmp_path / "mirror")
+    monkeypatch.setattr(github, "_HTTP_CACHE_DIR", tmp_path / "http")
     return mock_client
 
 
-def _mock_issue(number=1, title="Bug", body="Details", labels=None, is_pr=False):
-    issue = MagicMock()
-    issue.number = number
-    issue.title = title
-    issue.body = body
-    issue.labels = [MagicMock(name=l) for l in (labels or [])]
-    issue.created_at = MagicMock(isoformat=MagicMock(return_value="2024-01-01T00:00:00"))
-    issue.pull_request = MagicMock() if is_pr else None
+def _mock_api(client, routes):
+    """Serve `routes` ({path: json}) through requester.requestJson.
+
+    Batched GraphQL cold syncs are answered from the same
+    /repos/<owner>/<name>/issues route.
+    """
+    def request(verb, url, headers=None):
+        return 200, {}, json.dumps(routes[url.split("?")[0]])
+
+    def graphql(query, variables):
+        data = {}
+        for alias, owner, name, kind in re.findall(
+            r'(a\d+): repository\(owner: "(.*?)", name: "(.*?)"\) \{ (\w+)\(', query,
+        ):
+            nodes = []
+            for i in routes[f"/repos/{owner}/{name}/issues"]:
+                if i["state"] != "open" or ("pull_request" in i) != (kind == "pullRequests"):
+                    continue
+                node = {
+                    "number": i["number"], "title": i["title"], "body": i["body"],
+                    "createdAt": i["created_at"], "updatedAt": i["updated_at"],
+                    "labels": {"nodes": i["labels"]},
+                    "assignees": {"nodes": i["assignees"]},
+                }
+                if kind == "pullRequests":
+                    node["headRefName"] = f"branch-{i['number']}"
+                else:
+                    node["closedByPullRequestsReferences"] = {"nodes": []}
+                nodes.append(node)
+            data[alias] = {kind: {"pageInfo": {"hasNextPage": False, "endCursor": None}, "nodes": nodes}}
+        return {}, {"data": data}
+
+    client.requester.requestJson.side_effect = request
+    client.requester.graphql_query.side_effect = graphql
+
+
+def _mock_issue(number=1, title="Bug", body="Details", labels=None, is_pr=False,
+                state="open", updated="2024-01-01T00:00:00Z", assignees=None):
+    issue = {
+        "number": number,
+        "title": title,
+        "body": body,
+        "labels": [{"name": l} for l in (labels or [])],
+        "assignees": [{"login": a} for a in (assignees or [])],
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": updated,
+        "state": state,
+    }
+    if is_pr:
+        issue["pull_request"] = {"url": "..."}
     return issue
 
 
-def test_list_issues():
-    client = _setup_client()
-    repo = client.get_repo.return_value
-    repo.get_issues.return_value = [
+def _requested_urls(client):
+    return [c[0][1] for c in client.requester.requestJson.call_args_list]
+
+
+def test_list_issues(client):
+    _mock_api(client, {"/repos/owner/repo/issues": [
         _mock_issue(1, "Bug fix", "Fix the bug"),
         _mock_issue(2, "Feature", "Add feature"),
-    ]
+    ]})
     result = github.list_issues("owner/repo")
     assert len(result) == 2
-    assert result[0]["number"] == 1
-    assert result[1]["title"] == "Feature"
-    client.get_repo.assert_called_once_with("owner/repo")
+    assert result[0]["number"] == 2
+    assert result[1]["title"] == "Bug fix"
 
 
-def test_list_issues_excludes_prs():
-    client = _setup_client()
-    repo = client.get_repo.return_value
-    repo.get_issues.return_value = [
+def test_list_issues_excludes_prs(client):
+    _mock_api(client, {"/repos/owner/repo/issues": [
         _mock_issue(1, "Bug fix", "Fix the bug"),
         _mock_issue(2, "PR: Update deps", "Update", is_pr=True),
         _mock_issue(3, "Feature", "Add feature"),
-    ]
+    ]})
     result = github.list_issues("owner/repo")
     assert len(result) == 2
-    assert result[0]["number"] == 1
-    assert result[1]["number"] == 3
+    assert result[0]["number"] == 3
+    assert result[1]["number"] == 1
 
 
-def test_list_issues_empty():
-    client = _setup_client()
-    repo = client.get_repo.return_value
-    repo.get_issues.return_value = []
+def test_list_issues_empty(client):
+    _mock_api(client, {"/repos/owner/repo/issues": []})
     result = github.list_issues("owner/repo")
     assert result == []
 
 
-def test_list_issues_include_prs():
-    client = _setup_client()
-    repo = client.get_repo.return_value
-    repo.get_issues.return_value = [
+def test_list_issues_include_prs(client):
+    _mock_api(client, {"/repos/owner/repo/issues": [
         _mock_issue(1, "Bug fix", "Fix the bug"),
         _mock_issue(2, "PR: Update deps", "Update", is_pr=True),
-    ]
+    ]})
     result = github.list_issues("owner/repo", include_prs=True)
     assert len(result) == 2
-    assert result[0]["is_pr"] is False
-    assert result[1]["is_pr"] is True
+    assert result[0]["is_pr"] is True
+    assert result[1]["is_pr"] is False
 
 
-def test_get_issue():
-    client = _setup_client()
-    repo = client.get_repo.return_value
-    repo.get_issue.return_value = _mock_issue(1, "Bug", "Details")
+def test_list_issues_incremental_sync(client):
+    routes = {"/repos/owner/repo/issues": [
+        _mock_issue(1, "Old", updated="2024-01-01T00:00:00Z"),
+        _mock_issue(2, "Closing soon", updated="2024-01-02T00:00:00Z"),
+    ]}
+    _mock_api(client, routes)
+    github.list_issues("owner/repo")
+    client.requester.graphql_query.assert_called_once()
+    assert _requested_urls(client) == []
+
+    routes["/repos/owner/repo/issues"] = [
+        _mock_issue(2, "Closing soon", state="closed", updated="2024-01-03T00:00:00Z"),
+        _mock_issue(3, "New", updated="2024-01-04T00:00:00Z"),
+    ]
+    result = github.list_issues("owner/repo")
+    url = _requested_urls(client)[-1]
+    assert "state=all" in url
+    assert "since=2024-01-02T00%3A00%3A00Z" in url
+    assert [i["number"] for i in result] == [3, 1]
+    client.requester.graphql_query.assert_called_once()
+
+
+def test_list_issues_no_limit(client):
+    _mock_api(client, {"/repos/owner/repo/issues": [_mock_issue(n) for n in range(1, 101)]})
+    assert len(github.list_issues("owner/repo")) == 30
+    assert len(github.list_issues("owner/repo", limit=None)) == 100
+
+
+def test_list_prs_branch_from_cold_sync(client):
+    _mock_api(client, {"/repos/owner/repo/issues": [_mock_issue(5, "PR", is_pr=True)]})
+    assert github.list_prs("owner/repo")[0]["branch"] == "branch-5"
+    assert not any("/pulls/" in u for u in _requested_urls(client))
+
+
+def test_list_prs_fetches_branch_once_for_new_pr(client):
+    routes = {
+        "/repos/owner/repo/issues": [],
+        "/repos/owner/repo/pulls/6": {
+            "number": 6, "title": "PR", "body": "", "head": {"ref": "fix-6"}, "base": {"ref": "main"},
+        },
+    }
+    _mock_api(client, routes)
+    github.list_prs("owner/repo")
+    routes["/repos/owner/repo/issues"] = [_mock_issue(6, "PR", is_pr=True)]
+    assert github.list_prs("owner/repo")[0]["branch"] == "fix-6"
+    assert github.list_prs("owner/repo")[0]["branch"] == "fix-6"
+    assert sum("/pulls/6" in u for u in _requested_urls(client)) == 1
+
+
+def test_fetch_open_items_batches_repos_and_pages(client):
+    page = {"pageInfo": {"hasNextPage": False, "endCursor": None}, "nodes": []}
+    issue = {
+        "number": 1, "title": "Bug", "body": None, "createdAt": "c", "updatedAt": "u",
+        "labels": {"nodes": [{"name": "bug"}]},
+        "assignees": {"nodes": [{"login": "alice"}]},
+        "closedByPullRequestsReferences": {"nodes": [{"number": 9}]},
+    }
+    responses = [
+        {"data": {
+            "a0": {"issues": {"pageInfo": {"hasNextPage": True, "endCursor": "c1"}, "nodes": [issue]}},
+            "a1": {"pullRequests": page},
+            "a2": {"issues": page},
+            "a3": {"pullRequests": page},
+        }},
+        {"data": {"a0": {"issues": {**page, "nodes": [{**issue, "number": 2}]}}}},
+    ]
+    client.requester.graphql_query.side_effect = [({}, r) for r in responses]
+
+    items = github.fetch_open_items(["o/a", "o/b"])
+
+    assert client.requester.graphql_query.call_count == 2
+    second_query = client.requester.graphql_query.call_args_list[1][0][0]
+    assert 'after: "c1"' in second_query
+    assert [i["number"] for i in items["o/a"]] == [1, 2]
+    assert items["o/a"][0]["linked_prs"] == [9]
+    assert items["o/a"][0]["labels"] == ["bug"]
+    assert items["o/a"][0]["assignees"] == ["alice"]
+    assert items["o/b"] == []
+
+
+def test_mirror_from_older_version_is_listed_again(client):
+    _mock_api(client, {"/repos/owner/repo/issues": [_mock_issue(1, assignees=["alice"])]})
+    github._mirror_path("owner/repo").parent.mkdir(parents=True, exist_ok=True)
+    github._mirror_path("owner/repo").write_text(json.dumps({"since": "2024-01-01T00:00:00Z", "items": {}}))
+    assert github.list_issues("owner/repo")[0]["assignees"] == ["alice"]
+    client.requester.graphql_query.assert_called_once()
+
+
+def test_search_items_pushes_filters_into_query(client):
+    _mock_api(client, {"/search/issues": {"total_count": 23, "items": [
+        _mock_issue(7, "Old bug", labels=["bug"], state="closed", assignees=["alice"]),
+    ]}})
+    items, total = github.search_items(
+        "owner/repo", False, state="closed", labels=["bug"], assignee="alice", created="<=2026-09-01", page=3,
+    )
+    assert total == 23
+    assert items[0]["number"] == 7 and items[0]["state"] == "closed"
+    url = _requested_urls(client)[-1]
+    assert "q=repo%3Aowner%2Frepo+is%3Aissue+is%3Aclosed+label%3A%22bug%22+assignee%3Aalice+created%3A%3C%3D2026-09-01" in url
+    assert "page=3" in url and "per_page=10" in url
+
+
+def _pr_context(more_comments=False):
+    more = {"hasNextPage": more_comments}
+    done = {"hasNextPage": False}
+    return ({}, {"data": {"repository": {"pullRequest": {
+        "number": 7, "title": "Fix", "body": None, "headRefName": "fix", "baseRefName": "main",
+        "reviewThreads": {"pageInfo": done, "nodes": [{"path": "a.py", "line": 3, "comments": {
+            "pageInfo": done, "nodes": [{"body": "nit", "author": {"login": "alice"}}],
+        }}]},
+        "comments": {"pageInfo": more, "nodes": [{"body": "LGTM", "author": None}]},
+    }}}})
+
+
+def test_get_pr_context_single_query(client):
+    client.requester.graphql_query.return_value = _pr_context()
+
+    pr, comments = github.get_pr_context("owner/repo", 7)
+
+    assert pr == {"number": 7, "title": "Fix", "body": "", "branch": "fix", "base": "main"}
+    assert comments == [
+        {"type": "review", "path": "a.py", "line": 3, "body": "nit", "user": "alice"},
+        {"type": "issue", "body": "LGTM", "user": "ghost"},
+    ]
+    client.requester.graphql_query.assert_called_once()
+    client.requester.requestJson.assert_not_called()
+
+
+def test_get_pr_context_falls_back_to_rest_for_long_prs(client):
+    _mock_api(client, {
+        "/repos/owner/repo/pulls/7/comments": [
+            {"path": "a.py", "position": 9, "line": 3, "original_line": 2, "body": "nit", "user": {"login": "alice"}},
+        ],
+        "/repos/owner/repo/issues/7/comments": [
+            {"body": f"comment {n}", "user": {"login": "bob"}} for n in range(150)
+        ],
+    })
+    client.requester.graphql_query.side_effect = lambda *a: _pr_context(more_comments=True)
+
+    pr, comments = github.get_pr_context("owner/repo", 7)
+
+    assert pr["branch"] == "fix"
+    assert len(comments) == 151
+    assert comments[0] == {"type": "review", "path": "a.py", "line": 3, "body": "nit", "user": "alice"}
+
+
+def test_get_issue(client):
+    _mock_api(client, {"/repos/owner/repo/issues/1": _mock_issue(1, "Bug", "Details")})
     result = github.get_issue("owner/repo", 1)
     assert result["number"] == 1
     assert result["title"] == "Bug"
-    repo.get_issue.assert_called_once_with(1)
 
 
-@patch("subprocess.run")
-def test_create_branch(mock_run):
-    mock_run.return_value = MagicMock(returncode=0)
-    github.create_branch("/tmp/repo", "feature-branch")
-    args = mock_run.call_args[0][0]
-    assert args == ["git", "checkout", "-b", "feature-branch"]
-    assert mock_run.call_args[1]["cwd"] == "/tmp/repo"
+def test_get_pr_comments(client):
+    _mock_api(client, {
+        "/repos/owner/repo/pulls/7/comments": [
+            {"path": "a.py", "position": 9, "line": 3, "original_line": 2, "body": "nit", "user": {"login": "alice"}},
+            # Outdated: the line no longer exists in the diff
+            {"path": "b.py", "position": None, "line": None, "original_line": 5, "body": "typo",
+             "user": {"login": "alice"}},
+        ],
+        "/repos/owner/repo/issues/7/comments": [
+            {"body": "LGTM", "user": {"login": "bob"}},
+        ],
+    })
+    comments = github.get_pr_comments("owner/repo", 7)
+    assert comments == [
+        {"type": "review", "path": "a.py", "line": 3, "body": "nit", "user": "alice"},
+        {"type": "review", "path": "b.py", "line": 5, "body": "typo", "user": "alice"},
+        {"type": "issue", "body": "LGTM", "user": "bob"},
+    ]
+
+
+def test_get_follows_pagination(client):
+    pages = {
+        "/repos/owner/repo/issues/7/comments": (
+            {"link": '<https://api.github.com/repositories/1/issues/7/comments?page=2>; rel="next"'},
+            [{"body": "one", "user": {"login": "a"}}],
+        ),
+        "https://api.github.com/repositories/1/issues/7/comments": (
+            {}, [{"body": "two", "user": {"login": "b"}}],
+        ),
+    }
+    client.requester.requestJson.side_effect = lambda verb, url, headers=None: (
+        200, pages[url.split("?")[0]][0], json.dumps(pages[url.split("?")[0]][1])
+    )
+    assert [c["body"] for c in github._get_all("/repos/owner/repo/issues/7/comments")] == ["one", "two"]
+
+
+def test_get_serves_304_from_cache(client):
+    responses = [
+        (200, {"etag": '"abc"', "x-ratelimit-remaining": "4999", "x-ratelimit-limit": "5000"},
+         json.dumps(_mock_issue(1, "Bug"))),
+        (304, {"x-ratelimit-remaining": "4999", "x-ratelimit-limit": "5000"}, ""),
+    ]
+    client.requester.requestJson.side_effect = responses
+    before = github.http_stats()
+
+    assert github.get_issue("owner/repo", 1)["title"] == "Bug"
+    assert github.get_issue("owner/repo", 1)["title"] == "Bug"
+
+    second_headers = client.requester.requestJson.call_args_list[1][1]["headers"]
+    assert second_headers["If-None-Match"] == '"abc"'
+    stats = github.http_stats()
+    assert stats["requests"] - before["requests"] == 2
+    assert stats["not_modified"] - before["not_modified"] == 1
+    assert stats["rate_remaining"] == 4999
+
+
+@patch("minbot.github.time.sleep")
+def test_throttle_makes_background_calls_wait(mock_sleep):
+    github.set_rate(3600)  # one token a second
+    try:
+        with patch.dict(github._bucket, {"tokens": 1.0, "updated": github.time.monotonic()}):
+            # Interactive calls never wait, even with the bucket empty
+            github._throttle()
+            github._throttle()
+            mock_sleep.assert_not_called()
+
+            token = github.background.set(True)
+            try:
+                github._throttle()
+                github._throttle()
+            finally:
+                github.background.reset(token)
+            waits = [c[0][0] for c in mock_sleep.call_args_list]
+            assert len(waits) == 2
+            assert 0.9 < waits[0] < 1.1 and 1.9 < waits[1] < 2.1
+    finally:
+        github.set_rate(None)
+
 
+@patch("minbot.github._throttle")
+@patch("minbot.github.Github")
+def test_every_request_takes_a_token(mock_github, mock_throttle, client):
+    request = mock_github.return_value.requester.requestJson
+    github.set_token("fake-token")
+    # PyGithub's own calls (e.g. the pages of a listing) each take a token
+    for _ in range(3):
+        github._client.requester.requestJson("GET", "/repos/o/r/pulls?page=2")
+    assert mock_throttle.call_count == 3
+    assert request.call_count == 3
 
-def test_create_pr():
-    client = _setup_client()
+
+def test_create_pr(client):
     repo = client.get_repo.return_value
     repo.default_branch = "main"
     pr = MagicMock()
@@ -105,19 +372,82 @@ def test_create_pr():
     )
 
 
+def _fake_git():
+    def run(args, **kwargs):
+        if args[1] == "ls-remote":
+            return MagicMock(stdout="ref: refs/heads/main\tHEAD\nabc\tHEAD\n")
+        if args[1] == "symbolic-ref" and len(args) == 4:
+            return MagicMock(stdout="main\n")
+        return MagicMock(stdout="")
+    return run
+
+
 @patch("subprocess.run")
 @patch("os.path.exists", return_value=True)
-def test_clone_repo_pulls_if_exists(mock_exists, mock_run):
-    mock_run.return_value = MagicMock(returncode=0)
-    github.clone_repo("owner/repo", "/tmp/repo")
+def test_clone_repo_fetches_if_exists(mock_exists, mock_run):
+    mock_run.side_effect = _fake_git()
+    stats = github.clone_repo("owner/repo", "/tmp/repo.git")
     args = mock_run.call_args[0][0]
-    assert args == ["git", "pull"]
+    assert args == ["git", "fetch", "origin", "--prune"]
+    assert stats["op"] == "fetch"
+    assert github.clone_stats()["owner/repo"] == stats
+
+
+@patch("subprocess.run")
+def test_clone_repo_inits_bare_if_new(mock_run, tmp_path):
+    mock_run.side_effect = _fake_git()
+    path = str(tmp_path / "repo.git")
+    stats = github.clone_repo("owner/repo", path, filter_spec="blob:none")
+    calls = [c[0][0][1:] for c in mock_run.call_args_list]
+    assert calls[0] == ["init", "--bare"]
+    assert ["config", "remote.origin.partialclonefilter", "blob:none"] in calls
+    assert ["symbolic-ref", "HEAD", "refs/heads/main"] in calls
+    assert calls[-1] == ["fetch", "origin", "--prune", "--filter=blob:none"]
+    assert stats["op"] == "clone"
 
 
 @patch("subprocess.run")
-@patch("os.path.exists", return_value=False)
-def test_clone_repo_clones_if_new(mock_exists, mock_run):
-    mock_run.return_value = MagicMock(returncode=0)
-    github.clone_repo("owner/repo", "/tmp/repo")
+@patch("os.path.exists", return_value=True)
+def test_clone_repo_limits_fetch_to_wanted_branches(mock_exists, mock_run):
+    mock_run.side_effect = _fake_git()
+    github.clone_repo("owner/repo", "/tmp/repo.git", branches=["feature"], depth=1)
     args = mock_run.call_args[0][0]
-    assert "clone" in args
+    assert args == [
+        "git", "fetch", "origin", "--prune", "--depth", "1",
+        "+refs/heads/main:refs/remotes/origin/main",
+        "+refs/heads/feature:refs/remotes/origin/feature",
+    ]
+
+
+@patch("subprocess.run")
+def test_clone_repo_writes_alternates_for_reference(mock_run, tmp_path):
+    ref = tmp_path / "upstream.git"
+    (ref / "objects").mkdir(parents=True)
+    path = tmp_path / "fork.git"
+
+    def init(args, **kwargs):
+        if args[1] == "init":
+            (path / "objects" / "info").mkdir(parents=True)
+        return _fake_git()(args, **kwargs)
+    mock_run.side_effect = init
+
+    github.clone_repo("owner/fork", str(path), reference=str(ref))
+    alternates = (path / "objects" / "info" / "alternates").read_text()
+    assert alternates.strip() == str(ref / "objects")
+
+
+@patch("subprocess.run")
+def test_clone_repo_removes_half_made_clone(mock_run, tmp_path):
+    mock_run.side_effect = RuntimeError("network down")
+    path = tmp_path / "repo.git"
+    with pytest.raises(RuntimeError):
+        github.clone_repo("owner/repo", str(path))
+    assert not path.exists()
+
+
+@patch("subprocess.run")
+def test_push_branch_set_upstream(mock_run):
+    github.push_branch("/tmp/repo", "issue-1", set_upstream=True)
+    args = mock_run.call_args[0][0]
+    assert args == ["git", "push", "-u", "origin", "issue-1"]
+    assert mock_run.call_args[1]["cwd"] == "/tmp/repo"
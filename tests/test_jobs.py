@@ -0,0 +1,102 @@
+"""Tests for the /work and /pr job queue."""
+
+import asyncio
+import pytest
+import pytest_asyncio
+from minbot import jobs, store
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def _reset_jobs():
+    jobs._jobs.clear()
+    jobs.configure(2, 1)
+    yield
+    tasks = [j.task for j in jobs._jobs.values() if j.task and not j.task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    jobs._jobs.clear()
+
+
+def _blocking_job(started: list, name: str, release: asyncio.Event):
+    async def run():
+        started.append(name)
+        await release.wait()
+    return run
+
+
+@pytest.mark.asyncio
+async def test_respects_global_and_per_repo_limits():
+    started, release = [], asyncio.Event()
+    a1 = jobs.submit("o/a", "a1", _blocking_job(started, "a1", release))
+    a2 = jobs.submit("o/a", "a2", _blocking_job(started, "a2", release))
+    b1 = jobs.submit("o/b", "b1", _blocking_job(started, "b1", release))
+    c1 = jobs.submit("o/c", "c1", _blocking_job(started, "c1", release))
+    await asyncio.sleep(0)
+
+    assert started == ["a1", "b1"]
+    assert [j.state for j in (a1, a2, b1, c1)] == ["running", "queued", "running", "queued"]
+
+    release.set()
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert sorted(started) == ["a1", "a2", "b1", "c1"]
+
+
+@pytest.mark.asyncio
+async def test_priority_then_fifo():
+    jobs.configure(1, 1)
+    started, release = [], asyncio.Event()
+    jobs.submit("o/a", "first", _blocking_job(started, "first", release))
+    jobs.submit("o/b", "low", _blocking_job(started, "low", release))
+    jobs.submit("o/c", "high", _blocking_job(started, "high", release), priority=5)
+    jobs.submit("o/d", "low2", _blocking_job(started, "low2", release))
+
+    assert [j.description for j in jobs.active()] == ["first", "high", "low", "low2"]
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_and_running():
+    jobs.configure(1, 1)
+    started, release = [], asyncio.Event()
+    running = jobs.submit("o/a", "running", _blocking_job(started, "running", release))
+    queued = jobs.submit("o/b", "queued", _blocking_job(started, "queued", release))
+    await asyncio.sleep(0)
+
+    assert jobs.cancel(queued.id)
+    assert queued.state == "cancelled"
+    assert jobs.cancel(running.id)
+    await asyncio.sleep(0)
+    assert running.state == "cancelled"
+    assert not jobs.cancel(running.id)
+    assert started == ["running"]
+
+
+@pytest.mark.asyncio
+async def test_failed_job_frees_slot():
+    jobs.configure(1, 1)
+
+    async def boom():
+        raise RuntimeError("boom")
+
+    failed = jobs.submit("o/a", "boom", boom)
+    started, release = [], asyncio.Event()
+    jobs.submit("o/b", "next", _blocking_job(started, "next", release))
+    for _ in range(3):
+        await asyncio.sleep(0)
+    assert failed.state == "failed"
+    assert started == ["next"]
+    assert [(h["job_id"], h["state"]) for h in store.job_history()] == [(failed.id, "failed")]
+
+
+@pytest.mark.asyncio
+async def test_current_is_the_running_job():
+    seen = []
+
+    async def run():
+        seen.append(jobs.current())
+
+    job = jobs.submit("o/a", "a", run)
+    await job.task
+    assert seen == [job]
+    assert jobs.current() is None
@@ -0,0 +1,163 @@
+"""Tests for the outbound message queue."""
+
+import asyncio
+import itertools
+from unittest.mock import patch, MagicMock, AsyncMock
+import pytest
+from telegram.error import RetryAfter, TimedOut
+from minbot import outbox
+
+
+@pytest.fixture
+def bot():
+    """Fake Bot, with rate limits shrunk so tests run fast."""
+    fake = MagicMock()
+    ids = itertools.count(1)
+    fake.send_message = AsyncMock(
+        side_effect=lambda chat_id, text, **kw: MagicMock(chat_id=chat_id, message_id=next(ids), text=text))
+    with patch.object(outbox, "_bot", fake), \
+         patch.object(outbox, "CHAT_INTERVAL", 0.05), \
+         patch.object(outbox, "GLOBAL_INTERVAL", 0), \
+         patch.object(outbox, "_next_send", {}):
+        yield fake
+
+
+def _texts(bot) -> list[str]:
+    return [c.kwargs["text"] for c in bot.send_message.call_args_list]
+
+
+def test_split_prefers_paragraphs_then_lines():
+    text = "a" * 30 + "\n\n" + "b" * 30 + "\n" + "c" * 30
+    assert outbox.split(text, 70) == ["a" * 30, "b" * 30 + "\n" + "c" * 30]
+    assert outbox.split("b" * 30 + "\n" + "c" * 30, 40) == ["b" * 30, "c" * 30]
+    assert outbox.split("x" * 25, 10) == ["x" * 10, "x" * 10, "x" * 5]
+    assert outbox.split("short") == ["short"]
+
+
+@pytest.mark.asyncio
+async def test_burst_is_coalesced_and_large_output_split(bot):
+    for n in range(5):
+        await outbox.send(1, f"repo {n}: new issue", linger=0.01)
+    await outbox.flush()
+    assert _texts(bot) == ["\n\n".join(f"repo {n}: new issue" for n in range(5))]
+
+    bot.send_message.reset_mock()
+    sections = [f"[owner/repo{n}]\n" + "#1 Some issue\n  Difficulty: easy\n\n" * 40 for n in range(6)]
+    for section in sections:
+        await outbox.send(1, section.rstrip())
+    await outbox.flush()
+    texts = _texts(bot)
+    assert all(len(t) <= outbox.MAX_LENGTH for t in texts)
+    assert len(texts) < len(sections)
+    assert "".join(texts).count("[owner/repo") == 6
+
+
+@pytest.mark.asyncio
+async def test_retry_after_waits_and_resends(bot):
+    sent = MagicMock()
+    bot.send_message.side_effect = [RetryAfter(0), sent]
+    assert (await outbox.post(1, "hello")).messages == [sent]
+    assert bot.send_message.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_timed_out_send_is_not_retried(bot):
+    bot.send_message.side_effect = TimedOut()
+    with pytest.raises(TimedOut):
+        await outbox.post(1, "hello")
+    assert bot.send_message.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_chats_are_rate_limited_and_ordered(bot):
+    loop = asyncio.get_running_loop()
+    times = []
+    bot.send_message.side_effect = lambda chat_id, text, **kw: times.append(loop.time())
+    await outbox.post(1, "one")
+    await outbox.post(1, "two")
+    assert times[1] - times[0] >= 0.04
+    assert _texts(bot) == ["one", "two"]
+
+
+@pytest.mark.asyncio
+async def test_only_latest_pending_edit_is_sent(bot):
+    handle = await outbox.post(1, "Working...")
+    message = handle.messages[0]
+    message.edit_text = AsyncMock()
+    for n in range(4):
+        await outbox.edit(handle, f"Working... step {n}")
+    await outbox.flush()
+    message.edit_text.assert_called_once_with("Working... step 3", reply_markup=None)
+
+
+@pytest.mark.asyncio
+async def test_edit_that_outgrows_a_message_continues_below(bot):
+    handle = await outbox.post(1, "[owner/repo]\n#1 Bug")
+    first = handle.messages[0]
+    first.edit_text = AsyncMock()
+    await outbox.edit(handle, "a" * 4000 + "\n\n" + "b" * 200)
+    await outbox.flush()
+    first.edit_text.assert_called_once_with("a" * 4000, reply_markup=None)
+    assert _texts(bot)[-1] == "b" * 200
+
+    # The continuation joins the post: the next edit rewrites both in place
+    second = handle.messages[1]
+    second.edit_text = AsyncMock()
+    bot.send_message.reset_mock()
+    await outbox.edit(handle, "a" * 4000 + "\n\n" + "c" * 200)
+    await outbox.flush()
+    second.edit_text.assert_called_once_with("c" * 200, reply_markup=None)
+    bot.send_message.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_edit_of_multi_chunk_post_edits_every_chunk(bot):
+    handle = await outbox.post(1, "a" * 4000 + "\n\n" + "b" * 200 + "\n\n" + "c" * 4000)
+    assert len(handle.messages) == 3
+    bot.send_message.reset_mock()
+    for message in handle.messages:
+        message.edit_text = AsyncMock()
+        message.delete = AsyncMock()
+    first, second, third = handle.messages
+    await outbox.edit(handle, "x" * 4000 + "\n\n" + "y" * 200, markup="keyboard")
+    await outbox.flush()
+    first.edit_text.assert_called_once_with("x" * 4000, reply_markup=None)
+    second.edit_text.assert_called_once_with("y" * 200, reply_markup="keyboard")
+    third.delete.assert_called_once()
+    bot.send_message.assert_not_called()
+    assert handle.messages == [first, second]
+
+
+@pytest.mark.asyncio
+async def test_shrinking_edit_drops_unsent_overflow(bot):
+    handle = await outbox.post(1, "short")
+    handle.messages[0].edit_text = AsyncMock()
+    bot.send_message.reset_mock()
+    await outbox.edit(handle, "a" * 4000 + "\n\n" + "b" * 4000 + "\n\n" + "c" * 200)
+    await outbox.edit(handle, "done")
+    await outbox.flush()
+    handle.messages[0].edit_text.assert_called_once_with("done", reply_markup=None)
+    bot.send_message.assert_not_called()
+    assert not handle.pending and len(handle.messages) == 1
+
+
+@pytest.mark.asyncio
+async def test_overflow_already_on_its_way_is_deleted_after_a_shrink(bot):
+    handle = await outbox.post(1, "short")
+    handle.messages[0].edit_text = AsyncMock()
+    sending, release = asyncio.Event(), asyncio.Event()
+    overflow = MagicMock(chat_id=1, message_id=99, delete=AsyncMock())
+
+    async def slow_send(chat_id, text, **kw):
+        sending.set()
+        await release.wait()
+        return overflow
+    bot.send_message.side_effect = slow_send
+
+    await outbox.edit(handle, "a" * 4000 + "\n\n" + "b" * 200)
+    await sending.wait()
+    await outbox.edit(handle, "done")
+    release.set()
+    await outbox.flush()
+    overflow.delete.assert_called_once()
+    assert len(handle.messages) == 1 and not handle.pending
@@ -0,0 +1,25 @@
+"""Tests for LLM response extraction."""
+
+import json
+from minbot.responses import JSONStream, TriageRow, extract
+
+
+def test_stream_yields_objects_across_chunk_boundaries():
+    text = '```json\n[{"a": "x}{", "n": {"b": 1}}, {"c": "\\"q\\""}, {"d": 1'
+    stream = JSONStream()
+    found = []
+    for i in range(0, len(text), 3):
+        found.extend(stream.feed(text[i:i + 3]))
+    assert found == [{"a": "x}{", "n": {"b": 1}}, {"c": '"q"'}]
+
+
+def test_extract_validates_and_normalises_rows():
+    rows = [
+        {"number": "7", "title": "Bug", "difficulty": " Easy", "urgency": "HIGH", "summary": "s"},
+        {"number": 8, "difficulty": "trivial", "urgency": "low"},
+        {"title": "no number", "difficulty": "easy", "urgency": "low"},
+    ]
+    result = extract("Sure!\n" + json.dumps(rows) + "\nHope that helps.", TriageRow)
+    assert [r.model_dump() for r in result] == [
+        {"number": 7, "title": "Bug", "difficulty": "easy", "urgency": "high", "summary": "s", "has_pr": False},
+    ]
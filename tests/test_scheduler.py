@@ -3,7 +3,8 @@
 import json
 from unittest.mock import patch, MagicMock, AsyncMock
 import pytest
-from minbot.scheduler import _check_issues
+from minbot import store
+from minbot.scheduler import _check_issues, _warm_workspaces
 from minbot.config import Config
 
 
@@ -17,17 +18,15 @@ def _fake_config():
 
 
 @pytest.mark.asyncio
-@patch("minbot.scheduler._save_known_issues")
-@patch("minbot.scheduler._load_known_issues")
-@patch("minbot.scheduler.agent")
-@patch("minbot.scheduler.github")
-async def test_check_issues_detects_new_after_empty(mock_gh, mock_agent, mock_load, mock_save):
+@patch("minbot.scheduler.agent", new_callable=AsyncMock)
+@patch("minbot.scheduler.agithub", new_callable=AsyncMock)
+async def test_check_issues_detects_new_after_empty(mock_gh, mock_agent):
     """After a first check with 0 issues, new issues should be detected."""
     send = AsyncMock()
     config = _fake_config()
 
-    # First check: no issues. Simulates known_issues saved as empty set.
-    mock_load.return_value = {"owner/repo": set()}
+    # First check: no issues, recorded as the baseline
+    store.sync_seen("owner/repo", set())
     mock_gh.list_issues.return_value = [
         {"number": 1, "title": "New bug", "body": "", "labels": [], "is_pr": False, "createdAt": "2024-01-01T00:00:00"},
     ]
@@ -43,15 +42,12 @@ async def test_check_issues_detects_new_after_empty(mock_gh, mock_agent, mock_lo
 
 
 @pytest.mark.asyncio
-@patch("minbot.scheduler._save_known_issues")
-@patch("minbot.scheduler._load_known_issues")
-@patch("minbot.scheduler.github")
-async def test_check_issues_first_run_no_notification(mock_gh, mock_load, mock_save):
-    """First run (no known issues file) should not notify about existing issues."""
+@patch("minbot.scheduler.agithub", new_callable=AsyncMock)
+async def test_check_issues_first_run_no_notification(mock_gh):
+    """First run (no baseline yet) should not notify about existing issues."""
     send = AsyncMock()
     config = _fake_config()
 
-    mock_load.return_value = {}
     mock_gh.list_issues.return_value = [
         {"number": 1, "title": "Existing issue", "body": ""},
     ]
@@ -63,18 +59,176 @@ async def test_check_issues_first_run_no_notification(mock_gh, mock_load, mock_s
 
 
 @pytest.mark.asyncio
-@patch("minbot.scheduler._save_known_issues")
-@patch("minbot.scheduler._load_known_issues")
-@patch("minbot.scheduler.github")
-async def test_check_issues_all_empty(mock_gh, mock_load, mock_save):
+@patch("minbot.scheduler.agithub", new_callable=AsyncMock)
+async def test_check_issues_all_empty(mock_gh):
     """When there are no issues at all, should report no new issues."""
     send = AsyncMock()
     config = _fake_config()
 
-    mock_load.return_value = {}
     mock_gh.list_issues.return_value = []
 
     await _check_issues(config, send)
 
     texts = [call[0][0] for call in send.call_args_list]
     assert any("no new issues" in t for t in texts)
+
+
+@pytest.mark.asyncio
+@patch("minbot.scheduler.agithub", new_callable=AsyncMock)
+async def test_warm_workspaces_fetches_pr_branches(mock_gh):
+    config = _fake_config().model_copy(update={"github_repos": ["owner/repo", "owner/broken"]})
+
+    async def list_prs(repo, limit):
+        if repo == "owner/broken":
+            raise RuntimeError("boom")
+        return [{"number": 3, "title": "t", "body": "", "branch": "fix-3"}]
+    mock_gh.list_prs.side_effect = list_prs
+
+    await _warm_workspaces(config)
+
+    fn, workspace_dir, repo, branches = mock_gh.run_git.call_args[0]
+    assert fn.__name__ == "warm"
+    assert (repo, branches) == ("owner/repo", ["fix-3"])
+    assert mock_gh.run_git.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_reconcile_adds_removes_and_reschedules_jobs():
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from minbot import scheduler
+
+    sched = AsyncIOScheduler()
+    sched.start(paused=True)
+    with patch("minbot.scheduler._scheduler", sched), patch.dict(scheduler._triggers, clear=True):
+        config = _fake_config()
+        scheduler.reconcile(config)
+        assert {j.id for j in sched.get_jobs()} == {"check_issues:owner/repo", "suggestions", "warm"}
+
+        changed = config.model_copy(update={
+            "check_interval_hours": 1, "review_interval_hours": 12, "warm_interval_minutes": None,
+        })
+        scheduler.reconcile(changed)
+        jobs = {j.id: j for j in sched.get_jobs()}
+        assert set(jobs) == {"check_issues:owner/repo", "suggestions", "review:owner/repo"}
+        assert jobs["check_issues:owner/repo"].trigger.interval.total_seconds() == 3600
+        assert jobs["check_issues:owner/repo"].max_instances == 1
+
+        # Unchanged config leaves the jobs (and their next run times) alone
+        next_run = jobs["suggestions"].next_run_time
+        scheduler.reconcile(changed)
+        assert sched.get_job("suggestions").next_run_time == next_run
+
+        # A repo added later gets its mirror built in one priming run
+        scheduler.reconcile(changed.model_copy(update={"github_repos": ["owner/repo", "owner/new"]}))
+        primes = [j for j in sched.get_jobs() if j.args == ("prime",)]
+        assert len(primes) == 1 and "check_issues:owner/new" in {j.id for j in sched.get_jobs()}
+    sched.shutdown(wait=False)
+
+
+def test_desired_applies_repo_overrides():
+    from minbot import scheduler
+    from minbot.config import RepoSchedule
+
+    config = _fake_config().model_copy(update={
+        "github_repos": ["owner/a", "owner/b", "owner/c"],
+        "review_interval_hours": None,
+        "repo_schedules": {
+            "owner/b": RepoSchedule(check_interval_hours=1, review_interval_hours=48),
+            "owner/c": RepoSchedule(check_interval_hours=0),
+        },
+    })
+    desired = scheduler._desired(config)
+    assert desired["check_issues:owner/a"] == {"hours": 6}
+    assert desired["check_issues:owner/b"] == {"hours": 1}
+    assert desired["review:owner/b"] == {"hours": 48}
+    assert "check_issues:owner/c" not in desired
+    assert "review:owner/a" not in desired
+
+
+def test_phase_offsets_are_stable_and_spread():
+    from minbot import scheduler
+
+    ids = [f"check_issues:owner/repo{i}" for i in range(20)]
+    phases = [scheduler._phase(i, 6 * 3600) for i in ids]
+    assert phases == [scheduler._phase(i, 6 * 3600) for i in ids]
+    assert all(0 <= p < 6 * 3600 for p in phases)
+    assert len(set(phases)) == len(phases)
+    assert max(phases) - min(phases) > 3 * 3600
+
+    args = scheduler._trigger_args(ids[0], {"hours": 6})
+    assert args["jitter"] == scheduler.MAX_JITTER_SECONDS
+    assert args["hours"] == 6
+
+
+def test_startup_runs_prime_first_and_end_with_suggestions():
+    from minbot import scheduler
+
+    config = _fake_config().model_copy(update={"github_repos": ["owner/a", "owner/b"]})
+    with patch.dict(scheduler._triggers, {"warm": {"minutes": 10}}, clear=True):
+        runs = scheduler._startup_runs(config)
+    assert runs == ["prime", "warm", "check_issues:owner/a", "check_issues:owner/b", "suggestions"]
+
+
+@pytest.mark.asyncio
+async def test_scheduled_run_uses_current_config():
+    from minbot import scheduler, github
+
+    mock_suggest = AsyncMock(side_effect=lambda *a: seen.append(github.background.get()))
+    mock_check = AsyncMock()
+    seen = []
+    current = _fake_config().model_copy(update={"github_repos": ["owner/new"]})
+    send = AsyncMock()
+    with patch("minbot.scheduler.config_service.get_config", return_value=current), \
+         patch("minbot.scheduler._send_message", send), \
+         patch.dict(scheduler._JOBS, {"suggestions": mock_suggest}), \
+         patch.dict(scheduler._REPO_JOBS, {"check_issues": mock_check}):
+        await scheduler._run_job("suggestions")
+        await scheduler._run_job("check_issues:owner/new")
+        # A repo dropped from the config since the job was scheduled is skipped
+        await scheduler._run_job("check_issues:owner/old")
+    mock_suggest.assert_called_once_with(current, send)
+    mock_check.assert_called_once_with(current, send, "owner/new")
+    # Scheduled runs are background work for the API token bucket
+    assert seen == [True]
+    assert github.background.get() is False
+
+
+def test_webhooks_slow_polling_to_reconciliation():
+    from minbot import scheduler
+    from minbot.config import RepoSchedule
+
+    config = _fake_config().model_copy(update={
+        "github_repos": ["owner/a", "owner/b"],
+        "webhook_port": 8080,
+        "webhook_secret": "s",
+        "repo_schedules": {"owner/b": RepoSchedule(check_interval_hours=2)},
+    })
+    desired = scheduler._desired(config)
+    assert desired["check_issues:owner/a"] == {"hours": scheduler.WEBHOOK_CHECK_HOURS}
+    assert desired["check_issues:owner/b"] == {"hours": 2}
+
+
+@pytest.mark.asyncio
+@patch("minbot.scheduler.random.random", return_value=0.0)
+@patch("minbot.scheduler.workspace")
+@patch("minbot.scheduler.agent", new_callable=AsyncMock)
+@patch("minbot.scheduler.agithub", new_callable=AsyncMock)
+async def test_review_prefers_prs_not_reviewed_lately(mock_gh, mock_agent, mock_ws, _):
+    from contextlib import asynccontextmanager
+    from minbot import scheduler
+
+    @asynccontextmanager
+    async def checkout(*a):
+        yield "/tmp/wt"
+    mock_ws.checkout = checkout
+    mock_gh.list_prs.return_value = [
+        {"number": n, "title": f"PR {n}", "body": "", "branch": f"b{n}"} for n in (1, 2)
+    ]
+    mock_gh.get_pr_context.side_effect = lambda repo, n: ({"number": n, "title": f"PR {n}", "branch": f"b{n}"}, [])
+    mock_agent.review_pr.return_value = "Looks fine"
+    store.record_review("owner/repo", "pr", 1, "earlier")
+
+    await scheduler._review_code(_fake_config(), AsyncMock())
+
+    mock_gh.get_pr_context.assert_called_once_with("owner/repo", 2)
+    assert set(store.last_pr_reviews("owner/repo")) == {1, 2}
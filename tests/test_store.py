@@ -0,0 +1,68 @@
+"""Tests for the SQLite state store."""
+
+import json
+import time
+from unittest.mock import patch
+from minbot import store
+
+
+def test_database_uses_wal(state_db):
+    store.sync_seen("owner/repo", set())
+    assert store._query("PRAGMA journal_mode")[0][0] == "wal"
+    assert state_db.exists()
+
+
+def test_sync_seen_baselines_then_reports_new():
+    assert store.sync_seen("owner/repo", {1, 2}) == set()
+    assert store.sync_seen("owner/repo", {1, 2, 3}) == {3}
+    assert store.sync_seen("owner/repo", {1, 3}) == set()
+    # Closed and reopened counts as new again
+    assert store.sync_seen("owner/repo", {1, 2, 3}) == {2}
+    # Repos are independent
+    assert store.sync_seen("owner/other", {1}) == set()
+
+
+def test_mark_seen_is_idempotent_and_feeds_sync():
+    store.sync_seen("owner/repo", {1})
+    assert store.mark_seen("owner/repo", 2)
+    assert not store.mark_seen("owner/repo", 2)
+    # Already announced by a webhook, so the poll stays quiet
+    assert store.sync_seen("owner/repo", {1, 2}) == set()
+    # PRs aren't touched by issue syncs
+    assert store.mark_seen("owner/repo", 5, is_pr=True)
+    store.sync_seen("owner/repo", {1, 2})
+    assert not store.mark_seen("owner/repo", 5, is_pr=True)
+
+
+def test_triage_rows_expire_and_are_capped():
+    store.save_triage([("k1", "o/r", 1, {"urgency": "low"})], max_age=100, max_entries=10)
+    assert store.triage_rows(["k1", "missing"], max_age=100) == {"k1": {"urgency": "low"}}
+    assert store.triage_rows(["k1"], max_age=-1) == {}
+
+    with patch("minbot.store.time.time", return_value=time.time() + 1):
+        store.save_triage([("k2", "o/r", 2, {}), ("k3", "o/r", 3, {})], max_age=100, max_entries=2)
+    assert set(store.triage_rows(["k1", "k2", "k3"], max_age=100)) == {"k2", "k3"}
+
+
+def test_migrates_known_issues_once(state_db):
+    home = state_db.parent
+    (home / "known_issues.json").write_text(json.dumps({"owner/repo": [1, 2]}))
+
+    assert store.sync_seen("owner/repo", {1, 2, 3}) == {3}
+    assert not (home / "known_issues.json").exists()
+    assert (home / "known_issues.json.migrated").exists()
+
+    store.close()
+    assert store.sync_seen("owner/repo", {1, 2, 3}) == set()
+
+
+def test_history():
+    store.record_job(1, "o/r", "Issue #1", "done", 100.0, 160.0, {"turns": 3})
+    store.record_job(2, "o/r", "PR #2", "failed", None, 170.0)
+    assert [(h["job_id"], h["state"]) for h in store.job_history()] == [(2, "failed"), (1, "done")]
+    assert store.job_history()[1]["telemetry"] == {"turns": 3}
+
+    store.record_review("o/r", "pr", 7, "LGTM")
+    store.record_review("o/r", "codebase", detail="Fix typo")
+    assert set(store.last_pr_reviews("o/r")) == {7}
+    assert store.last_pr_reviews("o/other") == {}
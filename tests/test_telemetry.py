@@ -0,0 +1,59 @@
+"""Tests for stream-json telemetry parsing."""
+
+import json
+from minbot.telemetry import RunTelemetry
+
+
+def _assistant(msg_id, *content, usage=None):
+    message = {"id": msg_id, "content": list(content)}
+    if usage:
+        message["usage"] = usage
+    return json.dumps({"type": "assistant", "message": message})
+
+
+def _tool(tool_id, name, **tool_input):
+    return {"type": "tool_use", "id": tool_id, "name": name, "input": tool_input}
+
+
+def _result(tool_id):
+    return json.dumps({"type": "user", "message": {"content": [{"type": "tool_result", "tool_use_id": tool_id}]}})
+
+
+def test_wall_time_is_split_by_phase():
+    t = RunTelemetry(started=0.0)
+    t.feed(_assistant("m1", _tool("t1", "Bash", command="python -m pytest -q")), now=10.0)
+    t.feed(_result("t1"), now=70.0)
+    t.feed(_assistant("m2", _tool("t2", "Edit", file_path="/w/a.py")), now=75.0)
+    t.feed(_result("t2"), now=76.0)
+    t.feed(_assistant("m3", _tool("t3", "Bash", command="ls")), now=80.0)
+    t.feed(_result("t3"), now=81.0)
+
+    assert t.seconds == {"thinking": 19.0, "tests": 60.0, "editing": 1.0, "shell": 1.0}
+    assert t.breakdown().startswith("tests 1m00s, thinking 19s")
+    assert t.tool_calls == {"Bash": 2, "Edit": 1}
+
+
+def test_usage_counted_once_per_message_and_result_wins():
+    t = RunTelemetry(root="/w")
+    usage = {"input_tokens": 10, "cache_read_input_tokens": 5, "output_tokens": 3}
+    t.feed(_assistant("m1", {"type": "text", "text": "Looking"}, usage=usage))
+    t.feed(_assistant("m1", _tool("t1", "Write", file_path="/w/src/b.py"), usage=usage))
+    assert (t.turns, t.input_tokens, t.output_tokens) == (1, 15, 3)
+    assert t.files_edited == ["src/b.py"]
+
+    t.feed(json.dumps({
+        "type": "result", "result": "All done", "num_turns": 4, "total_cost_usd": 0.5,
+        "usage": {"input_tokens": 40, "output_tokens": 9},
+    }))
+    assert (t.turns, t.input_tokens, t.output_tokens, t.cost_usd) == (4, 40, 9, 0.5)
+    assert t.result == "All done"
+    assert "$0.50" in t.summary()
+
+
+def test_feed_renders_events_and_passes_plain_text_through():
+    t = RunTelemetry()
+    shown = t.feed(_assistant("m1", {"type": "text", "text": "Plan"}, _tool("t1", "Bash", command="make test")))
+    assert shown == "Plan\n> Bash make test"
+    assert t.feed(_result("t1")) is None
+    assert t.feed("not json at all") == "not json at all"
+    assert t.feed("") is None
@@ -0,0 +1,103 @@
+"""Tests for multi-repo triage fan-out."""
+
+import asyncio
+import time
+from unittest.mock import patch, AsyncMock
+import pytest
+from minbot import triage
+from minbot.config import Config
+
+
+def _fake_config(repos, limit=4):
+    return Config(
+        telegram_token="fake-token",
+        github_token="ghp_fake",
+        github_repos=repos,
+        max_concurrent_repos=limit,
+    )
+
+
+@pytest.mark.asyncio
+async def test_fan_out_preserves_order_and_isolates_errors():
+    async def fn(repo):
+        await asyncio.sleep(0.05 if repo == "a/1" else 0)
+        if repo == "a/2":
+            raise RuntimeError("boom")
+        return repo.upper()
+
+    result = await triage.fan_out(["a/1", "a/2", "a/3"], fn, limit=3)
+    assert [r for r, _ in result] == ["a/1", "a/2", "a/3"]
+    assert result[0][1] == "A/1"
+    assert isinstance(result[1][1], RuntimeError)
+    assert result[2][1] == "A/3"
+
+
+@pytest.mark.asyncio
+async def test_fan_out_respects_limit():
+    in_flight = 0
+    peak = 0
+
+    async def fn(repo):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    await triage.fan_out([f"o/r{n}" for n in range(10)], fn, limit=3)
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+@patch("minbot.triage.agent", new_callable=AsyncMock)
+@patch("minbot.triage.agithub", new_callable=AsyncMock)
+async def test_analyze_repos_runs_in_parallel(mock_gh, mock_agent):
+    mock_gh.list_issues.return_value = [{"number": 1, "title": "Bug", "is_pr": False}]
+    async def analyze(*a):
+        await asyncio.sleep(0.2)
+        return [{"number": 1, "title": "Bug"}]
+    mock_agent.analyze_issues.side_effect = analyze
+    config = _fake_config([f"owner/repo{n}" for n in range(5)], limit=5)
+
+    start = time.monotonic()
+    result = await triage.analyze_repos(config.github_repos, config)
+    assert time.monotonic() - start < 0.6
+
+    assert [r for r, _ in result] == config.github_repos
+    assert all(rows[0]["repo"] == repo for repo, rows in result)
+
+
+@pytest.mark.asyncio
+@patch("minbot.triage.agent", new_callable=AsyncMock)
+@patch("minbot.triage.agithub", new_callable=AsyncMock)
+async def test_analyze_repo_only_sends_changed_issues(mock_gh, mock_agent):
+    issues = [
+        {"number": 1, "title": "Bug", "body": "a", "labels": [], "is_pr": False},
+        {"number": 2, "title": "Feature", "body": "b", "labels": [], "is_pr": False},
+    ]
+    mock_gh.list_issues.return_value = issues
+    mock_agent.analyze_issues.side_effect = lambda batch, *a: [
+        {"number": i["number"], "title": i["title"], "difficulty": "easy",
+         "urgency": "low", "summary": i["body"], "has_pr": False}
+        for i in batch
+    ]
+    config = _fake_config(["owner/repo"])
+
+    first = await triage.analyze_repo("owner/repo", config)
+    issues[1] = {**issues[1], "body": "changed"}
+    listed = AsyncMock()
+    second = await triage.analyze_repo("owner/repo", config, on_listed=listed)
+
+    assert [a["number"] for a in first] == [1, 2]
+    assert [a["number"] for a in second] == [1, 2]
+    assert second[1]["summary"] == "changed"
+    sent = [i["number"] for i in mock_agent.analyze_issues.call_args_list[1][0][0]]
+    assert sent == [2]
+    # Before the LLM runs: the cached row, and a bare row for the changed issue
+    rows = listed.call_args[0][0]
+    assert rows[0]["difficulty"] == "easy" and rows[0]["repo"] == "owner/repo"
+    assert rows[1] == {"number": 2, "title": "Feature", "repo": "owner/repo"}
+
+    listed.reset_mock()
+    await triage.analyze_repo("owner/repo", config, on_listed=listed)
+    listed.assert_not_called()
@@ -0,0 +1,154 @@
+"""Tests for the GitHub webhook receiver, replaying recorded deliveries."""
+
+import asyncio
+import hashlib
+import hmac
+import json
+from pathlib import Path
+from unittest.mock import patch, AsyncMock
+import pytest
+import pytest_asyncio
+from minbot import github, store, webhook
+from minbot.config import Config
+
+FIXTURES = Path(__file__).parent / "fixtures" / "webhooks"
+SECRET = "s3cret"
+
+
+def _fake_config():
+    return Config(
+        telegram_token="fake-token",
+        telegram_chat_id=12345,
+        github_token="ghp_fake",
+        github_repos=["owner/repo"],
+        webhook_port=8080,
+        webhook_secret=SECRET,
+    )
+
+
+def _recorded(name: str) -> bytes:
+    return (FIXTURES / f"{name}.json").read_bytes()
+
+
+def _sign(body: bytes, secret: str = SECRET) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+async def _deliver(port, event, body, signature, delivery="d-1", method="POST") -> int:
+    """Stand-in for GitHub's sender: one HTTP request, returns the status code."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} /webhook HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"X-GitHub-Event: {event}\r\nX-GitHub-Delivery: {delivery}\r\n"
+        f"X-Hub-Signature-256: {signature}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    writer.close()
+    return status
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """Real mirror in a temp dir (already synced once), GitHub calls run inline."""
+    monkeypatch.setattr(github, "_MIRROR_DIR", tmp_path / "mirror")
+    github._save_mirror("owner/repo", {"since": "2026-09-01T00:00:00Z", "items": {}})
+    agithub = AsyncMock()
+    agithub.run.side_effect = lambda fn, *args: fn(*args)
+    with patch("minbot.webhook.config_service.get_config", return_value=_fake_config()), \
+         patch("minbot.webhook.agithub", agithub), \
+         patch.object(webhook, "_seen", webhook.deque(maxlen=10)):
+        yield
+
+
+@pytest_asyncio.fixture
+async def server(env):
+    send = AsyncMock()
+    srv = await webhook.serve("127.0.0.1", 0, send)
+    yield srv.sockets[0].getsockname()[1], send
+    srv.close()
+
+
+def test_verify():
+    body = b'{"zen": "Keep it logically awesome."}'
+    assert webhook.verify(SECRET, body, _sign(body))
+    assert not webhook.verify(SECRET, body, _sign(body, "other"))
+    assert not webhook.verify(SECRET, body, None)
+    assert not webhook.verify(SECRET, body, "sha1=abc")
+
+
+@pytest.mark.asyncio
+@patch("minbot.webhook.triage.analyze_repo", new_callable=AsyncMock)
+async def test_replayed_deliveries_update_mirror_and_notify(mock_triage, server):
+    port, send = server
+    mock_triage.return_value = [
+        {"number": 42, "difficulty": "easy", "urgency": "high", "summary": "Validate empty config"},
+    ]
+    deliveries = [
+        ("issues", "issues_opened"),
+        ("pull_request", "pull_request_opened"),
+        ("pull_request_review", "pull_request_review_submitted"),
+        ("issue_comment", "issue_comment_created"),
+    ]
+    for n, (event, name) in enumerate(deliveries):
+        body = _recorded(name)
+        assert await _deliver(port, event, body, _sign(body), delivery=f"d-{n}") == 202
+    await asyncio.gather(*webhook._tasks)
+
+    items = github._load_mirror("owner/repo")["items"]
+    assert items["42"]["title"] == "Crash when config file is empty"
+    assert items["42"]["labels"] == ["bug"]
+    assert items["43"]["is_pr"] and items["43"]["branch"] == "fix-empty-config"
+    assert items["43"]["updatedAt"] == "2026-10-01T15:00:00Z"
+
+    texts = "\n---\n".join(c[0][0] for c in send.call_args_list)
+    assert "New issue in owner/repo" in texts and "#42" in texts and "easy / high" in texts
+    assert "New PR in owner/repo" in texts and "fix-empty-config" in texts
+    assert "by reviewer: changes_requested" in texts
+    assert "Looks good once the test is in." in texts
+    assert not store.mark_seen("owner/repo", 42)
+    assert not store.mark_seen("owner/repo", 43, is_pr=True)
+    # Only the new issue is triaged
+    select = mock_triage.call_args.kwargs["select"]
+    assert select([{"number": 41}, {"number": 42}]) == [{"number": 42}]
+
+
+@pytest.mark.asyncio
+async def test_rejects_bad_signature_and_method(server):
+    port, send = server
+    body = _recorded("issues_opened")
+    assert await _deliver(port, "issues", body, _sign(body, "wrong")) == 401
+    assert await _deliver(port, "issues", body, "") == 401
+    assert await _deliver(port, "issues", b"", _sign(b""), method="GET") == 405
+    assert not webhook._tasks
+    send.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_redelivery_and_ping_are_not_handled_again(server):
+    port, send = server
+    body = _recorded("pull_request_opened")
+    assert await _deliver(port, "pull_request", body, _sign(body), delivery="same") == 202
+    assert await _deliver(port, "pull_request", body, _sign(body), delivery="same") == 200
+    ping = b'{"zen": "Design for failure.", "hook_id": 1}'
+    assert await _deliver(port, "ping", ping, _sign(ping), delivery="p") == 202
+    await asyncio.gather(*webhook._tasks)
+    assert send.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_known_issue_and_own_comments_are_quiet(env):
+    send = AsyncMock()
+    store.mark_seen("owner/repo", 42)
+    await webhook.handle("issues", json.loads(_recorded("issues_opened")), send)
+
+    comment = json.loads(_recorded("issue_comment_created"))
+    comment["comment"]["body"] = "**Automated code review by minbot**\n\n_Generated by [minbot](https://github.com/ChicagoHAI/minbot)_"
+    await webhook.handle("issue_comment", comment, send)
+
+    other_repo = json.loads(_recorded("pull_request_opened"))
+    other_repo["repository"]["full_name"] = "someone/else"
+    await webhook.handle("pull_request", other_repo, send)
+
+    send.assert_not_called()
+    assert "42" in github._load_mirror("owner/repo")["items"]
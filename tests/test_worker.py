@@ -1,82 +1,237 @@
 """Tests for Claude Code worker."""
 
 import asyncio
-from unittest.mock import patch, MagicMock, AsyncMock, mock_open
+import contextlib
+import json
+from unittest.mock import patch, MagicMock, AsyncMock
 import pytest
 from minbot import worker
 
 
-@pytest.mark.asyncio
-@patch("minbot.worker.github")
-@patch("asyncio.create_subprocess_exec")
-async def test_work_on_issue_success(mock_exec, mock_gh):
-    proc = AsyncMock()
-    proc.returncode = 0
+@contextlib.asynccontextmanager
+async def _fake_checkout(workspace_dir, repo, branch=None, create=False, resume=False):
+    yield f"{workspace_dir}/.worktrees/{repo}/wt-1"
+
+
+def _fake_proc(returncode, chunks):
+    """A subprocess whose stdout yields `chunks` (bytes) and then EOF."""
+    stdout = asyncio.StreamReader()
+    for c in chunks:
+        stdout.feed_data(c)
+    stdout.feed_eof()
+    proc = MagicMock()
+    proc.stdout = stdout
+    proc.returncode = returncode
     proc.wait = AsyncMock()
-    mock_exec.return_value = proc
+    return proc
 
-    mock_gh.clone_repo = MagicMock()
-    mock_gh.create_branch = MagicMock()
-    mock_gh.create_pr = MagicMock(return_value="https://github.com/owner/repo/pull/1")
 
-    log_content = "Analyzing issue...\nMaking changes...\nDone.\n"
-    m = mock_open(read_data=log_content)
+@pytest.fixture(autouse=True)
+def logs_dir(tmp_path):
+    with patch("minbot.worker.LOGS_DIR", str(tmp_path)):
+        yield tmp_path
 
-    with patch("subprocess.run"), patch("builtins.open", m), patch("os.makedirs"):
-        issue = {"number": 1, "title": "Fix bug", "body": "Details"}
-        result = await worker.work_on_issue("/workspace", "owner/repo", issue)
+
+@pytest.mark.asyncio
+@patch("minbot.worker.workspace")
+@patch("minbot.worker.agithub", new_callable=AsyncMock)
+@patch("asyncio.create_subprocess_exec")
+async def test_work_on_issue_success(mock_exec, mock_gh, mock_ws, logs_dir):
+    mock_exec.return_value = _fake_proc(0, [b"Analyzing issue...\nMaking changes...\nDone.\n"])
+    mock_ws.checkout.side_effect = _fake_checkout
+    mock_gh.create_pr.return_value = "https://github.com/owner/repo/pull/1"
+
+    issue = {"number": 1, "title": "Fix bug", "body": "Details"}
+    result = await worker.work_on_issue("/workspace", "owner/repo", issue)
 
     assert "PR created" in result
-    mock_gh.create_branch.assert_called_once_with("/workspace/owner/repo", "issue-1")
+    mock_ws.checkout.assert_called_once_with("/workspace", "owner/repo", "issue-1", create=True, resume=False)
+    assert mock_exec.call_args[1]["cwd"] == "/workspace/.worktrees/owner/repo/wt-1"
+    assert "Making changes" in mock_gh.create_pr.call_args[1]["body"]
+    assert (logs_dir / "owner_repo" / "issue-1.log").read_text().startswith("Analyzing")
 
 
 @pytest.mark.asyncio
-@patch("minbot.worker.github")
+@patch("minbot.worker.workspace")
+@patch("minbot.worker.agithub", new_callable=AsyncMock)
 @patch("asyncio.create_subprocess_exec")
-async def test_work_on_issue_failure(mock_exec, mock_gh):
-    proc = AsyncMock()
-    proc.returncode = 1
-    proc.wait = AsyncMock()
-    mock_exec.return_value = proc
+async def test_work_on_issue_failure(mock_exec, mock_gh, mock_ws):
+    mock_exec.return_value = _fake_proc(1, [b"Error occurred\n"])
+    mock_ws.checkout.side_effect = _fake_checkout
 
-    mock_gh.clone_repo = MagicMock()
-    mock_gh.create_branch = MagicMock()
+    issue = {"number": 1, "title": "Fix bug", "body": "Details"}
+    with pytest.raises(RuntimeError) as e:
+        await worker.work_on_issue("/workspace", "owner/repo", issue)
 
-    log_content = "Error occurred\n"
-    m = mock_open(read_data=log_content)
+    assert "exited with code 1" in str(e.value)
+    assert "Error occurred" in str(e.value)
+    mock_gh.push_branch.assert_not_called()
 
-    with patch("builtins.open", m), patch("os.makedirs"):
-        issue = {"number": 1, "title": "Fix bug", "body": "Details"}
-        result = await worker.work_on_issue("/workspace", "owner/repo", issue)
 
-    assert "exited with code 1" in result
+@pytest.mark.asyncio
+@patch("minbot.worker.workspace")
+@patch("minbot.worker.agithub", new_callable=AsyncMock)
+@patch("asyncio.create_subprocess_exec")
+async def test_work_on_issue_calls_on_output(mock_exec, mock_gh, mock_ws):
+    mock_exec.return_value = _fake_proc(0, [b"line1\n", b"line2\n"])
+    mock_ws.checkout.side_effect = _fake_checkout
+    mock_gh.create_pr.return_value = "https://github.com/owner/repo/pull/1"
+
+    collected = []
+
+    async def on_output(text):
+        collected.append(text)
+
+    issue = {"number": 5, "title": "Add feature", "body": ""}
+    await worker.work_on_issue("/workspace", "owner/repo", issue, on_output)
+
+    assert "line1" in collected[-1]
+    assert "line2" in collected[-1]
 
 
 @pytest.mark.asyncio
-@patch("minbot.worker.github")
 @patch("asyncio.create_subprocess_exec")
-async def test_work_on_issue_calls_on_output(mock_exec, mock_gh):
-    proc = AsyncMock()
-    proc.returncode = 0
-    proc.wait = AsyncMock()
-    mock_exec.return_value = proc
+async def test_run_claude_keeps_bounded_tail(mock_exec, tmp_path):
+    lines = [f"line {i}\n".encode() for i in range(1000)]
+    # Chunk boundaries in the middle of lines, plus one oversized line
+    data = b"".join(lines) + b"x" * 10_000 + b"\nend"
+    mock_exec.return_value = _fake_proc(0, [data[i:i + 777] for i in range(0, len(data), 777)])
+    log_path = tmp_path / "run.log"
 
-    mock_gh.clone_repo = MagicMock()
-    mock_gh.create_branch = MagicMock()
-    mock_gh.create_pr = MagicMock(return_value="https://github.com/owner/repo/pull/1")
+    code, output, _ = await worker._run_claude(["claude"], "/repo", str(log_path))
 
-    collected = []
+    assert code == 0
+    assert log_path.read_bytes() == data
+    tail = output.split("\n")
+    assert len(tail) == worker.TAIL_LINES
+    assert tail[-1] == "end"
+    assert tail[-2] == "x" * worker.MAX_LINE
+    assert tail[-3] == "line 999"
+
+
+@pytest.mark.asyncio
+@patch("minbot.worker.MAX_EVENT", 100)
+@patch("asyncio.create_subprocess_exec")
+async def test_run_claude_skips_oversized_events_whole(mock_exec, tmp_path):
+    big = json.dumps({"type": "user", "message": {"content": "y" * 500}}).encode()
+    data = b"before\n" + big + b"\nafter\n" + big + b"\n" + big + b"\nend"
+    mock_exec.return_value = _fake_proc(0, [data[i:i + 64] for i in range(0, len(data), 64)])
+
+    _, output, _ = await worker._run_claude(["claude"], "/repo", str(tmp_path / "run.log"))
+
+    # No fragment of the big events shows up as if it were an event of its own
+    assert output.split("\n") == ["before", "after", "end"]
+
+
+@pytest.mark.asyncio
+@patch("minbot.worker.OUTPUT_INTERVAL", 60)
+@patch("asyncio.create_subprocess_exec")
+async def test_run_claude_throttles_on_output(mock_exec, tmp_path):
+    mock_exec.return_value = _fake_proc(0, [f"step {i}\n".encode() for i in range(50)])
+    calls = []
 
     async def on_output(text):
-        collected.append(text)
+        calls.append(text)
+        raise RuntimeError("telegram is down")
+
+    code, _, _ = await worker._run_claude(["claude"], "/repo", str(tmp_path / "run.log"), on_output)
 
-    log_content = "line1\nline2\n"
-    m = mock_open(read_data=log_content)
+    # Updates are coalesced and failures in on_output don't fail the run
+    assert code == 0
+    assert len(calls) <= 2
+    assert calls[-1].endswith("step 49")
 
-    with patch("subprocess.run"), patch("builtins.open", m), patch("os.makedirs"):
-        issue = {"number": 5, "title": "Add feature", "body": ""}
-        await worker.work_on_issue("/workspace", "owner/repo", issue, on_output)
 
-    assert len(collected) == 1
-    assert "line1" in collected[0]
-    assert "line2" in collected[0]
+@pytest.mark.asyncio
+@patch("minbot.worker.workspace")
+@patch("minbot.worker.agithub", new_callable=AsyncMock)
+@patch("asyncio.create_subprocess_exec")
+async def test_work_on_issue_parses_stream_json(mock_exec, mock_gh, mock_ws, logs_dir):
+    root = "/workspace/.worktrees/owner/repo/wt-1"
+    events = [
+        {"type": "system", "subtype": "init"},
+        {"type": "assistant", "message": {"id": "m1", "content": [
+            {"type": "tool_use", "id": "t1", "name": "Edit", "input": {"file_path": f"{root}/a.py"}},
+        ]}},
+        {"type": "user", "message": {"content": [{"type": "tool_result", "tool_use_id": "t1"}]}},
+        {"type": "result", "result": "Fixed the bug in a.py.", "num_turns": 2, "total_cost_usd": 0.12,
+         "usage": {"input_tokens": 100, "output_tokens": 20}},
+    ]
+    stream = "".join(json.dumps(e) + "\n" for e in events).encode()
+    mock_exec.return_value = _fake_proc(0, [stream])
+    mock_ws.checkout.side_effect = _fake_checkout
+    mock_gh.create_pr.return_value = "https://github.com/owner/repo/pull/1"
+
+    issue = {"number": 1, "title": "Fix bug", "body": "Details"}
+    await worker.work_on_issue("/workspace", "owner/repo", issue)
+
+    assert "--output-format" in mock_exec.call_args[0]
+    body = mock_gh.create_pr.call_args[1]["body"]
+    assert "Fixed the bug in a.py." in body
+    assert "`a.py`" in body and "$0.12" in body
+    stats = json.loads((logs_dir / "owner_repo" / "issue-1.stats.json").read_text())
+    assert stats["tool_calls"] == {"Edit": 1}
+    assert stats["turns"] == 2
+
+
+@pytest.mark.asyncio
+@patch("minbot.worker.workspace")
+@patch("minbot.worker.agithub", new_callable=AsyncMock)
+@patch("asyncio.create_subprocess_exec")
+async def test_work_on_issue_journals_phases(mock_exec, mock_gh, mock_ws):
+    from minbot import jobs, store
+
+    mock_exec.return_value = _fake_proc(0, [b"Done.\n"])
+    mock_ws.checkout.side_effect = _fake_checkout
+    mock_gh.run_git.return_value = "abc123"  # workspace.head
+    mock_gh.create_pr.return_value = "https://github.com/owner/repo/pull/1"
+    entry_id = store.journal_open("work", "owner/repo", 1, 1, {})
+    job = jobs.Job(1, "owner/repo", "w", None, journal_id=entry_id)
+    with patch("minbot.worker.jobs.current", return_value=job):
+        await worker.work_on_issue("/workspace", "owner/repo", {"number": 1, "title": "Fix bug", "body": ""})
+
+    entry = store.journal_active()[0]
+    assert entry["phase"] == "pr_created"
+    assert entry["data"]["head"] == "abc123"
+    assert entry["data"]["pr_url"] == "https://github.com/owner/repo/pull/1"
+
+
+@pytest.mark.asyncio
+@patch("minbot.worker.workspace")
+@patch("minbot.worker.agithub", new_callable=AsyncMock)
+@patch("asyncio.create_subprocess_exec")
+async def test_resume_after_claude_only_pushes_and_opens_pr(mock_exec, mock_gh, mock_ws):
+    mock_ws.checkout.side_effect = _fake_checkout
+    mock_gh.create_pr.return_value = "https://github.com/owner/repo/pull/1"
+    resume = {"phase": "claude_done", "data": {
+        "head": "abc123", "summary": "Fixed it.", "stats": "- Turns: 3", "status": "3 turns",
+    }}
+
+    result = await worker.work_on_issue(
+        "/workspace", "owner/repo", {"number": 1, "title": "Fix bug", "body": ""}, resume=resume,
+    )
+
+    mock_exec.assert_not_called()
+    assert mock_gh.run_git.call_args[0][1:] == ("/workspace/.worktrees/owner/repo/wt-1", "abc123")
+    mock_gh.push_branch.assert_called_once()
+    assert "Fixed it." in mock_gh.create_pr.call_args[1]["body"]
+    assert result == "Done! PR created: https://github.com/owner/repo/pull/1\n3 turns"
+
+
+@pytest.mark.asyncio
+@patch("minbot.worker.workspace")
+@patch("minbot.worker.agithub", new_callable=AsyncMock)
+@patch("asyncio.create_subprocess_exec")
+async def test_resume_during_claude_reruns_with_note(mock_exec, mock_gh, mock_ws):
+    mock_exec.return_value = _fake_proc(0, [b"Done.\n"])
+    mock_ws.checkout.side_effect = _fake_checkout
+
+    await worker.address_pr_comments(
+        "/workspace", "owner/repo", {"number": 3, "title": "t", "body": "", "branch": "fix"}, [],
+        resume={"phase": "checked_out", "data": {}},
+    )
+
+    assert mock_ws.checkout.call_args.kwargs["resume"] is True
+    prompt = mock_exec.call_args[0][-1]
+    assert prompt.endswith(worker.RESUME_NOTE)
+    mock_gh.push_branch.assert_called_once()
@@ -0,0 +1,142 @@
+"""Tests for per-job git worktrees."""
+
+import os
+import subprocess
+from unittest.mock import patch
+import pytest
+from minbot import workspace
+from minbot.config import CloneStrategy
+
+
+def _git(cwd, *args):
+    return subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+        cwd=cwd, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+
+@pytest.fixture
+def origin(tmp_path):
+    """A local 'GitHub' repo with main and a PR branch, cloned bare on demand."""
+    src = tmp_path / "origin"
+    src.mkdir()
+    _git(src, "init", "-b", "main")
+    (src / "a.txt").write_text("main\n")
+    _git(src, "add", ".")
+    _git(src, "commit", "-m", "init")
+    _git(src, "checkout", "-b", "feature")
+    (src / "a.txt").write_text("feature\n")
+    _git(src, "commit", "-am", "feature")
+    _git(src, "checkout", "main")
+
+    def clone_repo(repo, path, branches=None, **kwargs):
+        if os.path.exists(path):
+            _git(path, "fetch", "origin", "--prune")
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _git(tmp_path, "clone", "--bare", str(src), path)
+            _git(path, "config", "remote.origin.fetch", "+refs/heads/*:refs/remotes/origin/*")
+            _git(path, "fetch", "origin")
+
+    workspace._busy.clear()
+    workspace._fetched.clear()
+    with patch("minbot.workspace.github.clone_repo", side_effect=clone_repo):
+        yield str(tmp_path / "ws")
+    workspace._busy.clear()
+    workspace._fetched.clear()
+
+
+def test_concurrent_jobs_get_separate_worktrees(origin):
+    work = workspace.acquire(origin, "owner/repo", "issue-1", create=True)
+    pr = workspace.acquire(origin, "owner/repo", "feature")
+
+    assert work != pr
+    assert _git(work, "branch", "--show-current") == "issue-1"
+    assert open(os.path.join(work, "a.txt")).read() == "main\n"
+    assert _git(pr, "branch", "--show-current") == "feature"
+    assert open(os.path.join(pr, "a.txt")).read() == "feature\n"
+
+
+def test_same_branch_twice_is_rejected(origin):
+    workspace.acquire(origin, "owner/repo", "feature")
+    with pytest.raises(RuntimeError, match="already checked out"):
+        workspace.acquire(origin, "owner/repo", "feature")
+
+
+def test_idle_worktree_is_reused_and_cleaned(origin):
+    path = workspace.acquire(origin, "owner/repo", "issue-1", create=True)
+    (open(os.path.join(path, "junk.txt"), "w")).write("x")
+    workspace.release(origin, "owner/repo", path)
+
+    again = workspace.acquire(origin, "owner/repo")
+    assert again == path
+    assert not os.path.exists(os.path.join(path, "junk.txt"))
+    assert _git(again, "branch", "--show-current") == ""
+
+
+def test_resumed_job_keeps_uncommitted_work(origin):
+    for branch, create in [("issue-1", True), ("feature", False)]:
+        path = workspace.acquire(origin, "owner/repo", branch, create=create)
+        with open(os.path.join(path, "a.txt"), "w") as f:
+            f.write("half done\n")
+        workspace.release(origin, "owner/repo", path)
+
+        again = workspace.acquire(origin, "owner/repo", branch, create=create, resume=True)
+        assert again == path
+        assert open(os.path.join(path, "a.txt")).read() == "half done\n"
+        workspace.release(origin, "owner/repo", path)
+
+        # A fresh run of the same branch starts clean
+        fresh = workspace.acquire(origin, "owner/repo", branch, create=create)
+        assert open(os.path.join(fresh, "a.txt")).read() != "half done\n"
+        workspace.release(origin, "owner/repo", fresh)
+
+
+def test_release_trims_pool(origin):
+    paths = [workspace.acquire(origin, "owner/repo") for _ in range(4)]
+    for p in paths:
+        workspace.release(origin, "owner/repo", p)
+    assert len(workspace._worktrees(origin, "owner/repo")) == workspace.POOL_SIZE
+
+
+def test_warm_repo_skips_fetch_on_job_start(origin):
+    workspace.configure(CloneStrategy(), fresh_seconds=60)
+    try:
+        workspace.warm(origin, "owner/repo", ["feature", "from-a-fork"])
+        clone = workspace.github.clone_repo
+        assert clone.call_args[0][2] == ["feature"]
+        assert len(workspace._worktrees(origin, "owner/repo")) == 1
+
+        path = workspace.acquire(origin, "owner/repo", "issue-1", create=True)
+        assert clone.call_count == 2
+        assert path == workspace._worktrees(origin, "owner/repo")[0]
+
+        # /pr always refreshes its branch
+        workspace.acquire(origin, "owner/repo", "feature")
+        assert clone.call_count == 3
+    finally:
+        workspace.configure(CloneStrategy())
+
+
+def test_cold_repo_fetches_on_job_start(origin):
+    workspace.acquire(origin, "owner/repo")
+    workspace.acquire(origin, "owner/repo")
+    assert workspace.github.clone_repo.call_count == 2
+
+
+def test_clone_strategy_override_and_reference(origin):
+    workspace.configure(
+        CloneStrategy(filter="blob:none"),
+        {"o/fork": CloneStrategy(depth=1, reference="o/upstream")},
+    )
+    try:
+        with patch("minbot.workspace.github.clone_repo") as clone:
+            workspace._fetch(origin, "o/r", [])
+            workspace._fetch(origin, "o/fork", ["feature"])
+    finally:
+        workspace.configure(CloneStrategy())
+    assert clone.call_args_list[0][1] == {"filter_spec": "blob:none", "depth": None, "reference": None}
+    args, kwargs = clone.call_args_list[1]
+    assert args[2] == ["feature"]
+    assert kwargs["depth"] == 1
+    assert kwargs["reference"] == workspace.bare_path(origin, "o/upstream")